@@ -0,0 +1,68 @@
+"""Measure how `compile_ir` scales with the size of a function.
+
+Each generated function is a chain of `if/elif` branches, which is the
+worst case for block construction (every branch adds a forward jump and
+a jump target).
+
+    $ python benchmarks/ir_scaling.py --sizes 100 200 400 800 1600
+"""
+
+import time
+from argparse import ArgumentParser
+
+from sea.decoder import decode_instructions
+from sea.ir import compile_ir
+
+
+def generate_function(branches):
+    lines = ["def func(x):"]
+    for branch in range(branches):
+        keyword = "if" if branch == 0 else "elif"
+        lines.append(f"    {keyword} x == {branch}:")
+        lines.append(f"        y = x + {branch}")
+    lines.append("    else:")
+    lines.append("        y = None")
+    lines.append("    return y")
+
+    module = compile("\n".join(lines), "<benchmark>", "exec")
+    [function] = [
+        const for const in module.co_consts if hasattr(const, "co_code")
+    ]
+    return function
+
+
+def measure(branches, repeat):
+    instructions = decode_instructions(generate_function(branches))
+
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        compile_ir(instructions)
+        timings.append(time.perf_counter() - start)
+
+    return len(instructions), min(timings)
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="+",
+        default=[100, 200, 400, 800, 1600],
+        help="number of branches in the generated functions",
+    )
+    parser.add_argument("--repeat", type=int, default=5)
+    options = parser.parse_args()
+
+    print(f"{'branches':>10} {'instrs':>10} {'seconds':>10} {'us/instr':>10}")
+    for branches in options.sizes:
+        instructions, seconds = measure(branches, options.repeat)
+        print(
+            f"{branches:>10} {instructions:>10} {seconds:>10.4f}"
+            f" {seconds / instructions * 1e6:>10.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
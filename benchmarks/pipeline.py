@@ -0,0 +1,317 @@
+"""Measure every stage of the SEA pipeline over a fixed corpus of standard
+library modules (compiled on the running interpreter, including all of
+their nested code objects), plus scaling curves over generated
+functions of increasing size.
+
+Each stage reports its best time out of `--repeat` runs, throughput in
+instructions per second and its peak memory (measured separately with
+tracemalloc, so it doesn't skew the timings). The results can be stored
+as JSON, and compared against a previous run (from the repository
+root; sea has to be importable, so either install it or set
+`PYTHONPATH`):
+
+    $ PYTHONPATH=. python benchmarks/pipeline.py --output before.json
+    $ PYTHONPATH=. python benchmarks/pipeline.py --compare before.json
+
+Generated functions that a stage can't handle (see
+`supported_code_objects`) are reported as unsupported for that stage.
+"""
+
+import gc
+import hashlib
+import importlib.util
+import io
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from argparse import ArgumentParser
+
+from sea.decoder import decode_instructions
+from sea.ir import compile_ir
+from sea.module import iter_code_objects
+from sea.simulator import simulate, simulate_ir
+from sea.transform import transform_blocks, transform_calls
+from sea.virtuals import Block, Call, Partial, traverse_virtuals
+from sea.visualize import visualize_as_text
+
+BENCHMARK_FORMAT = 1
+
+DEFAULT_CORPUS = [
+    "argparse",
+    "ast",
+    "collections",
+    "configparser",
+    "dataclasses",
+    "difflib",
+    "enum",
+    "functools",
+    "inspect",
+    "json.decoder",
+    "json.encoder",
+    "pathlib",
+    "pprint",
+    "string",
+    "textwrap",
+    "tokenize",
+    "typing",
+]
+
+
+def _reset_ids(virtuals):
+    stack = list(virtuals)
+    while stack:
+        virtual = stack.pop()
+        if virtual.virtual_id == -1:
+            continue
+
+        virtual.virtual_id = -1
+        if isinstance(virtual, Call):
+            stack.extend(virtual.arguments)
+        elif isinstance(virtual, Partial):
+            stack.append(virtual.call)
+        elif isinstance(virtual, Block):
+            stack.extend(virtual.calls)
+    return virtuals
+
+
+def _renumbered(code):
+    # The simulator numbers everything it creates, so traversal only
+    # has work to do on virtuals without ids.
+    return _reset_ids(simulate(decode_instructions(code)))
+
+
+def _render(calls):
+    visualize_as_text(calls, file=io.StringIO())
+
+
+# Every stage is a (setup, run) pair; `setup` prepares the input of a
+# code object outside of the measured time.
+STAGES = {
+    "decode": (lambda code: code, decode_instructions),
+    "compile_ir": (decode_instructions, compile_ir),
+    "simulate": (decode_instructions, simulate),
+    "simulate_ir": (decode_instructions, simulate_ir),
+    "traverse_virtuals": (_renumbered, traverse_virtuals),
+    "transform_calls": (
+        lambda code: simulate(decode_instructions(code)),
+        transform_calls,
+    ),
+    "transform_blocks": (
+        lambda code: simulate_ir(decode_instructions(code)),
+        transform_blocks,
+    ),
+    "render": (lambda code: simulate(decode_instructions(code)), _render),
+}
+
+
+def load_corpus(module_names):
+    """Compile the given modules and return all of their code objects,
+    along with a digest of the sources."""
+    digest = hashlib.sha256()
+    code_objects = []
+    for module_name in module_names:
+        path = importlib.util.find_spec(module_name).origin
+        with open(path, "rb") as stream:
+            source = stream.read()
+        digest.update(source)
+
+        module = compile(source, path, "exec")
+        code_objects.extend(code for _, code in iter_code_objects(module))
+
+    return code_objects, digest.hexdigest()
+
+
+def supported_code_objects(stage, code_objects):
+    """Return the code objects that the given stage can handle (e.g the
+    flat simulator rejects loops, which leave values on the stack)."""
+    setup, run = STAGES[stage]
+    supported = []
+    for code in code_objects:
+        try:
+            run(setup(code))
+        except Exception:
+            continue
+        supported.append(code)
+    return supported
+
+
+def measure_stage(stage, code_objects, repeat):
+    setup, run = STAGES[stage]
+
+    timings = []
+    for _ in range(repeat):
+        inputs = [setup(code) for code in code_objects]
+        gc.collect()
+        start = time.perf_counter()
+        for value in inputs:
+            run(value)
+        timings.append(time.perf_counter() - start)
+        del inputs
+
+    inputs = [setup(code) for code in code_objects]
+    gc.collect()
+    tracemalloc.start()
+    results = [run(value) for value in inputs]
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del results
+
+    return min(timings), peak
+
+
+def generate_function(statements):
+    """Generate a function with the given number of statements, mixing
+    calls, branches and loops so that every stage has some work."""
+    lines = ["def func(x, y):", "    total = 0"]
+    for statement in range(statements):
+        kind = statement % 4
+        if kind == 0:
+            lines.append(f"    total += f(x, y.attr, {statement})")
+        elif kind == 1:
+            lines.append(f"    if x > {statement}:")
+            lines.append(f"        y = g(y, {statement})")
+        elif kind == 2:
+            lines.append(f"    while total < {statement}:")
+            lines.append("        total = h(total, y)")
+        else:
+            lines.append(f"    x = [x, y, {statement}][total % 3]")
+    lines.append("    return total")
+
+    module = compile("\n".join(lines), "<benchmark>", "exec")
+    [function] = [
+        const for const in module.co_consts if hasattr(const, "co_code")
+    ]
+    return function
+
+
+def measure_scaling(sizes, repeat):
+    curves = {stage: [] for stage in STAGES}
+    for size in sizes:
+        code = generate_function(size)
+        instructions = len(decode_instructions(code))
+        for stage in STAGES:
+            if supported_code_objects(stage, [code]):
+                seconds, _ = measure_stage(stage, [code], repeat)
+            else:
+                seconds = None
+            curves[stage].append(
+                {
+                    "statements": size,
+                    "instructions": instructions,
+                    "seconds": seconds,
+                }
+            )
+    return curves
+
+
+def run_benchmarks(module_names, sizes, repeat):
+    code_objects, digest = load_corpus(module_names)
+
+    stages = {}
+    for stage in STAGES:
+        supported = supported_code_objects(stage, code_objects)
+        instructions = sum(
+            len(decode_instructions(code)) for code in supported
+        )
+        seconds, peak = measure_stage(stage, supported, repeat)
+        stages[stage] = {
+            "code_objects": len(supported),
+            "instructions": instructions,
+            "seconds": seconds,
+            "instructions_per_second": instructions / max(seconds, 1e-9),
+            "peak_memory": peak,
+        }
+
+    return {
+        "format": BENCHMARK_FORMAT,
+        "created": time.time(),
+        "python": sys.version,
+        "implementation": sys.implementation.cache_tag,
+        "platform": platform.platform(),
+        "repeat": repeat,
+        "corpus": {
+            "modules": module_names,
+            "digest": digest,
+            "code_objects": len(code_objects),
+        },
+        "stages": stages,
+        "scaling": measure_scaling(sizes, repeat),
+    }
+
+
+def print_report(report, baseline=None):
+    corpus = report["corpus"]
+    print(
+        f"corpus: {len(corpus['modules'])} modules,"
+        f" {corpus['code_objects']} code objects"
+    )
+    if baseline is not None and baseline["corpus"] != corpus:
+        print("warning: the baseline was measured on a different corpus")
+
+    print(
+        f"{'stage':>18} {'codes':>6} {'seconds':>10} {'instrs/s':>12}"
+        f" {'peak KiB':>10}"
+        + (f" {'change':>8}" if baseline is not None else "")
+    )
+    for stage, result in report["stages"].items():
+        line = (
+            f"{stage:>18} {result['code_objects']:>6}"
+            f" {result['seconds']:>10.4f}"
+            f" {result['instructions_per_second']:>12.0f}"
+            f" {result['peak_memory'] / 1024:>10.0f}"
+        )
+        if baseline is not None and stage in baseline["stages"]:
+            previous = baseline["stages"][stage]["seconds"]
+            line += f" {result['seconds'] / previous - 1:>+8.1%}"
+        print(line)
+
+    print()
+    print(f"{'stage':>18} {'instrs':>8} {'us/instr':>10}")
+    for stage, points in report["scaling"].items():
+        for point in points:
+            if point["seconds"] is None:
+                per_instruction = f"{'unsupported':>10}"
+            else:
+                seconds = point["seconds"] / point["instructions"]
+                per_instruction = f"{seconds * 1e6:>10.2f}"
+            print(f"{stage:>18} {point['instructions']:>8} {per_instruction}")
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument(
+        "--modules",
+        nargs="+",
+        default=DEFAULT_CORPUS,
+        help="standard library modules to use as the corpus",
+    )
+    parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="+",
+        default=[50, 100, 200, 400, 800],
+        help="number of statements in the generated functions",
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="store the results as JSON")
+    parser.add_argument(
+        "--compare", help="compare against the results of a previous run"
+    )
+    options = parser.parse_args()
+
+    report = run_benchmarks(options.modules, options.sizes, options.repeat)
+    if options.output:
+        with open(options.output, "w") as stream:
+            json.dump(report, stream, indent=4)
+
+    baseline = None
+    if options.compare:
+        with open(options.compare) as stream:
+            baseline = json.load(stream)
+    print_report(report, baseline)
+
+
+if __name__ == "__main__":
+    main()
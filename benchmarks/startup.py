@@ -0,0 +1,133 @@
+"""Measure the startup time of fresh interpreters that import (parts of)
+sea, as the CLI and the pool workers do, along with the import time of
+every sea module (from `-X importtime`).
+
+    $ python benchmarks/startup.py --output before.json
+    $ python benchmarks/startup.py --compare before.json
+"""
+
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from argparse import ArgumentParser
+
+STARTUP_FORMAT = 1
+
+SCENARIOS = {
+    "python": ["-c", "pass"],
+    "import sea": ["-c", "import sea"],
+    "simulator": ["-c", "import sea.simulator"],
+    "batch worker": ["-c", "import sea.batch"],
+    "module worker": ["-c", "import sea.module"],
+    "cli --help": ["-m", "sea", "--help"],
+}
+
+
+def _run(arguments, environment):
+    start = time.perf_counter()
+    subprocess.run(
+        [sys.executable, *arguments],
+        check=True,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        env=environment,
+    )
+    return time.perf_counter() - start
+
+
+def measure_scenario(arguments, repeat, environment):
+    # The first run also writes the bytecode caches, it isn't counted
+    _run(arguments, environment)
+    timings = [_run(arguments, environment) for _ in range(repeat)]
+    return {"best": min(timings), "median": statistics.median(timings)}
+
+
+def measure_imports(arguments, environment):
+    """Return the cumulative import time (in microseconds) of each sea
+    module imported by the given arguments."""
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", *arguments],
+        check=True,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        env=environment,
+        text=True,
+    )
+
+    imports = {}
+    for line in process.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        _, cumulative, name = line.split("|")
+        name = name.strip()
+        if name == "sea" or name.startswith("sea."):
+            imports[name] = int(cumulative)
+    return imports
+
+
+def run_benchmarks(repeat):
+    environment = {**os.environ}
+    environment.pop("PYTHONDONTWRITEBYTECODE", None)
+
+    return {
+        "format": STARTUP_FORMAT,
+        "created": time.time(),
+        "python": sys.version,
+        "repeat": repeat,
+        "scenarios": {
+            name: measure_scenario(arguments, repeat, environment)
+            for name, arguments in SCENARIOS.items()
+        },
+        "imports": measure_imports(SCENARIOS["cli --help"], environment),
+    }
+
+
+def print_report(report, baseline=None):
+    print(
+        f"{'scenario':>16} {'best ms':>9} {'median ms':>10}"
+        + (f" {'change':>8}" if baseline is not None else "")
+    )
+    for name, result in report["scenarios"].items():
+        line = (
+            f"{name:>16} {result['best'] * 1e3:>9.1f}"
+            f" {result['median'] * 1e3:>10.1f}"
+        )
+        if baseline is not None and name in baseline["scenarios"]:
+            previous = baseline["scenarios"][name]["best"]
+            line += f" {result['best'] / previous - 1:>+8.1%}"
+        print(line)
+
+    print()
+    print(f"{'module':>16} {'import ms':>10}")
+    for name, microseconds in sorted(
+        report["imports"].items(), key=lambda item: -item[1]
+    ):
+        print(f"{name:>16} {microseconds / 1e3:>10.1f}")
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--output", help="store the results as JSON")
+    parser.add_argument(
+        "--compare", help="compare against the results of a previous run"
+    )
+    options = parser.parse_args()
+
+    report = run_benchmarks(options.repeat)
+    if options.output:
+        with open(options.output, "w") as stream:
+            json.dump(report, stream, indent=4)
+
+    baseline = None
+    if options.compare:
+        with open(options.compare) as stream:
+            baseline = json.load(stream)
+    print_report(report, baseline)
+
+
+if __name__ == "__main__":
+    main()
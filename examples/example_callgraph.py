@@ -0,0 +1,59 @@
+from sea.callgraph import CallGraph
+from sea.module import analyze_module
+
+modules = {
+    "app.util": """
+class Reader:
+    def __init__(self, path):
+        self.path = path
+
+    def read(self):
+        with open(self.path) as stream:
+            return self.parse(stream.read())
+
+    def parse(self, text):
+        return text.split()
+
+
+def read_words(path):
+    return Reader(path).read()
+""",
+    "app.main": """
+from app.util import read_words
+
+
+def main(paths):
+    for path in paths:
+        print(len(read_words(path)))
+""",
+}
+
+call_graph = CallGraph()
+for name, source in modules.items():
+    bytecode = compile(source, f"<{name}>", "exec")
+    call_graph.add_module(
+        name, analyze_module(bytecode, enable_ir=True, max_workers=1)
+    )
+
+for edge in call_graph.graph.edges:
+    print(edge.source.key, "->", edge.destination.key)
+
+print("reachable from main:")
+for node in call_graph.reachable(["app.main.main"]):
+    print("   ", node.key)
+
+for cost, chain in call_graph.hot_paths(["app.main.main"]):
+    print("longest chain:", " -> ".join(node.key for node in chain))
+
+# The calls are linked on every supported version (3.11's PRECALL/CALL
+# included).
+edges = {
+    (edge.source.key, edge.destination.key) for edge in call_graph.graph.edges
+}
+assert {
+    ("app.main.main", "app.util.read_words"),
+    ("app.util.read_words", "app.util.Reader.__init__"),
+    ("app.util.read_words", "app.util.Reader.read"),
+    ("app.util.Reader.read", "app.util.Reader.parse"),
+    ("app.util.Reader.read", "builtins.open"),
+} <= edges, edges
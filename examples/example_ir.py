@@ -0,0 +1,43 @@
+from sea.decoder import decode_instructions
+from sea.ir import compile_ir, is_jump
+
+bytecode = compile(
+    """
+def func(x, ys):
+    z = 1 if x else 2
+    for y in ys:
+        z += y
+    return z
+
+""",
+    "<temp>",
+    "exec",
+)
+
+[code] = [const for const in bytecode.co_consts if hasattr(const, "co_code")]
+entry_block = compile_ir(decode_instructions(code))
+
+blocks = [entry_block]
+for block in blocks:
+    for next_block in block.next_blocks:
+        if next_block not in blocks:
+            blocks.append(next_block)
+
+for block in sorted(blocks, key=lambda block: block.block_id):
+    print(
+        block.name, "->", [next_block.name for next_block in block.next_blocks]
+    )
+    print(block.dump())
+
+# Every jump (the ternary's branches and the loop's back edge alike)
+# must land on the first instruction of a block, on every version.
+leaders = {block.instructions[0].offset for block in blocks}
+for block in blocks:
+    for instr in block.instructions:
+        if is_jump(instr):
+            assert instr.argval in leaders, block.dump()
+
+[loop_header] = [
+    block for block in blocks if block.instructions[0].opname == "FOR_ITER"
+]
+assert loop_header.labels == ["exhaust", "loop"]
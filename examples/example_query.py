@@ -0,0 +1,37 @@
+from sea.module import analyze_module
+from sea.query import Loop, Op, QueryIndex
+
+bytecode = compile(
+    """
+def read_all(paths):
+    contents = []
+    for path in paths:
+        with open(path) as stream:
+            data = stream.read()
+        contents.append(data)
+    return contents
+
+
+def read_one(path):
+    return open(path).read()
+
+""",
+    "<temp>",
+    "exec",
+)
+
+index = QueryIndex.from_results(
+    analyze_module(bytecode, enable_ir=True, max_workers=1)
+)
+
+calls = ("CALL_FUNCTION", "CALL")
+for match in index.find(Op(calls, uses=Op("LOAD_GLOBAL", arg="open"))):
+    print("opens a file:", match.qualname, match.call.as_string())
+
+in_loop = Op(
+    calls,
+    uses=Op("LOAD_GLOBAL", arg="open"),
+    within=Loop(Op("FOR_ITER")),
+)
+for match in index.find(in_loop):
+    print("opens a file in a loop:", match.qualname, match.call.as_string())
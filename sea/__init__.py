@@ -0,0 +1,66 @@
+"""Static stack effect analysis of Python bytecode.
+
+Submodules (and the most commonly used functions, re-exported below)
+are only imported on first access, so `import sea` is cheap for
+processes that only need a part of the package.
+"""
+
+import importlib
+
+_EXPORTS = {
+    "decode_instructions": "sea.decoder",
+    "simulate": "sea.simulator",
+    "simulate_ir": "sea.simulator",
+    "iter_simulate": "sea.simulator",
+    "traverse_virtuals": "sea.virtuals",
+    "Graph": "sea.graph",
+    "transform_calls": "sea.transform",
+    "transform_blocks": "sea.transform",
+    "iter_transform_calls": "sea.transform",
+    "analyze_module": "sea.module",
+    "visualize_as_text": "sea.visualize",
+}
+
+_SUBMODULES = frozenset(
+    (
+        "algorithms",
+        "batch",
+        "bytecode",
+        "cache",
+        "callgraph",
+        "client",
+        "dataflow",
+        "decoder",
+        "graph",
+        "ir",
+        "memo",
+        "module",
+        "profiling",
+        "query",
+        "serialize",
+        "server",
+        "simulator",
+        "transform",
+        "virtuals",
+        "visualize",
+        "watch",
+    )
+)
+
+__all__ = sorted(_EXPORTS)
+
+
+def __getattr__(name):
+    if name in _EXPORTS:
+        value = getattr(importlib.import_module(_EXPORTS[name]), name)
+    elif name in _SUBMODULES:
+        value = importlib.import_module(f"{__name__}.{name}")
+    else:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted({*globals(), *_EXPORTS, *_SUBMODULES})
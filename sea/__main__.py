@@ -1,19 +1,180 @@
-import dis
+import glob
+import os
+import sys
 from argparse import ArgumentParser
+from contextlib import nullcontext
 
-from sea.simulator import simulate, simulate_ir
-from sea.transform import transform_blocks, transform_calls
-from sea.virtuals import traverse_virtuals
-from sea.visualize import visualize_as_graph, visualize_as_text
+from sea.batch import analyze_file, analyze_files, write_results
+from sea.cache import add_cache_arguments, get_cache
+from sea.decoder import decode_instructions
+from sea.profiling import collect
+
+# The modules that are only needed by some of the modes (graphs, the
+# other output formats) are imported by those modes, to keep the
+# startup of the common ones fast.
 
 
 def get_instructions(source_code):
-    return tuple(dis.Bytecode(source_code))
+    return decode_instructions(source_code)
+
+
+def get_memo(options, batch_mode):
+    # A single code object has nothing to share
+    if not (options.nested or batch_mode):
+        return None
+
+    from sea.memo import SimulationMemo
+
+    return SimulationMemo()
+
+
+def run_batch(options, cache, memo):
+    results = analyze_files(
+        options.files,
+        enable_ir=options.enable_ir,
+        nested=options.nested,
+        cache=cache,
+        max_workers=options.workers,
+        memo=memo,
+    )
+    with open_output(options) as stream:
+        summary = write_results(results, stream)
+
+    print(summary.as_string(), file=sys.stderr)
+
+
+def analyze_single_file(options):
+    from sea.simulator import simulate, simulate_ir
+    from sea.transform import transform_blocks, transform_calls
+
+    [file] = options.files
+    with open(file) as stream:
+        source = stream.read()
+
+    instructions = get_instructions(source)
+
+    if options.enable_ir:
+        virtuals = simulate_ir(instructions)
+        graph = transform_blocks(virtuals)
+    else:
+        virtuals = simulate(instructions)
+        graph = transform_calls(virtuals)
+
+    return virtuals, graph
+
+
+def has_graph_controls(options):
+    return (
+        options.focus is not None
+        or options.max_chain is not None
+        or options.collapse_blocks
+    )
+
+
+def write_graph(options, stream):
+    from sea.simulator import iter_simulate
+    from sea.transform import iter_transform_calls
+    from sea.visualize import iter_graph_items, write_dot, write_graphml
+
+    if options.enable_ir or has_graph_controls(options):
+        virtuals, graph = analyze_single_file(options)
+        items = iter_graph_items(
+            graph,
+            focus=options.focus,
+            depth=options.depth,
+            max_chain=options.max_chain,
+            collapse_blocks=options.collapse_blocks,
+        )
+    else:
+        # Nothing to reduce, so the calls can be streamed straight from
+        # the simulator
+        [file] = options.files
+        with open(file) as source:
+            instructions = get_instructions(source.read())
+        items = iter_transform_calls(iter_simulate(instructions))
+
+    if options.format == "dot":
+        write_dot(items, stream, clusters=options.disable_subgraphs)
+    else:
+        write_graphml(items, stream)
+
+
+def open_output(options, mode="w"):
+    if options.output is not None:
+        return open(options.output, mode)
+    elif "b" in mode:
+        return nullcontext(sys.stdout.buffer)
+    else:
+        return nullcontext(sys.stdout)
+
+
+def export(options):
+    from sea.serialize import dump_jsonl, dumps_binary
+
+    mode = "wb" if options.format == "binary" else "w"
+    with open_output(options, mode) as stream:
+        if options.format in ("dot", "graphml"):
+            write_graph(options, stream)
+            return
+
+        virtuals, graph = analyze_single_file(options)
+        if options.format == "jsonl":
+            dump_jsonl(virtuals, stream, graph=graph)
+        else:
+            stream.write(dumps_binary(virtuals, graph=graph))
+
+
+def run(options, batch_mode):
+    if options.watch:
+        from sea.watch import watch_file
+
+        watch_file(
+            options.files[0],
+            enable_ir=options.enable_ir,
+            max_workers=options.workers or 1,
+        )
+        return
+    elif options.show_graph:
+        from sea.visualize import visualize_as_graph
+
+        virtuals, graph = analyze_single_file(options)
+        visualize_as_graph(graph, enable_subgraphs=options.disable_subgraphs)
+        return
+    elif options.format != "text":
+        export(options)
+        return
+
+    cache = get_cache(options)
+    memo = get_memo(options, batch_mode)
+    if batch_mode:
+        run_batch(options, cache, memo)
+    else:
+        result = analyze_file(
+            options.files[0],
+            enable_ir=options.enable_ir,
+            nested=options.nested,
+            cache=cache,
+            max_workers=options.workers,
+            memo=memo,
+        )
+        if result.error is not None:
+            raise result.error
+        sys.stdout.write(result.output)
+
+    # Pruning scans the whole cache, which only a run that wrote to it
+    # can have pushed past the limit.
+    if cache is not None and cache.writes:
+        cache.prune()
 
 
 def main():
     parser = ArgumentParser()
-    parser.add_argument("file", help="source file")
+    parser.add_argument(
+        "files",
+        nargs="+",
+        metavar="file",
+        help="source file (or directories and globs, for batch mode)",
+    )
     parser.add_argument("--enable-ir", action="store_true", help="Enable IR")
     parser.add_argument(
         "--show-graph",
@@ -25,25 +186,100 @@ def main():
         action="store_false",
         help="display ir blocks as clusters",
     )
+    parser.add_argument(
+        "--format",
+        choices=("text", "jsonl", "binary", "dot", "graphml"),
+        default="text",
+        help="output format of a single file (see format.md for jsonl)",
+    )
+    parser.add_argument(
+        "--nested",
+        action="store_true",
+        help="analyze every nested code object (functions, classes etc.)",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        help="number of worker processes (default: CPU count)",
+    )
+    parser.add_argument(
+        "--output",
+        help="write the batch mode results or the exported file here"
+        " (default: stdout)",
+    )
+    parser.add_argument(
+        "--focus",
+        help="only export the graph around this virtual (e.g '$42')",
+    )
+    parser.add_argument(
+        "--depth",
+        type=int,
+        help="distance from the --focus virtual to export (default: all)",
+    )
+    parser.add_argument(
+        "--max-chain",
+        type=int,
+        help="summarize runs of more linearly connected calls than this",
+    )
+    parser.add_argument(
+        "--collapse-blocks",
+        action="store_true",
+        help="export each IR block as a single node",
+    )
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="analyze every nested code object of a single file again"
+        " whenever it changes, printing only what changed",
+    )
+    add_cache_arguments(parser)
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="print the time spent in each stage to stderr"
+        " (runs in a single process unless --workers is given)",
+    )
 
     options = parser.parse_args()
+    batch_mode = len(options.files) > 1 or not os.path.isfile(options.files[0])
+    if len(options.files) == 1:
+        [path] = options.files
+        if not (os.path.exists(path) or glob.glob(path, recursive=True)):
+            parser.error(f"{path}: no such file, directory or glob match")
+    if options.show_graph and (options.nested or batch_mode):
+        parser.error("--show-graph can't be used with --nested or batches")
+    if options.format != "text" and (
+        options.show_graph or options.nested or batch_mode
+    ):
+        parser.error(
+            f"--format {options.format} can only be used with a single file"
+        )
+    if options.format not in ("dot", "graphml") and has_graph_controls(
+        options
+    ):
+        parser.error(
+            "--focus, --max-chain and --collapse-blocks need --format dot"
+            " or graphml"
+        )
+    if options.watch and (
+        batch_mode or options.show_graph or options.format != "text"
+    ):
+        parser.error("--watch can only be used with a single file as text")
+    if options.depth is not None and options.focus is None:
+        parser.error("--depth needs --focus")
 
-    with open(options.file) as stream:
-        source = stream.read()
-
-    instructions = get_instructions(source)
-
-    if options.enable_ir:
-        virtuals = traverse_virtuals(simulate_ir(instructions))
-        graph = transform_blocks(virtuals)
-    else:
-        virtuals = traverse_virtuals(simulate(instructions))
-        graph = transform_calls(virtuals)
+    if not options.profile:
+        run(options, batch_mode)
+        return
 
-    if options.show_graph:
-        visualize_as_graph(graph, enable_subgraphs=options.disable_subgraphs)
-    else:
-        visualize_as_text(virtuals)
+    # Only the current process is instrumented
+    if options.workers is None:
+        options.workers = 1
+    with collect() as profile:
+        try:
+            run(options, batch_mode)
+        finally:
+            print(profile.as_string(), file=sys.stderr)
 
 
 if __name__ == "__main__":
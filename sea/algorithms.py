@@ -0,0 +1,377 @@
+"""Graph algorithms over `sea.graph.Graph`.
+
+Every result is cached on the graph it was computed for (keyed by the
+algorithm and its arguments) and dropped as soon as that graph changes,
+so repeated queries are cheap. All the traversals are iterative and run
+in (near) linear time over the integer adjacency of the graph.
+"""
+
+from __future__ import annotations
+
+from collections import deque
+from typing import Dict, FrozenSet, List, Optional
+
+from sea.graph import EdgeType, Graph, Node
+from sea.virtuals import Block
+
+# Data dependencies, which is what the slices follow by default
+DATA_EDGES = frozenset((EdgeType.ARGUMENT, EdgeType.MERGE))
+
+
+def _edge_types_key(edge_types):
+    if edge_types is None:
+        return None
+    return frozenset(map(EdgeType, edge_types))
+
+
+def _adjacency(graph, outgoing, edge_types=None):
+    # Neighbour ids of every node id, following the edges of the given
+    # types only (all of them, if not given).
+    edge_types = _edge_types_key(edge_types)
+    return graph._cached(
+        ("adjacency", outgoing, edge_types),
+        _build_adjacency,
+        graph,
+        outgoing,
+        edge_types,
+    )
+
+
+def _build_adjacency(graph, outgoing, edge_types):
+    indptr, edge_ids = graph._csr(outgoing)
+    others = graph._destinations if outgoing else graph._sources
+    types = graph._types
+
+    adjacency = []
+    for node_id in range(len(graph._nodes)):
+        edges = edge_ids[indptr[node_id] : indptr[node_id + 1]]
+        if edge_types is None:
+            adjacency.append([others[edge_id] for edge_id in edges])
+        else:
+            adjacency.append(
+                [
+                    others[edge_id]
+                    for edge_id in edges
+                    if types[edge_id] in edge_types
+                ]
+            )
+    return adjacency
+
+
+def _nodes_of(graph, node_ids):
+    nodes = graph._nodes
+    return [nodes[node_id] for node_id in node_ids]
+
+
+def _search(adjacency, roots):
+    seen = set(roots)
+    queue = deque(roots)
+    while queue:
+        for neighbour in adjacency[queue.popleft()]:
+            if neighbour not in seen:
+                seen.add(neighbour)
+                queue.append(neighbour)
+    return frozenset(seen)
+
+
+def _reachable_ids(graph, node, outgoing, edge_types) -> FrozenSet[int]:
+    edge_types = _edge_types_key(edge_types)
+    adjacency = _adjacency(graph, outgoing, edge_types)
+    return graph._cached(
+        ("reachable", node.node_id, outgoing, edge_types),
+        _search,
+        adjacency,
+        [node.node_id],
+    )
+
+
+def reachable(graph: Graph, node: Node, *, edge_types=None) -> List[Node]:
+    """Return the nodes reachable from the given node (including itself)
+    through the edges of the given types (all of them by default), in
+    insertion order."""
+    return _nodes_of(
+        graph, sorted(_reachable_ids(graph, node, True, edge_types))
+    )
+
+
+def is_reachable(
+    graph: Graph, source: Node, destination: Node, *, edge_types=None
+) -> bool:
+    return destination.node_id in _reachable_ids(
+        graph, source, True, edge_types
+    )
+
+
+def forward_slice(
+    graph: Graph, node: Node, *, edge_types=DATA_EDGES
+) -> List[Node]:
+    """Return the nodes that (transitively) depend on the given node,
+    i.e the ones its value flows into, including itself."""
+    return _nodes_of(
+        graph, sorted(_reachable_ids(graph, node, True, edge_types))
+    )
+
+
+def backward_slice(
+    graph: Graph, node: Node, *, edge_types=DATA_EDGES
+) -> List[Node]:
+    """Return the nodes that the given node (transitively) depends on,
+    including itself."""
+    return _nodes_of(
+        graph, sorted(_reachable_ids(graph, node, False, edge_types))
+    )
+
+
+def _topological_order(graph):
+    adjacency = _adjacency(graph, True)
+    in_degrees = [0] * len(adjacency)
+    for neighbours in adjacency:
+        for neighbour in neighbours:
+            in_degrees[neighbour] += 1
+
+    queue = deque(
+        node_id for node_id, degree in enumerate(in_degrees) if degree == 0
+    )
+    order = []
+    while queue:
+        node_id = queue.popleft()
+        order.append(node_id)
+        for neighbour in adjacency[node_id]:
+            in_degrees[neighbour] -= 1
+            if in_degrees[neighbour] == 0:
+                queue.append(neighbour)
+
+    if len(order) != len(adjacency):
+        return None
+    return order
+
+
+def topological_order(graph: Graph) -> List[Node]:
+    """Return the nodes in a topological order (every node comes before
+    the nodes it has edges to). Raises ValueError if the graph has a
+    cycle; see `strongly_connected_components` for those."""
+    order = graph._cached("topological_order", _topological_order, graph)
+    if order is None:
+        raise ValueError("graph has cycles")
+    return _nodes_of(graph, order)
+
+
+def _strongly_connected_components(graph):
+    # Tarjan's algorithm, with an explicit stack of (node, next neighbour
+    # index) frames instead of recursion.
+    adjacency = _adjacency(graph, True)
+    indexes = [-1] * len(adjacency)
+    low_links = [0] * len(adjacency)
+    on_stack = [False] * len(adjacency)
+    stack = []
+    components = []
+    counter = 0
+
+    for root in range(len(adjacency)):
+        if indexes[root] != -1:
+            continue
+
+        frames = [(root, 0)]
+        while frames:
+            node_id, cursor = frames.pop()
+            if cursor == 0:
+                indexes[node_id] = low_links[node_id] = counter
+                counter += 1
+                stack.append(node_id)
+                on_stack[node_id] = True
+
+            neighbours = adjacency[node_id]
+            while cursor < len(neighbours):
+                neighbour = neighbours[cursor]
+                cursor += 1
+                if indexes[neighbour] == -1:
+                    frames.append((node_id, cursor))
+                    frames.append((neighbour, 0))
+                    break
+                elif on_stack[neighbour]:
+                    low_links[node_id] = min(
+                        low_links[node_id], indexes[neighbour]
+                    )
+            else:
+                if low_links[node_id] == indexes[node_id]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack[member] = False
+                        component.append(member)
+                        if member == node_id:
+                            break
+                    component.sort()
+                    components.append(component)
+
+                if frames:
+                    parent = frames[-1][0]
+                    low_links[parent] = min(
+                        low_links[parent], low_links[node_id]
+                    )
+
+    # Tarjan finds the components in reverse topological order
+    components.reverse()
+    return components
+
+
+def strongly_connected_components(graph: Graph) -> List[List[Node]]:
+    """Return the strongly connected components of the graph, in the
+    topological order of the graph they condense into. The nodes of
+    each component are in insertion order."""
+    components = graph._cached(
+        "strongly_connected_components",
+        _strongly_connected_components,
+        graph,
+    )
+    return [_nodes_of(graph, component) for component in components]
+
+
+# Control flow
+
+
+def _control_flow(graph):
+    # The block level control flow graph of a `transform_blocks` graph,
+    # derived from its flow edges (which connect the calls of the
+    # blocks).
+    blocks = [
+        node.node_id for node in graph.nodes if isinstance(node.virtual, Block)
+    ]
+    if not blocks:
+        raise ValueError("graph has no blocks (see transform_blocks)")
+
+    owners = {}
+    for index, block_id in enumerate(blocks):
+        for call in graph._nodes[block_id].virtual.calls:
+            if (node := graph.find_node(call)) is not None:
+                owners[node.node_id] = index
+
+    successors = [[] for _ in blocks]
+    predecessors = [[] for _ in blocks]
+    sources, destinations = graph._sources, graph._destinations
+    for edge_id, edge_type in enumerate(graph._types):
+        if edge_type != EdgeType.FLOW:
+            continue
+
+        source = owners.get(sources[edge_id])
+        destination = owners.get(destinations[edge_id])
+        if source is None or destination is None:
+            continue
+        if destination not in successors[source]:
+            successors[source].append(destination)
+            predecessors[destination].append(source)
+
+    return blocks, successors, predecessors
+
+
+def _reverse_postorder(successors, entry):
+    order = []
+    visited = {entry}
+    frames = [(entry, iter(successors[entry]))]
+    while frames:
+        node, neighbours = frames[-1]
+        for neighbour in neighbours:
+            if neighbour not in visited:
+                visited.add(neighbour)
+                frames.append((neighbour, iter(successors[neighbour])))
+                break
+        else:
+            frames.pop()
+            order.append(node)
+
+    order.reverse()
+    return order
+
+
+def _immediate_dominators(successors, predecessors, entry):
+    # Cooper, Harvey and Kennedy's iterative algorithm, which converges
+    # in a couple of passes over the reverse postorder for the (mostly
+    # reducible) graphs that the compiler produces.
+    order = _reverse_postorder(successors, entry)
+    rank = {node: index for index, node in enumerate(order)}
+    idoms = {entry: entry}
+
+    def intersect(left, right):
+        while left != right:
+            while rank[left] > rank[right]:
+                left = idoms[left]
+            while rank[right] > rank[left]:
+                right = idoms[right]
+        return left
+
+    changed = True
+    while changed:
+        changed = False
+        for node in order[1:]:
+            new_idom = None
+            for predecessor in predecessors[node]:
+                if predecessor not in idoms:
+                    continue
+                if new_idom is None:
+                    new_idom = predecessor
+                else:
+                    new_idom = intersect(predecessor, new_idom)
+
+            if idoms.get(node) != new_idom:
+                idoms[node] = new_idom
+                changed = True
+
+    del idoms[entry]
+    return idoms
+
+
+def _cfg(graph):
+    return graph._cached("control_flow", _control_flow, graph)
+
+
+def _dominators(graph):
+    blocks, successors, predecessors = _cfg(graph)
+    idoms = _immediate_dominators(successors, predecessors, 0)
+    return {blocks[node]: blocks[idom] for node, idom in idoms.items()}
+
+
+def _post_dominators(graph):
+    blocks, successors, predecessors = _cfg(graph)
+
+    # All the exits are joined into a virtual one, which is where the
+    # reversed graph is entered from.
+    exit_node = len(blocks)
+    exits = [node for node, targets in enumerate(successors) if not targets]
+    reversed_successors = [*predecessors, exits]
+    reversed_predecessors = [list(targets) for targets in successors]
+    for node in exits:
+        reversed_predecessors[node].append(exit_node)
+    reversed_predecessors.append([])
+
+    idoms = _immediate_dominators(
+        reversed_successors, reversed_predecessors, exit_node
+    )
+    return {
+        blocks[node]: None if idom == exit_node else blocks[idom]
+        for node, idom in idoms.items()
+    }
+
+
+def _to_nodes(graph, idoms):
+    nodes = graph._nodes
+    return {
+        nodes[node_id]: None if idom is None else nodes[idom]
+        for node_id, idom in idoms.items()
+    }
+
+
+def dominators(graph: Graph) -> Dict[Node, Optional[Node]]:
+    """Return the immediate dominator of every block node of a
+    `transform_blocks` graph that is reachable from its entry block (the
+    first one). The entry block itself is mapped to None."""
+    blocks, _, _ = _cfg(graph)
+    idoms = graph._cached("dominators", _dominators, graph)
+    return {graph._nodes[blocks[0]]: None, **_to_nodes(graph, idoms)}
+
+
+def post_dominators(graph: Graph) -> Dict[Node, Optional[Node]]:
+    """Return the immediate post-dominator of every block node of a
+    `transform_blocks` graph that can reach an exit. Blocks that are
+    only post-dominated by the (virtual) exit are mapped to None."""
+    idoms = graph._cached("post_dominators", _post_dominators, graph)
+    return _to_nodes(graph, idoms)
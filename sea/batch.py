@@ -0,0 +1,324 @@
+"""Batch analysis of many source files (directories, globs or plain
+paths) on a pool of worker processes, with results streamed back in
+the order they finish."""
+
+from __future__ import annotations
+
+import glob
+import io
+import json
+import os
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Iterable, Iterator, Optional
+
+from sea.decoder import decode_instructions
+from sea.profiling import profiled, stage
+from sea.simulator import simulate, simulate_ir
+from sea.visualize import visualize_as_text
+
+_GLOB_CHARACTERS = frozenset("*?[")
+
+
+class CachedError(Exception):
+    """The failure of an analysis, as loaded back from the cache. Only
+    the name of the original exception type and its message are kept."""
+
+    def __init__(self, kind, message):
+        super().__init__(message)
+        self.kind = kind
+
+
+@dataclass
+class FileResult:
+    """Result of analyzing a single file. The `output` holds the textual
+    SEA form (as `visualize_as_text` would print it), unless the file
+    couldn't be analyzed at all in which case `error` is set."""
+
+    path: str
+    output: Optional[str] = None
+    error: Optional[Exception] = None
+    lines: int = 0
+    elapsed: float = 0.0
+    cached: bool = False
+    # Whether the result was stored in the cache
+    written: bool = False
+
+
+@dataclass
+class BatchSummary:
+    files: int = 0
+    failed: int = 0
+    cached: int = 0
+    lines: int = 0
+    started: float = field(default_factory=time.perf_counter)
+
+    def update(self, result):
+        self.files += 1
+        self.lines += result.lines
+        if result.error is not None:
+            self.failed += 1
+        if result.cached:
+            self.cached += 1
+
+    def as_string(self):
+        elapsed = time.perf_counter() - self.started
+        rate = max(elapsed, 1e-9)
+        return (
+            f"analyzed {self.files} files ({self.failed} failed,"
+            f" {self.cached} cached, {self.lines} lines) in {elapsed:.2f}s:"
+            f" {self.files / rate:.1f} files/s,"
+            f" {self.lines / rate:.0f} lines/s"
+        )
+
+
+def iter_source_files(paths: Iterable[str]) -> Iterator[str]:
+    """Expand the given directories (recursively), glob patterns and
+    plain file paths into a stream of Python source files. Each file is
+    only yielded once."""
+    seen = set()
+    for path in paths:
+        if _GLOB_CHARACTERS.intersection(path):
+            candidates = sorted(glob.iglob(path, recursive=True))
+        elif os.path.isdir(path):
+            candidates = sorted(map(str, Path(path).rglob("*.py")))
+        else:
+            candidates = [path]
+
+        for candidate in candidates:
+            if os.path.isdir(candidate) or candidate in seen:
+                continue
+            seen.add(candidate)
+            yield candidate
+
+
+def _render(virtuals):
+    buffer = io.StringIO()
+    with stage("render"):
+        visualize_as_text(virtuals, file=buffer)
+    return buffer.getvalue()
+
+
+def describe_error(error):
+    """Describe the given error in a single line."""
+    kind = getattr(error, "kind", type(error).__name__)
+    lines = str(error).splitlines()
+    if lines:
+        return f"{kind}: {lines[0]}"
+    else:
+        return kind
+
+
+def write_module_results(results, stream, *, header="#"):
+    """Write the results of `analyze_module` to the given stream, with
+    a header line for each code object."""
+    for qualname, result in results.items():
+        print(f"{header} {qualname}", file=stream)
+        if result.error is not None:
+            print(f"error: {describe_error(result.error)}", file=stream)
+        else:
+            visualize_as_text(result.virtuals, file=stream)
+        print(file=stream)
+
+
+def _render_module(code, enable_ir, max_workers, memo):
+    from sea.module import analyze_module
+
+    results = analyze_module(
+        code, enable_ir=enable_ir, max_workers=max_workers, memo=memo
+    )
+    buffer = io.StringIO()
+    write_module_results(results, buffer, header="##")
+    return buffer.getvalue()
+
+
+def _render_code(code, enable_ir, nested, max_workers, memo):
+    if nested:
+        return _render_module(code, enable_ir, max_workers, memo)
+    elif memo is not None:
+        return _render(memo.simulate(code, enable_ir=enable_ir))
+
+    instructions = decode_instructions(code)
+    if enable_ir:
+        return _render(simulate_ir(instructions))
+    else:
+        return _render(simulate(instructions))
+
+
+def _describe_result(result):
+    return {"lines": result.lines, "cache_hits": int(result.cached)}
+
+
+@profiled("analyze_file", _describe_result)
+def analyze_file(
+    path,
+    *,
+    enable_ir=False,
+    nested=False,
+    cache=None,
+    max_workers=1,
+    memo=None,
+) -> FileResult:
+    """Compile and simulate a single file, capturing any failure (I/O,
+    syntax or simulation errors) on the returned result.
+
+    If an `AnalysisCache` is given, the output (or the failure of the
+    analysis) is looked up there first and stored there otherwise.
+    `max_workers` is only used by the nested analysis (see
+    `analyze_module`), and identical code objects are simulated once
+    through the given `SimulationMemo` (see `sea.memo`)."""
+    started = time.perf_counter()
+    result = FileResult(path)
+    try:
+        with open(path, "rb") as stream:
+            source = stream.read()
+        result.lines = source.count(b"\n")
+
+        if cache is not None:
+            key = cache.make_key(
+                source, path=path, enable_ir=enable_ir, nested=nested
+            )
+            entry = cache.get(key)
+            if entry is not None and (loaded := _load_entry(entry)):
+                result.output, result.error = loaded
+                result.cached = True
+                return result
+
+        # Only the failures of the analysis itself are cached, not the
+        # syntax errors.
+        code = compile(source, path, "exec")
+        try:
+            result.output = _render_code(
+                code, enable_ir, nested, max_workers, memo
+            )
+        except Exception as exc:
+            result.error = exc
+
+        if cache is not None:
+            result.written = cache.put(
+                key, _dump_entry(result.output, result.error)
+            )
+    except Exception as exc:
+        result.error = exc
+    finally:
+        result.elapsed = time.perf_counter() - started
+
+    return result
+
+
+# Cache entries are plain JSON (never pickles), since anyone who can
+# write to the cache directory could otherwise run code in every process
+# that reads it.
+
+
+def _dump_entry(output, error):
+    if error is not None:
+        error = [getattr(error, "kind", type(error).__name__), str(error)]
+    return json.dumps({"output": output, "error": error}).encode()
+
+
+def _load_entry(entry):
+    # A malformed entry is treated as a miss (and overwritten)
+    try:
+        data = json.loads(entry)
+        output, error = data["output"], data["error"]
+        if error is not None:
+            error = CachedError(*error)
+    except (ValueError, TypeError, KeyError):
+        return None
+    return output, error
+
+
+def _analyze_remotely(paths, executor, window, **options):
+    from concurrent.futures import FIRST_COMPLETED, wait
+
+    cache = options["cache"]
+
+    def collect(future):
+        result = future.result()
+        # The workers write through their own copies of the cache
+        if cache is not None and result.written:
+            cache.writes += 1
+        return result
+
+    # Only a bounded number of files are in flight at once, so that
+    # huge trees are neither listed nor buffered upfront.
+    pending = set()
+    for path in paths:
+        pending.add(executor.submit(analyze_file, path, **options))
+        if len(pending) >= window:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield collect(future)
+
+    for future in wait(pending).done:
+        yield collect(future)
+
+
+def analyze_files(
+    paths,
+    *,
+    enable_ir=False,
+    nested=False,
+    cache=None,
+    max_workers=None,
+    executor=None,
+    memo=None,
+) -> Iterator[FileResult]:
+    """Analyze every source file under the given paths (see
+    `iter_source_files`) and yield a `FileResult` for each one as soon
+    as it is ready, which is not necessarily in the input order.
+
+    Files are distributed to a process pool of `max_workers` processes
+    (one per CPU by default), or to the given `executor`. With a single
+    worker (or 0), everything runs in the current process instead.
+    Results are reused from (and saved to) the given `AnalysisCache`,
+    and identical code objects are simulated once per process through
+    the given `SimulationMemo`."""
+    source_files = iter_source_files(paths)
+    options = {
+        "enable_ir": enable_ir,
+        "nested": nested,
+        "cache": cache,
+        "memo": memo,
+    }
+
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+
+    if executor is not None:
+        yield from _analyze_remotely(
+            source_files, executor, window=max_workers * 4, **options
+        )
+    elif max_workers <= 1:
+        for path in source_files:
+            yield analyze_file(path, **options)
+    else:
+        # Only imported when needed, it is slow to import
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(max_workers) as executor:
+            yield from _analyze_remotely(
+                source_files, executor, window=max_workers * 4, **options
+            )
+
+
+def write_results(
+    results: Iterable[FileResult], stream, *, summary=None
+) -> BatchSummary:
+    """Write each result to the given stream as it arrives, as a header
+    line with the path followed by either the SEA form or the error."""
+    if summary is None:
+        summary = BatchSummary()
+
+    for result in results:
+        summary.update(result)
+        if result.error is not None:
+            error = describe_error(result.error)
+            stream.write(f"# {result.path}: error: {error}\n\n")
+        else:
+            stream.write(f"# {result.path}\n{result.output}\n")
+        stream.flush()
+
+    return summary
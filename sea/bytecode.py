@@ -1,6 +1,7 @@
 import dis
 import sys
 from dataclasses import dataclass
+from functools import cache
 
 import opcode
 
@@ -46,136 +47,288 @@ def family(prefix, effect):
     )
 
 
-PY39_INSTRUCTION_SET = {
-    # POP(lhs, rhs), PUSH(res)
-    **family("BINARY_", -2),
-    # POP(lhs, rhs), PUSH(res)
-    **family("INPLACE_", -2),
-    # POP(value), PUSH(VALUE)
-    **family("UNARY_", -1),
-    # POP($TOS)
-    **family("POP_JUMP_IF", -1),
-    # POP(exc, val, tb)
-    "RERAISE": -3,
-    # POP(exc, val, tb)
-    "POP_EXCEPT": -3,
-    # POP(target, key, value)
-    "STORE_SUBSCR": -3,
-    # POP(target, key)
-    "DELETE_SUBSCR": -2,
-    # POP(target, attr)
-    "STORE_ATTR": -2,
-    # POP(caught_type, target_types)
-    "JUMP_IF_NOT_EXC_MATCH": -2,
-    # POP(key, value)
-    "MAP_ADD": -2,
-    # POP(value, receiver), PUSH(res)
-    "YIELD_FROM": -2,
-    # POP(lhs, rhs), PUSH(res)
-    "COMPARE_OP": -2,
-    "IS_OP": -2,
-    "CONTAINS_OP": -2,
-    # POP(from_list, level), PUSH(module)
-    "IMPORT_NAME": -2,
-    # POP($TOS)
-    "POP_TOP": -1,
-    # POP($tos)
-    "RETURN_VALUE": -1,
-    # POP(expr)
-    "PRINT_EXPR": -1,
-    # POP(from)
-    "IMPORT_STAR": -1,
-    # POP(value)
-    "STORE_NAME": -1,
-    "STORE_FAST": -1,
-    "STORE_GLOBAL": -1,
-    "STORE_DEREF": -1,
-    # POP(value)
-    "DELETE_ATTR": -1,
-    # POP(value)
-    "LIST_APPEND": -1,
-    "SET_ADD": -1,
-    "LIST_EXTEND": -1,
-    "SET_UPDATE": -1,
-    "DICT_MERGE": -1,
-    "DICT_UPDATE": -1,
-    # POP(value), PUSH(iterator)
-    "GET_ITER": -1,
-    "GET_AITER": -1,
-    "GET_YIELD_FROM_ITER": -1,
-    # POP(value), PUSH(coro)
-    "GET_AWAITABLE": -1,
-    # POP(list), PUSH(tuple)
-    "LIST_TO_TUPLE": -1,
-    # POP(value)
-    "YIELD_VALUE": -1,
-    # POP(object), PUSH(value)
-    "LOAD_ATTR": -1,
-    # POP(sequence), PUSH(*sequence)
-    "UNPACK_SEQUENCE": -1,
-    "UNPACK_EX": -1,
-    # TODO: DUP_* / ROT_*
+# The instruction sets are only built (and cached) on first use, so that
+# importing this module stays cheap; short-lived processes (the CLI,
+# pool workers) shouldn't pay for the sets they never use.
+
+
+def _py39_instruction_set():
+    return {
+        # POP(lhs, rhs), PUSH(res)
+        **family("BINARY_", -2),
+        # POP(lhs, rhs), PUSH(res)
+        **family("INPLACE_", -2),
+        # POP(value), PUSH(VALUE)
+        **family("UNARY_", -1),
+        # POP($TOS)
+        **family("POP_JUMP_IF", -1),
+        # POP(exc, val, tb)
+        "RERAISE": -3,
+        # POP(exc, val, tb)
+        "POP_EXCEPT": -3,
+        # POP(target, key, value)
+        "STORE_SUBSCR": -3,
+        # POP(target, key)
+        "DELETE_SUBSCR": -2,
+        # POP(target, attr)
+        "STORE_ATTR": -2,
+        # POP(caught_type, target_types)
+        "JUMP_IF_NOT_EXC_MATCH": -2,
+        # POP(key, value)
+        "MAP_ADD": -2,
+        # POP(value, receiver), PUSH(res)
+        "YIELD_FROM": -2,
+        # POP(lhs, rhs), PUSH(res)
+        "COMPARE_OP": -2,
+        "IS_OP": -2,
+        "CONTAINS_OP": -2,
+        # POP(from_list, level), PUSH(module)
+        "IMPORT_NAME": -2,
+        # POP($TOS)
+        "POP_TOP": -1,
+        # POP($tos)
+        "RETURN_VALUE": -1,
+        # POP(expr)
+        "PRINT_EXPR": -1,
+        # POP(from)
+        "IMPORT_STAR": -1,
+        # POP(value)
+        "STORE_NAME": -1,
+        "STORE_FAST": -1,
+        "STORE_GLOBAL": -1,
+        "STORE_DEREF": -1,
+        # POP(value)
+        "DELETE_ATTR": -1,
+        # POP(value)
+        "LIST_APPEND": -1,
+        "SET_ADD": -1,
+        "LIST_EXTEND": -1,
+        "SET_UPDATE": -1,
+        "DICT_MERGE": -1,
+        "DICT_UPDATE": -1,
+        # POP(value), PUSH(iterator)
+        "GET_ITER": -1,
+        "GET_AITER": -1,
+        "GET_YIELD_FROM_ITER": -1,
+        # POP(value), PUSH(coro)
+        "GET_AWAITABLE": -1,
+        # POP(list), PUSH(tuple)
+        "LIST_TO_TUPLE": -1,
+        # POP(value)
+        "YIELD_VALUE": -1,
+        # POP(object), PUSH(value)
+        "LOAD_ATTR": -1,
+        # POP(sequence), PUSH(*sequence)
+        "UNPACK_SEQUENCE": -1,
+        "UNPACK_EX": -1,
+        # TODO: DUP_* / ROT_*
+    }
+
+
+def _py310_instruction_set():
+    return {**get_instruction_set((3, 9))}
+
+
+def _py311_instruction_set():
+    return {**get_instruction_set((3, 10))}
+
+
+_INSTRUCTION_SET_BUILDERS = {
+    (3, 9): _py39_instruction_set,
+    (3, 10): _py310_instruction_set,
+    (3, 11): _py311_instruction_set,
+}
+
+
+@cache
+def get_instruction_set(version=None):
+    """Return the instruction set (static stack effects keyed by opname)
+    of the given Python version (the running interpreter's, by default).
+    Raises ValueError for unsupported versions."""
+    if version is None:
+        version, description = sys.version_info[:2], sys.version
+    else:
+        description = ".".join(map(str, version))
+
+    try:
+        builder = _INSTRUCTION_SET_BUILDERS[version]
+    except KeyError:
+        raise ValueError(
+            f"Can't find the instruction set for: {description!r}"
+        ) from None
+    return builder()
+
+
+_VERSIONED_NAMES = {
+    "PY39_INSTRUCTION_SET": (3, 9),
+    "PY310_INSTRUCTION_SET": (3, 10),
+    "PY311_INSTRUCTION_SET": (3, 11),
 }
-PY310_INSTRUCTION_SET = {**PY39_INSTRUCTION_SET}
-PY311_INSTRUCTION_SET = {**PY310_INSTRUCTION_SET}
 
-INSTRUCTION_SETS = {
-    (3, 9): PY39_INSTRUCTION_SET,
-    (3, 10): PY310_INSTRUCTION_SET,
-    (3, 11): PY311_INSTRUCTION_SET,
+
+def __getattr__(name):
+    # The module level sets are still available, built on access
+    if name == "INSTRUCTION_SET":
+        return get_instruction_set()
+    elif name == "INSTRUCTION_SETS":
+        return {
+            version: get_instruction_set(version)
+            for version in _INSTRUCTION_SET_BUILDERS
+        }
+    elif name in _VERSIONED_NAMES:
+        return get_instruction_set(_VERSIONED_NAMES[name])
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def _make_function_effect(oparg):
+    effect = -2
+    for flag in (
+        HAS_CLOSURE,
+        HAS_ANNOTATIONS,
+        HAS_KWDEFAULTS,
+        HAS_DEFAULTS,
+    ):
+        if oparg & flag:
+            effect -= 1
+    return effect
+
+
+# oparg dependant
+OPARG_EFFECTS = {
+    "BUILD_STRING": lambda oparg: -oparg,
+    "BUILD_LIST": lambda oparg: -oparg,
+    "BUILD_SET": lambda oparg: -oparg,
+    "BUILD_MAP": lambda oparg: -(2 * oparg),
+    "BUILD_CONST_KEY_MAP": lambda oparg: -oparg - 1,
+    "BUILD_SLICE": lambda oparg: -3 if oparg == 3 else -2,
+    "CALL_FUNCTION": lambda oparg: -oparg - 1,
+    "CALL_METHOD": lambda oparg: -oparg - 2,
+    "CALL_FUNCTION_KW": lambda oparg: -oparg - 2,
+    "CALL_FUNCTION_EX": lambda oparg: -2 - (oparg & HAS_KWARGS),
+    "FORMAT_VALUE": (
+        lambda oparg: -2 if (oparg & FVS_MASK) == FVS_HAVE_SPEC else -1
+    ),
+    "MAKE_FUNCTION": _make_function_effect,
+    "RAISE_VARARGS": lambda oparg: -oparg,
 }
 
-try:
-    INSTRUCTION_SET = INSTRUCTION_SETS[sys.version_info[:2]]
-except KeyError as exc:
-    raise ValueError(f"Can't find the instruction set for: {sys.version!r}")
+# jump dependant, (effect on jump, effect otherwise)
+JUMP_EFFECTS = {
+    "JUMP_IF_FALSE_OR_POP": (-1, 0),
+    "JUMP_IF_TRUE_OR_POP": (0, -1),
+    "SETUP_ASYNC_WITH": (-1, 0),
+    "FOR_ITER": (-1, 0),
+}
+
+
+# (pops, pushes) of the instructions the simulator models differently
+# than `opcode.stack_effect` counts them, per version. Starting from 3.11
+# a call is split into PRECALL and CALL; the whole call (NULL or self,
+# the callable and the arguments) is consumed by CALL.
+
+
+def _py311_exact_effects():
+    return {
+        # No-op, the arguments are left for CALL
+        "PRECALL": lambda oparg: (0, 0),
+        # POP(null_or_self, callable, *args), PUSH(res)
+        "CALL": lambda oparg: (oparg + 2, 1),
+        # POP(null, callable, args, [kwargs]), PUSH(res)
+        "CALL_FUNCTION_EX": lambda oparg: (3 + (oparg & HAS_KWARGS), 1),
+        # POP(*flagged, code), PUSH(function); there is no qualname
+        "MAKE_FUNCTION": lambda oparg: (-_make_function_effect(oparg) - 1, 1),
+    }
+
+
+_EXACT_EFFECT_BUILDERS = {
+    (3, 11): _py311_exact_effects,
+}
+
+
+@cache
+def get_exact_effects(version=None):
+    """Return the (pops, pushes) resolvers (keyed by opname) of the
+    instructions whose effect doesn't follow from `opcode.stack_effect`
+    on the given Python version (the running interpreter's, by default)."""
+    if version is None:
+        version = sys.version_info[:2]
+    if builder := _EXACT_EFFECT_BUILDERS.get(version):
+        return builder()
+    else:
+        return {}
 
 
 def compute_negative_effect(opname, oparg, jump=False):
-    if effect := INSTRUCTION_SET.get(opname):
+    if effect := get_instruction_set().get(opname):
         return effect
+    elif resolver := OPARG_EFFECTS.get(opname):
+        return resolver(oparg)
+    elif effects := JUMP_EFFECTS.get(opname):
+        on_jump, otherwise = effects
+        return on_jump if jump else otherwise
+    else:
+        return 0
 
-    # oparg dependant
-    if opname in ("BUILD_STRING", "BUILD_LIST", "BUILD_SET", "BUILD_STRING"):
-        return -oparg
-    elif opname == "BUILD_MAP":
-        return -(2 * oparg)
-    elif opname == "BUILD_CONST_KEY_MAP":
-        return -oparg - 1
-    elif opname == "BUILD_SLICE":
-        return -3 if oparg == 3 else -2
-    elif opname == "CALL_FUNCTION":
-        return -oparg - 1
-    elif opname == "CALL_METHOD":
-        return -oparg - 2
-    elif opname == "CALL_FUNCTION_KW":
-        return -oparg - 2
-    elif opname == "CALL_FUNCTION_EX":
-        return -2 - (oparg & HAS_KWARGS)
-    elif opname == "FORMAT_VALUE":
-        return -2 if (oparg & FVS_MASK) == FVS_HAVE_SPEC else -1
-    elif opname == "MAKE_FUNCTION":
-        effect = -2
-        for flag in (
-            HAS_CLOSURE,
-            HAS_ANNOTATIONS,
-            HAS_KWDEFAULTS,
-            HAS_DEFAULTS,
-        ):
-            if oparg & flag:
-                effect -= 1
-        return effect
-    elif opname == "RAISE_VARARGS":
-        return -oparg
-
-    # jump dependant
-    if opname == "JUMP_IF_FALSE_OR_POP":
-        return -1 if jump else 0
-    elif opname == "JUMP_IF_TRUE_OR_POP":
-        return 0 if jump else -1
-    elif opname == "SETUP_ASYNC_WITH":
-        return -1 if jump else 0
-    elif opname == "FOR_ITER":
-        return -1 if jump else 0
-
-    return 0
+
+class StackEffects:
+    """Dense (pops, pushes) tables for every opcode of the running
+    interpreter. Opcodes whose effect only depends on the opcode
+    itself are resolved once, the rest go through a small memoized
+    resolver keyed by the oparg (and the jump state, if relevant)."""
+
+    def __init__(self):
+        self._static = [None] * 256
+        self._resolvers = [None] * 256
+
+        for opname, op in opcode.opmap.items():
+            if op < opcode.HAVE_ARGUMENT and opname not in JUMP_EFFECTS:
+                try:
+                    self._static[op] = self._compute(op, opname, None)
+                except ValueError:
+                    pass
+                else:
+                    continue
+
+            self._resolvers[op] = self._make_resolver(op, opname)
+
+    def __call__(self, op, oparg, jump=None):
+        """Return the (pops, pushes) pair for the given instruction."""
+        if effect := self._static[op]:
+            return effect
+        else:
+            return self._resolvers[op](oparg, jump)
+
+    @staticmethod
+    def _compute(op, opname, oparg, jump=None):
+        if resolver := get_exact_effects().get(opname):
+            return resolver(oparg)
+        negative_effect = compute_negative_effect(opname, oparg, jump=jump)
+        net_effect = opcode.stack_effect(op, oparg)
+        return -negative_effect, net_effect - negative_effect
+
+    def _make_resolver(self, op, opname):
+        compute = self._compute
+        if opname in JUMP_EFFECTS:
+            memos = ({}, {})
+
+            def resolver(oparg, jump):
+                memo = memos[1 if jump else 0]
+                if (effect := memo.get(oparg)) is None:
+                    effect = memo[oparg] = compute(op, opname, oparg, jump)
+                return effect
+
+        else:
+            memo = {}
+
+            def resolver(oparg, jump):
+                if (effect := memo.get(oparg)) is None:
+                    effect = memo[oparg] = compute(op, opname, oparg)
+                return effect
+
+        return resolver
+
+
+@cache
+def get_stack_effects():
+    """Return the shared `StackEffects` tables for the running interpreter."""
+    return StackEffects()
@@ -0,0 +1,213 @@
+"""A persistent, content-addressed cache for analysis results.
+
+Entries are keyed by a hash of the source together with everything the
+result depends on: the interpreter's bytecode format (which selects the
+instruction set, see `sea.bytecode.get_instruction_set`), the analysis
+options, the version of the cache format and the source of the `sea`
+package itself. Like `__pycache__`
+files, entries are never invalidated in place; a changed input simply
+maps to a new key, and stale entries are evicted once the cache grows
+past its size limit.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import sys
+from functools import cache
+from importlib.util import MAGIC_NUMBER
+from typing import Optional
+
+# Bump whenever the stored results change their shape.
+CACHE_FORMAT = 3
+DEFAULT_MAX_SIZE = 256 * 1024 * 1024
+
+
+def _hash_package():
+    # Any change to the analysis (or to how its output is rendered)
+    # changes the source of the package, so a version of `sea` never
+    # sees the results of another one.
+    digest = hashlib.sha256()
+    directory = os.path.dirname(os.path.abspath(__file__))
+    for name in sorted(os.listdir(directory)):
+        if name.endswith(".py"):
+            with open(os.path.join(directory, name), "rb") as stream:
+                digest.update(name.encode())
+                digest.update(stream.read())
+    return digest.hexdigest()[:16]
+
+
+_INTERPRETER_TAG = (
+    f"{sys.implementation.cache_tag}-{MAGIC_NUMBER.hex()}-{CACHE_FORMAT}"
+)
+
+
+@cache
+def _get_version_key():
+    # Reading the package is deferred to the first lookup, so that runs
+    # without the cache don't pay for it at startup.
+    return f"{_INTERPRETER_TAG}-{_hash_package()}"
+
+
+def default_cache_dir():
+    """Return the cache directory, `$SEA_CACHE_DIR` or `~/.cache/sea`
+    (under `$XDG_CACHE_HOME` if it is set)."""
+    if directory := os.environ.get("SEA_CACHE_DIR"):
+        return directory
+
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(
+        os.path.expanduser("~"), ".cache"
+    )
+    return os.path.join(base, "sea")
+
+
+class AnalysisCache:
+    """A directory of cached results, stored as one file per key under
+    a two character fan-out directory. Writes are atomic, so the cache
+    can be shared by concurrent processes."""
+
+    def __init__(self, directory=None, max_size=DEFAULT_MAX_SIZE):
+        self.directory = directory or default_cache_dir()
+        self.max_size = max_size
+        # Number of entries written through this instance (or, for
+        # `analyze_files`, through its copies in the workers), so that
+        # the callers can skip pruning when nothing was added.
+        self.writes = 0
+
+    def make_key(self, source: bytes, **options) -> str:
+        """Return the key of the analysis of `source` (plus anything
+        else that affects the result, e.g the file name that ends up in
+        code object reprs) with the given options."""
+        digest = hashlib.sha256(_get_version_key().encode())
+        for name, value in sorted(options.items()):
+            digest.update(f"\0{name}={value!r}".encode())
+        digest.update(b"\0")
+        digest.update(source)
+        return digest.hexdigest()
+
+    def _path_of(self, key):
+        return os.path.join(self.directory, key[:2], key)
+
+    def get(self, key) -> Optional[bytes]:
+        path = self._path_of(key)
+        try:
+            with open(path, "rb") as stream:
+                data = stream.read()
+        except OSError:
+            return None
+
+        # Hits are recorded in the modification time, which is what
+        # the eviction order is based on.
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return data
+
+    def put(self, key, data: bytes) -> bool:
+        """Store the given entry, and return whether it was written."""
+        # Only imported on a miss, most runs are all hits
+        import tempfile
+
+        path = self._path_of(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        except OSError:
+            # The cache is only an optimization, a read-only or full
+            # disk shouldn't fail the analysis.
+            return False
+
+        try:
+            with os.fdopen(fd, "wb") as stream:
+                stream.write(data)
+            os.replace(temp_path, path)
+        except OSError:
+            try:
+                os.unlink(temp_path)
+            except OSError:
+                pass
+            return False
+
+        self.writes += 1
+        return True
+
+    def _entries(self):
+        try:
+            fan_outs = os.scandir(self.directory)
+        except OSError:
+            return
+
+        with fan_outs:
+            for fan_out in fan_outs:
+                if not fan_out.is_dir():
+                    continue
+                with os.scandir(fan_out.path) as entries:
+                    for entry in entries:
+                        if entry.is_file():
+                            yield entry
+
+    def size(self):
+        return sum(entry.stat().st_size for entry in self._entries())
+
+    def prune(self, max_size=None):
+        """Evict the least recently used entries until the cache fits
+        into `max_size` bytes (the cache's own limit by default)."""
+        if max_size is None:
+            max_size = self.max_size
+
+        entries = []
+        total_size = 0
+        for entry in self._entries():
+            stat = entry.stat()
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total_size += stat.st_size
+
+        if total_size <= max_size:
+            return
+
+        entries.sort()
+        for _, size, path in entries:
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+
+            total_size -= size
+            if total_size <= max_size:
+                break
+
+    def clear(self):
+        self.prune(max_size=0)
+
+
+def add_cache_arguments(parser):
+    """Add the options of the results cache (`--cache-dir`,
+    `--cache-size` and `--no-cache`) to the given argument parser."""
+    parser.add_argument(
+        "--cache-dir",
+        help="directory of the results cache (default: ~/.cache/sea)",
+    )
+    parser.add_argument(
+        "--cache-size",
+        type=int,
+        default=DEFAULT_MAX_SIZE // (1024 * 1024),
+        help="size limit of the results cache in megabytes",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="don't read or write the results cache",
+    )
+
+
+def get_cache(options) -> Optional[AnalysisCache]:
+    """Return the cache configured by the options that
+    `add_cache_arguments` added (None, if it is disabled)."""
+    if options.no_cache:
+        return None
+    else:
+        return AnalysisCache(
+            options.cache_dir, max_size=options.cache_size * 1024 * 1024
+        )
@@ -0,0 +1,950 @@
+"""Interprocedural call graph of any number of modules.
+
+Calls are linked to the code objects they run when their callee can be
+resolved statically; a function or a class of the same module, a method
+looked up on `self`, on a class or on an instance created in the same
+scope, or a name imported from another module:
+
+    call_graph = CallGraph()
+    call_graph.add_module("app", analyze_module(app_code, enable_ir=True))
+    call_graph.add_module("app.util", analyze_module(util_code))
+    call_graph.reachable(["app.main"])
+
+Functions are named by their module and qualified name (`app.util.f`,
+`app.util.Parser.parse` or `app.f.<locals>.g`), and so are the modules
+and class bodies themselves (`app`, `app.util.Parser`). Callees that
+aren't code of any added module are named by what they resolved to,
+e.g `os.path.join` or `builtins.len`.
+
+Adding (or replacing) a module only summarizes that module. The names
+are resolved across modules, and the graph is rebuilt, on the next
+query, so modules can be added in any order and at any time.
+"""
+
+from __future__ import annotations
+
+import types
+from array import array
+from dataclasses import dataclass, field
+from inspect import CO_OPTIMIZED
+from typing import (
+    Any,
+    Dict,
+    FrozenSet,
+    Iterable,
+    List,
+    Mapping,
+    NamedTuple,
+    Optional,
+    Tuple,
+)
+
+from sea.algorithms import _adjacency, _search, _strongly_connected_components
+from sea.graph import Graph, Node
+from sea.virtuals import Block, Call, Constant, Merge, Partial
+
+_MISSING = object()
+
+_CALL_OPNAMES = frozenset(
+    (
+        "CALL_FUNCTION",
+        "CALL_FUNCTION_KW",
+        "CALL_FUNCTION_EX",
+        "CALL_METHOD",
+        # 3.11+
+        "CALL",
+    )
+)
+_STORE_OPNAMES = frozenset(
+    ("STORE_NAME", "STORE_FAST", "STORE_DEREF", "STORE_GLOBAL")
+)
+
+# Symbolic references to the values of a module, which are resolved
+# against all the added modules when linking. They are plain tuples:
+#
+#   ("symbol", name)               a function, class or module by name
+#   ("global", module, name)       a global of a module (or a builtin)
+#   ("name", scope, module, name)  a name in a class body
+#   ("local", scope, name)         a local variable of a function
+#   ("attr", reference, name)      an attribute of another value
+#   ("result", reference)          the result of calling another value
+#   ("instance", reference)        an instance of a class
+#   ("super", class)               `super()` in the methods of a class
+#   ("union", references)          any of the given values
+#
+# Call sites of class definitions run the class body itself, and refer
+# to it as ("code", class).
+
+
+@dataclass(frozen=True)
+class Function:
+    """A node of the call graph; a code object of one of the added
+    modules, or a callee that couldn't be resolved to one (in which case
+    `code` is None)."""
+
+    name: str
+    code: Optional[types.CodeType] = field(default=None, compare=False)
+
+    def as_string(self):
+        return self.name
+
+
+@dataclass
+class _ModuleSummary:
+    name: str
+    # Every code object of the module, by symbol
+    functions: Dict[str, types.CodeType] = field(default_factory=dict)
+    # The references to the bases of every class, by symbol
+    classes: Dict[str, Tuple[Any, ...]] = field(default_factory=dict)
+    # The bindings of the module (by its own name), of the class bodies
+    # and of the functions
+    scopes: Dict[str, Dict[str, List[Any]]] = field(default_factory=dict)
+    returns: Dict[str, List[Any]] = field(default_factory=dict)
+    star_imports: List[str] = field(default_factory=list)
+    # (caller symbol, callee reference) of every call site
+    calls: List[Tuple[str, Any]] = field(default_factory=list)
+
+
+def _calls_of(virtuals):
+    if virtuals and isinstance(virtuals[0], Block):
+        return [call for block in virtuals for call in block.calls]
+    return virtuals
+
+
+def _popped(call):
+    # The values a call consumed, without its oparg
+    if call.func.arg is None:
+        return call.arguments
+    return call.arguments[1:]
+
+
+def _constant(virtual):
+    if type(virtual) is Constant:
+        return virtual.value
+    elif type(virtual) is Call and virtual.func.opname == "LOAD_CONST":
+        return virtual.func.argval
+    return _MISSING
+
+
+def _is_call(virtual, opname):
+    return type(virtual) is Call and virtual.func.opname == opname
+
+
+def _is_null(virtual):
+    # The NULL that 3.11+ pushes below a callable; either explicitly, or
+    # along with a global (which the simulator splits into partials).
+    if type(virtual) is Partial:
+        return virtual.index == 0 and _is_call(virtual.call, "LOAD_GLOBAL")
+    return _is_call(virtual, "PUSH_NULL")
+
+
+def _unwrap(virtual):
+    # The global pushed along with a NULL stands for the LOAD_GLOBAL
+    if type(virtual) is Partial and _is_call(virtual.call, "LOAD_GLOBAL"):
+        return virtual.call
+    return virtual
+
+
+class _CallSite(NamedTuple):
+    # The callable, or the LOAD_METHOD that looked it up on `receiver`
+    callee: Any
+    # Every argument, with the keyword ones (named by `keywords`) last.
+    # `keywords` is None if the arguments aren't known (e.g they are
+    # unpacked through CALL_FUNCTION_EX).
+    arguments: Tuple[Any, ...]
+    keywords: Optional[Tuple[str, ...]]
+    receiver: Any = None
+
+    @property
+    def positional(self):
+        if self.keywords is None:
+            return ()
+        return self.arguments[: len(self.arguments) - len(self.keywords)]
+
+
+def _resolve_import(module, is_package, name, level):
+    if not level:
+        return name
+    parts = module.split(".")
+    if not is_package:
+        parts.pop()
+    if level > 1:
+        del parts[len(parts) - level + 1 :]
+    if name:
+        parts.append(name)
+    return ".".join(parts)
+
+
+class _Summarizer:
+    def __init__(self, module, results, is_package):
+        self.module = module
+        self.results = results
+        self.is_package = is_package
+        self.summary = _ModuleSummary(module)
+
+        # Code objects might have been copied (e.g by the workers), so
+        # they are matched by value rather than by identity.
+        self.qualnames = {}
+        for qualname, result in results.items():
+            self.qualnames.setdefault(result.code, qualname)
+        self.codes = {
+            qualname: result.code for qualname, result in results.items()
+        }
+        self.parents = {}
+        for qualname, code in self.codes.items():
+            for const in code.co_consts:
+                if isinstance(const, types.CodeType):
+                    child = self.qualnames.get(const)
+                    if child is not None:
+                        self.parents.setdefault(child, qualname)
+
+    def summarize(self):
+        summary = self.summary
+        for qualname, code in self.codes.items():
+            symbol = self.symbol(qualname)
+            summary.functions[symbol] = code
+            summary.scopes.setdefault(symbol, {})
+            if self.is_class(qualname):
+                summary.classes[symbol] = ()
+
+        for qualname, result in self.results.items():
+            if result.virtuals is not None:
+                self.summarize_code(qualname, _calls_of(result.virtuals))
+        return summary
+
+    def symbol(self, qualname):
+        if qualname not in self.parents:
+            return self.module
+        return f"{self.module}.{qualname}"
+
+    def is_class(self, qualname):
+        return qualname in self.parents and not (
+            self.codes[qualname].co_flags & CO_OPTIMIZED
+        )
+
+    def enclosing_class(self, qualname):
+        while (qualname := self.parents.get(qualname)) is not None:
+            if self.is_class(qualname):
+                return self.symbol(qualname)
+
+    def cell_owner(self, qualname, name):
+        # The scope that holds the cell of a free variable
+        while qualname is not None:
+            if name in self.codes[qualname].co_cellvars:
+                return qualname
+            qualname = self.parents.get(qualname)
+
+    def summarize_code(self, qualname, calls):
+        summary = self.summary
+        code = self.codes[qualname]
+        symbol = self.symbol(qualname)
+        scope = summary.scopes[symbol]
+        is_root = qualname not in self.parents
+
+        parent = self.parents.get(qualname)
+        if parent is not None and self.is_class(parent) and code.co_argcount:
+            # The first argument of a method is (most likely) an instance
+            # of its class.
+            scope.setdefault(code.co_varnames[0], []).append(
+                ("instance", ("symbol", self.symbol(parent)))
+            )
+
+        # IMPORT_FROM doesn't consume the module it imports from, which
+        # is the one of the last IMPORT_NAME before it. Similarly, the
+        # keyword names of a CALL (3.11+) are the ones of the KW_NAMES
+        # right before it.
+        imported = {}
+        keywords = {}
+        last_import = None
+        last_keywords = None
+        for call in sorted(calls, key=lambda call: call.func.offset):
+            opname = call.func.opname
+            if opname == "IMPORT_NAME":
+                last_import = call
+            elif opname == "IMPORT_FROM" and last_import is not None:
+                imported[id(call)] = (last_import, call.func.argval)
+            elif opname == "KW_NAMES":
+                last_keywords = call.func.argval
+            elif opname == "CALL" and last_keywords is not None:
+                keywords[id(call)] = last_keywords
+                last_keywords = None
+
+        context = _CodeContext(self, qualname, imported, keywords)
+        reference = context.reference
+        for call in calls:
+            opname = call.func.opname
+            popped = _popped(call)
+            if opname in _STORE_OPNAMES:
+                value = reference(popped[0])
+                if value is None:
+                    continue
+                name = call.func.argval
+                if opname == "STORE_GLOBAL":
+                    target = summary.scopes[self.module]
+                elif opname == "STORE_DEREF":
+                    owner = self.cell_owner(qualname, name)
+                    if owner is None:
+                        continue
+                    target = summary.scopes[self.symbol(owner)]
+                else:
+                    target = scope
+                target.setdefault(name, []).append(value)
+            elif opname == "RETURN_VALUE":
+                if (value := reference(popped[0])) is not None:
+                    summary.returns.setdefault(symbol, []).append(value)
+            elif opname == "IMPORT_STAR" and is_root:
+                value = reference(popped[0])
+                if value is not None and value[0] == "symbol":
+                    summary.star_imports.append(value[1])
+            elif opname in _CALL_OPNAMES:
+                if (site := context.call_site(call)) is None:
+                    continue
+                elif site.receiver is not None:
+                    callee = context.method(site)
+                elif _is_call(site.callee, "LOAD_BUILD_CLASS"):
+                    class_symbol = context.define_class(site)
+                    if class_symbol is not None:
+                        summary.calls.append((symbol, ("code", class_symbol)))
+                    continue
+                else:
+                    callee = reference(site.callee)
+                if callee is not None:
+                    summary.calls.append((symbol, callee))
+
+
+class _CodeContext:
+    """Builds the references to the values of a single code object."""
+
+    def __init__(self, summarizer, qualname, imported, keywords):
+        self.summarizer = summarizer
+        self.qualname = qualname
+        self.symbol = summarizer.symbol(qualname)
+        self.imported = imported
+        self.keywords = keywords
+        self.references = {}
+
+    def reference(self, virtual):
+        key = id(virtual)
+        try:
+            return self.references[key]
+        except KeyError:
+            pass
+
+        # Merges at loop headers might flow into themselves
+        self.references[key] = None
+        value = self.references[key] = self._reference(virtual)
+        return value
+
+    def _reference(self, virtual):
+        if type(virtual) is Merge:
+            values = []
+            for incoming in virtual.incoming:
+                value = self.reference(incoming)
+                if value is not None and value not in values:
+                    values.append(value)
+            if len(values) > 1:
+                return ("union", tuple(values))
+            return values[0] if values else None
+        elif type(virtual) is Partial:
+            # Only a global pushed along with a NULL stands for a value
+            if _is_null(virtual) or type(_unwrap(virtual)) is Partial:
+                return None
+            return self.reference(_unwrap(virtual))
+        elif type(virtual) is not Call:
+            return None
+
+        summarizer = self.summarizer
+        module = summarizer.module
+        opname = virtual.func.opname
+        argval = virtual.func.argval
+        if opname == "LOAD_GLOBAL":
+            return ("global", module, argval)
+        elif opname == "LOAD_NAME":
+            if summarizer.is_class(self.qualname):
+                return ("name", self.symbol, module, argval)
+            return ("global", module, argval)
+        elif opname == "LOAD_FAST":
+            return ("local", self.symbol, argval)
+        elif opname in ("LOAD_DEREF", "LOAD_CLASSDEREF"):
+            owner = summarizer.cell_owner(self.qualname, argval)
+            if owner is None:
+                return None
+            return ("local", summarizer.symbol(owner), argval)
+        elif opname == "LOAD_ATTR":
+            if (owner := self.reference(_popped(virtual)[0])) is None:
+                return None
+            return ("attr", owner, argval)
+        elif opname == "IMPORT_NAME":
+            name = self._import_target(virtual)
+            if _constant(_popped(virtual)[1]) is None:
+                # `import a.b` binds the top level package
+                name = name.partition(".")[0]
+            return ("symbol", name)
+        elif opname == "IMPORT_FROM":
+            if (imported := self.imported.get(id(virtual))) is None:
+                return None
+            import_name, attribute = imported
+            if _constant(_popped(import_name)[1]) is None:
+                # `import a.b.c as abc` walks down to the submodule
+                return ("symbol", self._import_target(import_name))
+            if (parent := self.reference(import_name)) is None:
+                return None
+            return ("attr", parent, attribute)
+        elif opname == "MAKE_FUNCTION":
+            return self._function(virtual)
+        elif opname in _CALL_OPNAMES:
+            if (site := self.call_site(virtual)) is None:
+                return None
+            elif site.receiver is not None:
+                if (callee := self.method(site)) is None:
+                    return None
+                return ("result", callee)
+            return self._call_result(site)
+        return None
+
+    def call_site(self, call) -> Optional[_CallSite]:
+        """Split the values that the given call consumed into the
+        callee and its arguments, for every version's call opnames."""
+        opname = call.func.opname
+        popped = _popped(call)
+        if not popped:
+            return None
+        elif opname == "CALL_FUNCTION":
+            return _CallSite(popped[0], popped[1:], ())
+        elif opname == "CALL_FUNCTION_KW":
+            keywords = _constant(popped[-1])
+            if not isinstance(keywords, tuple):
+                keywords = None
+            return _CallSite(popped[0], popped[1:-1], keywords)
+        elif opname == "CALL_FUNCTION_EX":
+            # 3.11+ pushes a NULL before the callable
+            if _is_null(popped[0]) and len(popped) > 1:
+                return _CallSite(_unwrap(popped[1]), (), None)
+            return _CallSite(popped[0], (), None)
+        elif len(popped) < 2:
+            return None
+        elif opname == "CALL_METHOD":
+            # CALL_METHOD consumes the receiver and the method it loaded
+            if not _is_call(popped[1], "LOAD_METHOD"):
+                return None
+            return _CallSite(popped[1], popped[2:], (), popped[0])
+
+        # A CALL (3.11+) consumes two values before the arguments; the
+        # receiver and the method loaded from it, a NULL and the
+        # callable, or the callable and its first argument (e.g a
+        # decorator and the function it decorates).
+        first, second, arguments = popped[0], popped[1], popped[2:]
+        keywords = self.keywords.get(id(call), ())
+        if not isinstance(keywords, tuple):
+            keywords = None
+        if _is_call(second, "LOAD_METHOD"):
+            return _CallSite(second, arguments, keywords, first)
+        elif _is_null(first):
+            return _CallSite(_unwrap(second), arguments, keywords)
+        return _CallSite(_unwrap(first), (second, *arguments), keywords)
+
+    def _import_target(self, import_name):
+        level = _constant(_popped(import_name)[0])
+        return _resolve_import(
+            self.summarizer.module,
+            self.summarizer.is_package,
+            import_name.func.argval,
+            level if type(level) is int else 0,
+        )
+
+    def _function(self, make_function):
+        for value in reversed(_popped(make_function)):
+            code = _constant(value)
+            if isinstance(code, types.CodeType):
+                qualname = self.summarizer.qualnames.get(code)
+                if qualname is not None:
+                    return ("symbol", self.summarizer.symbol(qualname))
+                return None
+        return None
+
+    def _definition(self, virtual):
+        # The function or class that is being defined by the given value,
+        # if any (looking through decorators).
+        if _is_call(virtual, "MAKE_FUNCTION"):
+            return self._function(virtual)
+        elif (
+            type(virtual) is Call
+            and virtual.func.opname in _CALL_OPNAMES
+            and (site := self.call_site(virtual)) is not None
+            and site.receiver is None
+        ):
+            if _is_call(site.callee, "LOAD_BUILD_CLASS"):
+                return self.reference(virtual)
+            elif _is_decoration(site):
+                return self._definition(site.arguments[0])
+        return None
+
+    def define_class(self, site):
+        arguments = site.arguments
+        if len(arguments) < 1 or not _is_call(arguments[0], "MAKE_FUNCTION"):
+            return None
+        if (body := self._function(arguments[0])) is None:
+            return None
+
+        class_symbol = body[1]
+        if site.keywords is None:
+            return class_symbol
+        self.summarizer.summary.classes[class_symbol] = tuple(
+            base
+            for base in map(self.reference, site.positional[2:])
+            if base is not None
+        )
+        return class_symbol
+
+    def _call_result(self, site):
+        callee = site.callee
+        if _is_call(callee, "LOAD_BUILD_CLASS"):
+            if (class_symbol := self.define_class(site)) is None:
+                return None
+            return ("symbol", class_symbol)
+        elif _is_call(callee, "LOAD_GLOBAL") and callee.func.argval == "super":
+            class_symbol = self.summarizer.enclosing_class(self.qualname)
+            if class_symbol is not None:
+                return ("super", class_symbol)
+
+        result = None
+        if (callee := self.reference(callee)) is not None:
+            result = ("result", callee)
+
+        # Decorators are assumed to keep (a wrapper around) the function
+        # they decorate, which is also what static and class methods or
+        # properties are called through.
+        if _is_decoration(site):
+            definition = self._definition(site.arguments[0])
+            if definition is not None and result is not None:
+                return ("union", (definition, result))
+            elif definition is not None:
+                return definition
+        return result
+
+    def method(self, site):
+        if (receiver := self.reference(site.receiver)) is None:
+            return None
+        return ("attr", receiver, site.callee.func.argval)
+
+
+def _is_decoration(site):
+    return site.keywords == () and len(site.arguments) == 1
+
+
+class _Value(NamedTuple):
+    symbol: str
+    instance: bool = False
+
+
+_NOTHING: FrozenSet[_Value] = frozenset()
+
+
+class _Resolver:
+    """Resolves the references of the summaries against each other."""
+
+    def __init__(self, modules):
+        self.modules = modules
+        self.functions = {}
+        self.classes = {}
+        self.scopes = {}
+        self.returns = {}
+        for summary in modules.values():
+            self.functions.update(summary.functions)
+            self.classes.update(summary.classes)
+            self.scopes.update(summary.scopes)
+            self.returns.update(summary.returns)
+        self._values = {}
+        self._mros = {}
+        self._subclasses = None
+
+    def resolve(self, reference) -> FrozenSet[_Value]:
+        try:
+            return self._values[reference]
+        except KeyError:
+            pass
+
+        # Cyclic references (e.g `x = x.parent` in a loop) resolve to
+        # whatever the rest of the cycle gives.
+        self._values[reference] = _NOTHING
+        values = self._values[reference] = frozenset(self._resolve(reference))
+        return values
+
+    def _resolve_all(self, references):
+        values = set()
+        for reference in references:
+            values.update(self.resolve(reference))
+        return values
+
+    def _resolve(self, reference):
+        kind = reference[0]
+        if kind == "symbol":
+            return self._symbol(reference[1])
+        elif kind == "global":
+            _, module, name = reference
+            references = self._global(module, name, set())
+            if references is None:
+                return {_Value(f"builtins.{name}")}
+            return self._resolve_all(references)
+        elif kind == "name":
+            _, scope, module, name = reference
+            if name in self.scopes[scope]:
+                return self._resolve_all(self.scopes[scope][name])
+            return self.resolve(("global", module, name))
+        elif kind == "local":
+            _, scope, name = reference
+            return self._resolve_all(self.scopes[scope].get(name, ()))
+        elif kind == "attr":
+            return self.attribute(self.resolve(reference[1]), reference[2])
+        elif kind == "result":
+            values = set()
+            for value in self.resolve(reference[1]):
+                if value.instance:
+                    continue
+                elif value.symbol in self.classes:
+                    values.add(_Value(value.symbol, True))
+                elif value.symbol in self.returns:
+                    values.update(
+                        self._resolve_all(self.returns[value.symbol])
+                    )
+            return values
+        elif kind == "instance":
+            return {
+                _Value(value.symbol, True)
+                for value in self.resolve(reference[1])
+                if not value.instance
+            }
+        elif kind == "super":
+            # The bases stand in for the rest of the MRO, which is exact
+            # with single inheritance. Their attributes are looked up as
+            # the ones of classes, since overrides don't matter here.
+            return {
+                _Value(base.symbol)
+                for base in self._resolve_all(self.classes[reference[1]])
+                if not base.instance
+            }
+        elif kind == "union":
+            return self._resolve_all(reference[1])
+        raise ValueError(f"unknown reference: {reference!r}")
+
+    def _symbol(self, symbol):
+        if (
+            symbol in self.functions
+            or symbol in self.classes
+            or symbol in self.modules
+        ):
+            return {_Value(symbol)}
+
+        # Anything else might be an alias within a known module or class
+        # (e.g a name that a package imports from its submodules).
+        prefix, dot, name = symbol.rpartition(".")
+        if not dot:
+            return {_Value(symbol)}
+        return self.attribute(self.resolve(("symbol", prefix)), name)
+
+    def _global(self, module, name, seen):
+        # The references bound to a global, through star imports too
+        scope = self.scopes.get(module)
+        if scope is None or module in seen:
+            return None
+        elif name in scope:
+            return scope[name]
+
+        seen.add(module)
+        for imported in self.modules[module].star_imports:
+            if (references := self._global(imported, name, seen)) is not None:
+                return references
+        return None
+
+    def attribute(self, values, name):
+        found = set()
+        for value in values:
+            symbol = value.symbol
+            if not value.instance and symbol in self.modules:
+                submodule = f"{symbol}.{name}"
+                if submodule in self.modules:
+                    found.add(_Value(submodule))
+                    continue
+                references = self._global(symbol, name, set())
+                if references is not None:
+                    found.update(self._resolve_all(references))
+                    continue
+            elif symbol in self.classes:
+                members = self.lookup(symbol, name)
+                if value.instance:
+                    # Methods are called on instances of the subclasses
+                    # too, which might override them.
+                    for subclass in self.subclasses(symbol):
+                        if name in self.scopes[subclass]:
+                            members = (members or _NOTHING) | frozenset(
+                                self._resolve_all(self.scopes[subclass][name])
+                            )
+                if members is not None:
+                    found.update(members)
+                # Anything else is an attribute of the instance itself,
+                # which isn't tracked.
+                if members is not None or value.instance:
+                    continue
+            found.add(_Value(f"{symbol}.{name}"))
+        return found
+
+    def lookup(self, class_symbol, name) -> Optional[FrozenSet[_Value]]:
+        """Look up an attribute of a class through its MRO."""
+        for cls in self.mro(class_symbol):
+            scope = self.scopes.get(cls)
+            if scope is not None and name in scope:
+                return frozenset(self._resolve_all(scope[name]))
+        return None
+
+    def mro(self, class_symbol) -> List[str]:
+        # A depth first, left to right linearization of the known bases;
+        # the same as the C3 one unless there is diamond inheritance.
+        if (mro := self._mros.get(class_symbol)) is not None:
+            return mro
+
+        mro = self._mros[class_symbol] = [class_symbol]
+        seen = {class_symbol}
+        for base in self._resolve_all(self.classes[class_symbol]):
+            if base.instance or base.symbol not in self.classes:
+                continue
+            for cls in self.mro(base.symbol):
+                if cls not in seen:
+                    seen.add(cls)
+                    mro.append(cls)
+        return mro
+
+    def subclasses(self, class_symbol) -> List[str]:
+        if self._subclasses is None:
+            self._subclasses = {}
+            for cls in self.classes:
+                for base in self.mro(cls)[1:]:
+                    self._subclasses.setdefault(base, []).append(cls)
+        return self._subclasses.get(class_symbol, [])
+
+    def targets(self, reference) -> List[str]:
+        """Return the symbols of what a call site runs."""
+        if reference[0] == "code":
+            return [reference[1]]
+
+        targets = []
+        for value in self.resolve(reference):
+            symbol = value.symbol
+            if value.instance:
+                members = None
+                if symbol in self.classes:
+                    members = self.lookup(symbol, "__call__")
+            elif symbol in self.classes:
+                # Instantiating a class runs its __init__, not its body
+                members = self.lookup(symbol, "__init__")
+                if members is None:
+                    targets.append(f"{symbol}.__init__")
+            else:
+                targets.append(symbol)
+                continue
+
+            for member in members or ():
+                if not member.instance:
+                    targets.append(member.symbol)
+        return sorted(set(targets))
+
+
+class CallGraph:
+    """The calls between the code objects of any number of modules (see
+    `add_module`), as a `sea.graph.Graph` of `Function`s with a `call`
+    edge from every caller to each of its callees."""
+
+    def __init__(self):
+        self._modules: Dict[str, _ModuleSummary] = {}
+        self._graph: Optional[Graph] = None
+        self._call_sites = array("q")
+        self._resolver: Optional[_Resolver] = None
+
+    def __len__(self):
+        return len(self._modules)
+
+    def __contains__(self, module):
+        return module in self._modules
+
+    def add_module(self, name, results, *, is_package=False):
+        """Add the results of `analyze_module` for the module with the
+        given (dotted) name, replacing any previous version of it. Set
+        `is_package` for `__init__` modules, so that their relative
+        imports resolve."""
+        summarizer = _Summarizer(name, results, is_package)
+        self._modules[name] = summarizer.summarize()
+        self._graph = self._resolver = None
+
+    def remove_module(self, name):
+        del self._modules[name]
+        self._graph = self._resolver = None
+
+    @property
+    def graph(self) -> Graph:
+        if self._graph is None:
+            self._link()
+        return self._graph
+
+    def _link(self):
+        resolver = _Resolver(self._modules)
+        graph = Graph()
+        nodes = {}
+        call_sites = array("q")
+
+        def node_of(symbol):
+            if (node := nodes.get(symbol)) is None:
+                node = nodes[symbol] = graph.add_node(
+                    Function(symbol, resolver.functions.get(symbol))
+                )
+            return node
+
+        for symbol in resolver.functions:
+            node_of(symbol)
+
+        for summary in self._modules.values():
+            for caller, callee in summary.calls:
+                source = node_of(caller)
+                for target in resolver.targets(callee):
+                    edge = graph.add_edge(
+                        source, node_of(target), {"type": "call"}
+                    )
+                    if edge.edge_id == len(call_sites):
+                        call_sites.append(1)
+                    else:
+                        call_sites[edge.edge_id] += 1
+
+        self._graph = graph
+        self._call_sites = call_sites
+        self._resolver = resolver
+
+    def find(self, symbol) -> Optional[Node]:
+        """Return the node of a function (or of an unresolved callee) by
+        its symbol, following the aliases of the added modules."""
+        graph = self.graph
+        if (node := graph.find_node(Function(symbol))) is not None:
+            return node
+        for value in self._resolver.resolve(("symbol", symbol)):
+            if not value.instance:
+                return graph.find_node(Function(value.symbol))
+        return None
+
+    def _node_ids(self, symbols):
+        node_ids = []
+        for symbol in symbols:
+            if (node := self.find(symbol)) is None:
+                raise KeyError(symbol)
+            node_ids.append(node.node_id)
+        return node_ids
+
+    def callees(self, symbol) -> List[Node]:
+        if (node := self.find(symbol)) is None:
+            raise KeyError(symbol)
+        return self.graph.successors(node)
+
+    def callers(self, symbol) -> List[Node]:
+        if (node := self.find(symbol)) is None:
+            raise KeyError(symbol)
+        return self.graph.predecessors(node)
+
+    def call_sites(self, edge) -> int:
+        """Return the number of call sites behind a call edge."""
+        if self._graph is None:
+            self._link()
+        return self._call_sites[edge.edge_id]
+
+    def roots(self) -> List[Node]:
+        """Return the code objects that nothing calls (e.g the modules
+        themselves, or the entry points of an application)."""
+        graph = self.graph
+        return [
+            node
+            for node in graph.nodes
+            if node.virtual.code is not None and not graph.in_degree(node)
+        ]
+
+    def reachable(self, symbols: Iterable[str]) -> List[Node]:
+        """Return everything that might be called (transitively) from any
+        of the given functions, including themselves."""
+        graph = self.graph
+        node_ids = _search(_adjacency(graph, True), self._node_ids(symbols))
+        nodes = graph.nodes
+        return [nodes[node_id] for node_id in sorted(node_ids)]
+
+    def unreachable(self, symbols: Iterable[str]) -> List[Node]:
+        """Return the code objects that can't be called from any of the
+        given functions."""
+        graph = self.graph
+        node_ids = _search(_adjacency(graph, True), self._node_ids(symbols))
+        return [
+            node
+            for node in graph.nodes
+            if node.node_id not in node_ids and node.virtual.code is not None
+        ]
+
+    def hot_paths(
+        self,
+        symbols: Optional[Iterable[str]] = None,
+        *,
+        costs: Optional[Mapping[str, float]] = None,
+        limit: int = 10,
+    ) -> List[Tuple[float, List[Node]]]:
+        """Return the heaviest call chain starting from each of the given
+        functions (the roots by default), heaviest first and at most
+        `limit` of them, as `(cost, chain)` pairs.
+
+        The cost of a chain is the sum of the `costs` of its functions
+        (e.g their own time in a profile, by symbol), which defaults to 1
+        for every code object of the added modules and 0 for the rest.
+        Recursive functions (strongly connected components) are counted
+        once, and shown by the function the chain enters them through.
+        """
+        graph = self.graph
+        if symbols is None:
+            starts = [node.node_id for node in self.roots()]
+        else:
+            starts = self._node_ids(symbols)
+
+        nodes = graph.nodes
+        if costs is None:
+            node_costs = [
+                float(node.virtual.code is not None) for node in nodes
+            ]
+        else:
+            node_costs = [costs.get(node.key, 0.0) for node in nodes]
+
+        # The heaviest chain from each component, over the condensation
+        # of the graph (visited in reverse topological order).
+        components = graph._cached(
+            "strongly_connected_components",
+            _strongly_connected_components,
+            graph,
+        )
+        component_of = [0] * len(nodes)
+        for index, component in enumerate(components):
+            for node_id in component:
+                component_of[node_id] = index
+
+        adjacency = _adjacency(graph, True)
+        best = [0.0] * len(components)
+        following = [-1] * len(components)
+        for index in reversed(range(len(components))):
+            heaviest, successor = 0.0, -1
+            for node_id in components[index]:
+                for neighbour in adjacency[node_id]:
+                    other = component_of[neighbour]
+                    if other != index and (
+                        successor == -1 or best[other] > heaviest
+                    ):
+                        heaviest, successor = best[other], neighbour
+            best[index] = heaviest + sum(
+                node_costs[node_id] for node_id in components[index]
+            )
+            following[index] = successor
+
+        paths = []
+        for node_id in dict.fromkeys(starts):
+            chain = [nodes[node_id]]
+            while (node_id := following[component_of[node_id]]) != -1:
+                chain.append(nodes[node_id])
+            paths.append((best[component_of[chain[0].node_id]], chain))
+        paths.sort(key=lambda path: path[0], reverse=True)
+        return paths[:limit]
@@ -0,0 +1,114 @@
+"""A thin client for the analysis server (see `sea.server`).
+
+Only the standard library is imported here, so that asking a running
+server for an analysis costs little more than the interpreter startup:
+
+    $ python -m sea.server &
+    $ python -m sea.client --nested path/to/file.py
+"""
+
+import json
+import os
+import socket
+import sys
+import tempfile
+from argparse import ArgumentParser
+
+PROTOCOL_VERSION = 1
+
+
+class ServerError(Exception):
+    """A request that the server couldn't fulfill."""
+
+
+def default_socket_path():
+    """Return the socket of the server, `$SEA_SOCKET` or `sea.sock` in
+    the runtime directory of the user (a temporary one by default)."""
+    if path := os.environ.get("SEA_SOCKET"):
+        return path
+    elif directory := os.environ.get("XDG_RUNTIME_DIR"):
+        return os.path.join(directory, "sea.sock")
+    else:
+        return os.path.join(tempfile.gettempdir(), f"sea-{os.getuid()}.sock")
+
+
+def request(payload, socket_path=None, *, timeout=None):
+    """Send a single request to the server and return its response.
+    Requests and responses are JSON objects, one per line."""
+    if socket_path is None:
+        socket_path = default_socket_path()
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        connection.settimeout(timeout)
+        connection.connect(socket_path)
+        connection.sendall(
+            json.dumps({"version": PROTOCOL_VERSION, **payload}).encode()
+            + b"\n"
+        )
+        with connection.makefile("rb") as stream:
+            line = stream.readline()
+
+    if not line:
+        raise ServerError("the server closed the connection")
+    response = json.loads(line)
+    if "error" in response:
+        raise ServerError(response["error"])
+    return response
+
+
+def main():
+    parser = ArgumentParser(prog="python -m sea.client")
+    parser.add_argument("file", nargs="?", help="source file to analyze")
+    parser.add_argument("--enable-ir", action="store_true", help="Enable IR")
+    parser.add_argument(
+        "--nested",
+        action="store_true",
+        help="analyze every nested code object (functions, classes etc.)",
+    )
+    parser.add_argument(
+        "--qualname",
+        help="only print the nested code object with this qualified name",
+    )
+    parser.add_argument(
+        "--socket", help="socket of the server (default: $SEA_SOCKET)"
+    )
+    parser.add_argument(
+        "--status", action="store_true", help="print the server statistics"
+    )
+    parser.add_argument(
+        "--shutdown", action="store_true", help="stop the server"
+    )
+
+    options = parser.parse_args()
+    if options.status:
+        payload = {"command": "status"}
+    elif options.shutdown:
+        payload = {"command": "shutdown"}
+    elif options.file is None:
+        parser.error("a file is needed, unless --status or --shutdown")
+    else:
+        payload = {
+            "command": "analyze",
+            # The server doesn't share the working directory
+            "path": os.path.abspath(options.file),
+            "enable_ir": options.enable_ir,
+            "nested": options.nested or options.qualname is not None,
+        }
+        if options.qualname is not None:
+            payload["qualname"] = options.qualname
+
+    try:
+        response = request(payload, options.socket)
+    except (OSError, ServerError) as exc:
+        print(f"error: {exc}", file=sys.stderr)
+        sys.exit(1)
+
+    if options.status:
+        json.dump(response, sys.stdout, indent=4)
+        print()
+    elif "output" in response:
+        sys.stdout.write(response["output"])
+
+
+if __name__ == "__main__":
+    main()
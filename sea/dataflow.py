@@ -0,0 +1,320 @@
+"""A worklist solver for dataflow problems over the blocks returned by
+`sea.simulator.simulate_ir`, plus the classic analyses built on it
+(live variables, reaching definitions and dead stores).
+
+Facts are sets over a fixed universe (e.g the local variables of the
+code object), represented as integer bitsets so that the meet and the
+transfer functions are single integer operations. Only the edges of the
+IR are followed; exceptional control flow is not modelled.
+"""
+
+from __future__ import annotations
+
+import heapq
+import operator
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterator, List, Sequence
+
+from sea.algorithms import _reverse_postorder
+from sea.virtuals import Block, Call
+
+LOAD_OPS = frozenset(("LOAD_FAST", "LOAD_FAST_CHECK"))
+STORE_OPS = frozenset(("STORE_FAST",))
+DELETE_OPS = frozenset(("DELETE_FAST",))
+
+
+class BitIndex:
+    """Numbers the items of a universe (local variable names, definition
+    sites, ...) so that sets of them can be represented as bitsets. Items
+    are looked up through `key` (the item itself by default)."""
+
+    def __init__(self, items=(), *, key=None):
+        self.items: List[Any] = []
+        self._key = key
+        self._indexes: Dict[Any, int] = {}
+        for item in items:
+            self.add(item)
+
+    def _key_of(self, item):
+        return item if self._key is None else self._key(item)
+
+    def add(self, item) -> int:
+        """Add the item (if it is new) and return its bit."""
+        key = self._key_of(item)
+        if (index := self._indexes.get(key)) is None:
+            index = self._indexes[key] = len(self.items)
+            self.items.append(item)
+        return 1 << index
+
+    def bit(self, item) -> int:
+        return 1 << self._indexes[self._key_of(item)]
+
+    def decode(self, bits: int) -> List[Any]:
+        """Return the items of the given bitset, in index order."""
+        items = []
+        while bits:
+            lowest = bits & -bits
+            items.append(self.items[lowest.bit_length() - 1])
+            bits ^= lowest
+        return items
+
+    @property
+    def universe(self) -> int:
+        return (1 << len(self.items)) - 1
+
+    def __len__(self):
+        return len(self.items)
+
+
+@dataclass
+class DataflowResult:
+    """The fixpoint of a dataflow problem. `before[i]` and `after[i]`
+    are the bitsets at the start and at the end of `blocks[i]`,
+    regardless of the direction of the problem."""
+
+    blocks: List[Block]
+    before: List[int]
+    after: List[int]
+    index: BitIndex = field(default_factory=BitIndex)
+    iterations: int = 0
+
+    def __post_init__(self):
+        self._positions = _positions_of(self.blocks)
+
+    def _position(self, block):
+        return self._positions[block.name]
+
+    def at_start(self, block) -> List[Any]:
+        return self.index.decode(self.before[self._position(block)])
+
+    def at_end(self, block) -> List[Any]:
+        return self.index.decode(self.after[self._position(block)])
+
+
+def _positions_of(blocks):
+    return {block.name: position for position, block in enumerate(blocks)}
+
+
+def _control_flow(blocks):
+    positions = _positions_of(blocks)
+    successors = [
+        [positions[next_block.name] for next_block in block.next_blocks]
+        for block in blocks
+    ]
+    predecessors = [[] for _ in blocks]
+    for position, targets in enumerate(successors):
+        for target in targets:
+            predecessors[target].append(position)
+    return successors, predecessors
+
+
+def _exits(successors):
+    return [node for node, targets in enumerate(successors) if not targets]
+
+
+def _iteration_order(successors, predecessors, backward):
+    if not backward:
+        order = _reverse_postorder(successors, 0)
+    else:
+        # Reverse postorder of the reversed graph, entered from a virtual
+        # node that precedes every exit.
+        exit_node = len(successors)
+        exits = _exits(successors)
+        order = _reverse_postorder([*predecessors, exits], exit_node)[1:]
+
+    # Blocks that the traversal didn't reach (e.g infinite loops, when
+    # going backwards) still need a rank.
+    if len(order) != len(successors):
+        seen = set(order)
+        order.extend(
+            node for node in range(len(successors)) if node not in seen
+        )
+    return order
+
+
+def solve(
+    blocks: Sequence[Block],
+    transfer: Callable[[Block, int], int],
+    *,
+    backward: bool = False,
+    boundary: int = 0,
+    initial: int = 0,
+    meet: Callable[[int, int], int] = operator.or_,
+    index: BitIndex = None,
+) -> DataflowResult:
+    """Solve a dataflow problem over the given blocks (the first one being
+    the entry) and return its fixpoint.
+
+    `transfer(block, facts)` maps the facts flowing into a block to the
+    ones flowing out of it (its start to its end for forward problems,
+    the other way around for `backward` ones). The facts entering the
+    entry block (or leaving the exit blocks) are `boundary`, everything
+    else starts from `initial`; use `operator.and_` as the `meet` (and
+    the full universe as `initial`) for must problems.
+
+    Blocks are visited in reverse postorder (of the reversed graph, for
+    backward problems) through a priority worklist, so acyclic regions
+    converge in a single pass."""
+    blocks = list(blocks)
+    successors, predecessors = _control_flow(blocks)
+    if backward:
+        sources, sinks = successors, predecessors
+        boundaries = set(_exits(successors))
+    else:
+        sources, sinks = predecessors, successors
+        boundaries = {0}
+
+    order = _iteration_order(successors, predecessors, backward)
+    rank = [0] * len(blocks)
+    for position, node in enumerate(order):
+        rank[node] = position
+
+    inputs = [initial] * len(blocks)
+    outputs = [initial] * len(blocks)
+    pending = [True] * len(blocks)
+    worklist = list(range(len(blocks)))
+    iterations = 0
+    while worklist:
+        node = order[heapq.heappop(worklist)]
+        pending[node] = False
+        iterations += 1
+
+        if node in boundaries:
+            facts = boundary
+            for source in sources[node]:
+                facts = meet(facts, outputs[source])
+        elif sources[node]:
+            facts = outputs[sources[node][0]]
+            for source in sources[node][1:]:
+                facts = meet(facts, outputs[source])
+        else:
+            facts = initial
+
+        inputs[node] = facts
+        facts = transfer(blocks[node], facts)
+        if facts != outputs[node]:
+            outputs[node] = facts
+            for sink in sinks[node]:
+                if not pending[sink]:
+                    pending[sink] = True
+                    heapq.heappush(worklist, rank[sink])
+
+    if backward:
+        inputs, outputs = outputs, inputs
+    if index is None:
+        index = BitIndex()
+    return DataflowResult(blocks, inputs, outputs, index, iterations)
+
+
+def solve_gen_kill(
+    blocks: Sequence[Block],
+    gen: Sequence[int],
+    kill: Sequence[int],
+    **options,
+) -> DataflowResult:
+    """Solve a problem whose transfer functions are `gen | (facts &
+    ~kill)`, with the gen and kill sets given per block (in the order of
+    `blocks`). Takes the same options as `solve`."""
+    positions = _positions_of(blocks)
+    masks = [~bits for bits in kill]
+
+    def transfer(block, facts):
+        position = positions[block.name]
+        return gen[position] | (facts & masks[position])
+
+    return solve(blocks, transfer, **options)
+
+
+def iter_local_accesses(block: Block) -> Iterator[Call]:
+    """Yield the calls of the block that load, store or delete a fast
+    local, in execution order."""
+    for call in block.calls:
+        opname = call.func.opname
+        if opname in LOAD_OPS or opname in STORE_OPS or opname in DELETE_OPS:
+            yield call
+
+
+def local_variables(blocks: Sequence[Block]) -> BitIndex:
+    """Return the index of the fast locals accessed in the blocks,
+    numbered in the order they are first seen."""
+    index = BitIndex()
+    for block in blocks:
+        for call in iter_local_accesses(block):
+            index.add(call.func.argval)
+    return index
+
+
+def live_variables(blocks: Sequence[Block]) -> DataflowResult:
+    """Compute the local variables that are live (might be read before
+    they are written again) at the start and end of each block."""
+    index = local_variables(blocks)
+    uses, definitions = [], []
+    for block in blocks:
+        used = defined = 0
+        for call in iter_local_accesses(block):
+            bit = index.bit(call.func.argval)
+            if call.func.opname in LOAD_OPS:
+                used |= bit & ~defined
+            else:
+                defined |= bit
+        uses.append(used)
+        definitions.append(defined)
+
+    return solve_gen_kill(
+        blocks, uses, definitions, backward=True, index=index
+    )
+
+
+def reaching_definitions(blocks: Sequence[Block]) -> DataflowResult:
+    """Compute the definitions (`STORE_FAST` calls) that might reach the
+    start and end of each block without being overwritten or deleted."""
+    index = BitIndex(key=operator.attrgetter("name"))
+    variables: Dict[str, int] = {}
+    for block in blocks:
+        for call in iter_local_accesses(block):
+            if call.func.opname in STORE_OPS:
+                bit = index.add(call)
+                name = call.func.argval
+                variables[name] = variables.get(name, 0) | bit
+
+    gens, kills = [], []
+    for block in blocks:
+        generated = killed = 0
+        for call in iter_local_accesses(block):
+            if call.func.opname in LOAD_OPS:
+                continue
+            variable = variables.get(call.func.argval, 0)
+            generated &= ~variable
+            killed |= variable
+            if call.func.opname in STORE_OPS:
+                generated |= index.bit(call)
+        gens.append(generated)
+        kills.append(killed)
+
+    return solve_gen_kill(blocks, gens, kills, index=index)
+
+
+def dead_stores(
+    blocks: Sequence[Block], liveness: DataflowResult = None
+) -> List[Call]:
+    """Return the `STORE_FAST` calls whose value is never read, i.e the
+    variable is dead right after the store."""
+    if liveness is None:
+        liveness = live_variables(blocks)
+
+    index = liveness.index
+    stores = []
+    for position, block in enumerate(liveness.blocks):
+        live = liveness.after[position]
+        block_stores = []
+        for call in reversed(list(iter_local_accesses(block))):
+            bit = index.bit(call.func.argval)
+            if call.func.opname in LOAD_OPS:
+                live |= bit
+                continue
+            if call.func.opname in STORE_OPS and not live & bit:
+                block_stores.append(call)
+            live &= ~bit
+        stores.extend(reversed(block_stores))
+
+    return stores
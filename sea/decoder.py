@@ -0,0 +1,236 @@
+"""A lightweight alternative to `dis.Bytecode`.
+
+`dis.Bytecode` materializes a full `dis.Instruction` for every instruction,
+including the argrepr strings and line information which the simulator never
+looks at. `Instructions` decodes `co_code` into parallel arrays of opcodes,
+args and offsets instead, and only hands out small views (with a lazily
+resolved argval) on demand.
+"""
+
+from __future__ import annotations
+
+import dis
+import sys
+from array import array
+from bisect import bisect_left
+from collections.abc import Sequence
+
+import opcode
+
+from sea.profiling import profiled
+
+_HAS_CONST = frozenset(opcode.hasconst)
+_HAS_NAME = frozenset(opcode.hasname)
+_HAS_JABS = frozenset(opcode.hasjabs)
+_HAS_JREL = frozenset(opcode.hasjrel)
+_HAS_LOCAL = frozenset(opcode.haslocal)
+_HAS_COMPARE = frozenset(opcode.hascompare)
+_HAS_FREE = frozenset(opcode.hasfree)
+
+_FORMAT_VALUE = opcode.opmap["FORMAT_VALUE"]
+_EXTENDED_ARG = opcode.EXTENDED_ARG
+_HAVE_ARGUMENT = opcode.HAVE_ARGUMENT
+
+# Jump offsets are counted in instructions (rather than bytes)
+# starting from 3.10, and 3.11 introduced inline caches, backward
+# jumps, the NULL bit on LOAD_GLOBAL and a unified localsplus array.
+_WORDCODE_JUMPS = sys.version_info >= (3, 10)
+_CACHE_ENTRIES = getattr(opcode, "_inline_cache_entries", None)
+_BACKWARD_JUMPS = frozenset(
+    op for op in _HAS_JREL if "JUMP_BACKWARD" in opcode.opname[op]
+)
+_LOAD_GLOBAL = (
+    opcode.opmap["LOAD_GLOBAL"] if sys.version_info >= (3, 11) else None
+)
+_VARNAME_FROM_OPARG = sys.version_info >= (3, 11)
+
+_FORMAT_VALUE_CONVERTERS = (None, str, repr, ascii)
+
+
+class Instruction:
+    """A view over a single decoded instruction. It offers the subset of
+    the `dis.Instruction` interface that the SEA pipeline relies on."""
+
+    __slots__ = ("opcode", "arg", "offset", "_instructions", "_argval")
+
+    def __init__(self, instructions, op, arg, offset):
+        self.opcode = op
+        self.arg = arg
+        self.offset = offset
+        self._instructions = instructions
+
+    @property
+    def opname(self):
+        return opcode.opname[self.opcode]
+
+    @property
+    def argval(self):
+        try:
+            return self._argval
+        except AttributeError:
+            self._argval = self._instructions.resolve_argval(
+                self.opcode, self.arg, self.offset
+            )
+            return self._argval
+
+    @classmethod
+    def detached(cls, op, arg, offset, argval):
+        """Create an instruction that doesn't belong to any decoded code
+        object, e.g when loading serialized results."""
+        instruction = cls(None, op, arg, offset)
+        instruction._argval = argval
+        return instruction
+
+    def __reduce__(self):
+        instructions = self._instructions
+        if instructions is None:
+            return Instruction.detached, (
+                self.opcode,
+                self.arg,
+                self.offset,
+                self.argval,
+            )
+        return instructions.__getitem__, (instructions.index(self.offset),)
+
+    def __repr__(self):
+        return (
+            f"Instruction(opname={self.opname!r}, arg={self.arg!r},"
+            f" offset={self.offset!r})"
+        )
+
+
+class Instructions(Sequence):
+    """Instructions of a code object, decoded into compact parallel
+    arrays of opcodes, args and offsets."""
+
+    def __init__(self, code):
+        self.code = code
+        self.opcodes = array("B")
+        self.args = array("q")
+        self.offsets = array("L")
+
+        self._decode(code.co_code)
+        self._views = [None] * len(self.opcodes)
+        self._materialized = False
+
+    def _decode(self, raw_code):
+        opcodes, args, offsets = self.opcodes, self.args, self.offsets
+
+        extended_arg = 0
+        caches = 0
+        for offset in range(0, len(raw_code), 2):
+            if caches:
+                caches -= 1
+                continue
+
+            op = raw_code[offset]
+            if op >= _HAVE_ARGUMENT:
+                arg = raw_code[offset + 1] | extended_arg
+                extended_arg = (arg << 8) if op == _EXTENDED_ARG else 0
+            else:
+                arg = 0
+                extended_arg = 0
+
+            if _CACHE_ENTRIES is not None:
+                caches = _CACHE_ENTRIES[op]
+
+            opcodes.append(op)
+            args.append(arg)
+            offsets.append(offset)
+
+    def __reduce__(self):
+        # Decoding again is cheaper than pickling the views
+        return Instructions, (self.code,)
+
+    def __len__(self):
+        return len(self.opcodes)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[item] for item in range(*index.indices(len(self)))]
+
+        if (view := self._views[index]) is None:
+            op = self.opcodes[index]
+            view = self._views[index] = Instruction(
+                self,
+                op,
+                self.args[index] if op >= _HAVE_ARGUMENT else None,
+                self.offsets[index],
+            )
+        return view
+
+    def __iter__(self):
+        if not self._materialized:
+            self._materialized = True
+            self._views = [
+                view or Instruction(self, op, arg, offset)
+                for view, op, arg, offset in zip(
+                    self._views,
+                    self.opcodes,
+                    self._iter_args(),
+                    self.offsets,
+                )
+            ]
+        return iter(self._views)
+
+    def _iter_args(self):
+        for op, arg in zip(self.opcodes, self.args):
+            yield arg if op >= _HAVE_ARGUMENT else None
+
+    def index(self, offset):
+        """Return the index of the instruction at the given offset."""
+        index = bisect_left(self.offsets, offset)
+        if index == len(self.offsets) or self.offsets[index] != offset:
+            raise ValueError(f"no instruction at offset {offset}")
+        return index
+
+    def resolve_argval(self, op, arg, offset):
+        """Resolve the argval of the given instruction, in the same way
+        `dis` does (except for KW_NAMES on 3.11, which resolves to the
+        tuple of names rather than `dis.UNKNOWN`)."""
+        if arg is None:
+            return None
+
+        code = self.code
+        if op in _HAS_CONST:
+            return code.co_consts[arg]
+        elif op in _HAS_NAME:
+            if op == _LOAD_GLOBAL:
+                arg //= 2
+            return code.co_names[arg]
+        elif op in _HAS_JABS:
+            return arg * 2 if _WORDCODE_JUMPS else arg
+        elif op in _HAS_JREL:
+            if op in _BACKWARD_JUMPS:
+                arg = -arg
+            return offset + 2 + (arg * 2 if _WORDCODE_JUMPS else arg)
+        elif op in _HAS_LOCAL or op in _HAS_FREE:
+            if _VARNAME_FROM_OPARG:
+                return code._varname_from_oparg(arg)
+            elif op in _HAS_LOCAL:
+                return code.co_varnames[arg]
+            else:
+                return (code.co_cellvars + code.co_freevars)[arg]
+        elif op in _HAS_COMPARE:
+            return opcode.cmp_op[arg]
+        elif op == _FORMAT_VALUE:
+            return (_FORMAT_VALUE_CONVERTERS[arg & 0x3], bool(arg & 0x4))
+        else:
+            return arg
+
+
+def get_code_object(source):
+    """Return the code object of the given function, source string etc.
+    (anything `dis.Bytecode` accepts)."""
+    return dis._get_code_object(source)
+
+
+def _describe_instructions(instructions):
+    return {"instructions": len(instructions)}
+
+
+@profiled("decode", _describe_instructions)
+def decode_instructions(source):
+    """Decode the given code object, function or source string
+    (anything `dis.Bytecode` accepts) into `Instructions`."""
+    return Instructions(get_code_object(source))
@@ -1,15 +1,71 @@
 from __future__ import annotations
 
-from dataclasses import dataclass, field
-from typing import Any, Dict, List
+from array import array
+from collections.abc import MutableMapping, Sequence
+from enum import IntEnum
+from typing import Any, Dict, List, NamedTuple, Optional
 
 from sea.virtuals import Virtual
 
+_MISSING = -1
+_ABSENT = object()
+_STORED_KEYS = frozenset(("type", "position", "label"))
+
+
+class EdgeType(IntEnum):
+    """The `type` of an edge, as stored in the graph. Edges without a
+    type (or with a type that isn't listed here) are `OTHER`."""
+
+    OTHER = 0
+    ARGUMENT = 1
+    PATCHED = 2
+    FLOW = 3
+    MERGE = 4
+    CALL = 5
+
+    @classmethod
+    def from_name(cls, name):
+        return _EDGE_TYPES.get(name, cls.OTHER)
+
+
+_EDGE_TYPES = {
+    edge_type.name.lower(): edge_type
+    for edge_type in EdgeType
+    if edge_type is not EdgeType.OTHER
+}
+
 
-@dataclass
 class Graph:
-    _nodes: Dict[Any, Node] = field(default_factory=dict)
-    _edges: Dict[Any, Edge] = field(default_factory=dict)
+    """A directed graph of virtuals. Nodes are interned by the names of
+    their virtuals and numbered in insertion order, and edges are kept
+    in parallel integer arrays (sources, destinations, types, argument
+    positions and labels) rather than as individual objects. `Node`s
+    and `Edge`s are only handed out as views.
+
+    Adding an existing node or edge again returns the existing one;
+    nothing is constructed before the lookup."""
+
+    def __init__(self):
+        self._node_ids: Dict[str, int] = {}
+        self._nodes: List[Node] = []
+
+        self._edge_ids: Dict[int, int] = {}
+        self._sources = array("q")
+        self._destinations = array("q")
+        self._types = array("b")
+        self._positions = array("q")
+        self._labels = array("q")
+        self._label_table: List[Any] = []
+        self._label_ids: Dict[Any, int] = {}
+        # Metadata that doesn't fit into the arrays (untyped edges
+        # or unknown keys), keyed by the edge id.
+        self._extra_metadata: Dict[int, Dict[Any, Any]] = {}
+
+        self._out_degrees = array("q")
+        self._in_degrees = array("q")
+        # Derived data (adjacency, results of the graph algorithms),
+        # dropped whenever the graph changes.
+        self._cache: Dict[Any, Any] = {}
 
     @classmethod
     def from_calls(cls, calls):
@@ -18,70 +74,367 @@ class Graph:
 
         return transform_calls(calls, graph=cls())
 
-    def _add(self, cls, store, *args, **kwargs):
-        # There might be multiple add() calls with the same
-        # objects, so for providing some sort of singleton-like
-        # interface, each graph item is responsible for generating
-        # a hash-like key (not a hash, just some identifier) and this
-        # method gets/sets that key in the given store.
+    def add_node(self, virtual):
+        key = virtual.name
+        if (node_id := self._node_ids.get(key)) is not None:
+            return self._nodes[node_id]
 
-        # TODO: maybe offer get_key() as a class-method to optimize
-        # out the new-object creation.
-        graph_item = cls(*args, **kwargs)
-        if graph_item.key not in store:
-            store[graph_item.key] = graph_item
+        node = Node(virtual, len(self._nodes))
+        self._node_ids[key] = node.node_id
+        self._nodes.append(node)
+        self._out_degrees.append(0)
+        self._in_degrees.append(0)
+        self._cache.clear()
+        return node
 
-        return store[graph_item.key]
+    def find_node(self, virtual) -> Optional[Node]:
+        if (node_id := self._node_ids.get(virtual.name)) is not None:
+            return self._nodes[node_id]
 
-    def add_node(self, *args, **kwargs):
-        node = self._add(Node, self._nodes, *args, **kwargs)
-        return node
+    def add_edge(self, source, destination, metadata=None):
+        source_id = source.node_id
+        destination_id = destination.node_id
+
+        # Node ids are dense, so an edge key packs into a single integer.
+        key = (source_id << 32) | destination_id
+        if (edge_id := self._edge_ids.get(key)) is not None:
+            return Edge(self, edge_id)
+
+        edge_id = self._edge_ids[key] = len(self._sources)
+        self._sources.append(source_id)
+        self._destinations.append(destination_id)
+        self._out_degrees[source_id] += 1
+        self._in_degrees[destination_id] += 1
+        self._cache.clear()
+        self._store_metadata(edge_id, metadata or {})
+        return Edge(self, edge_id)
+
+    def _intern_label(self, label):
+        if (label_id := self._label_ids.get(label)) is None:
+            label_id = self._label_ids[label] = len(self._label_table)
+            self._label_table.append(label)
+        return label_id
+
+    def _encode_metadata(self, metadata):
+        get = metadata.get
+        edge_type = _EDGE_TYPES.get(get("type"), EdgeType.OTHER)
+        position = get("position", _ABSENT)
+        label = get("label", _ABSENT)
+        label = _MISSING if label is _ABSENT else self._intern_label(label)
+
+        # Everything the arrays can't hold (an unknown type, a position
+        # that isn't a non-negative integer, or any other key) is kept
+        # separately.
+        stored = (edge_type is not EdgeType.OTHER) + (label != _MISSING)
+        if type(position) is int and position >= 0:
+            stored += 1
+        else:
+            position = _MISSING
+
+        if stored != len(metadata):
+            extra = {
+                name: value
+                for name, value in metadata.items()
+                if name not in _STORED_KEYS
+                or (name == "type" and edge_type is EdgeType.OTHER)
+                or (name == "position" and position == _MISSING)
+            }
+        else:
+            extra = None
+        return edge_type, position, label, extra
 
-    def add_edge(self, *args, **kwargs):
-        edge = self._add(Edge, self._edges, *args, **kwargs)
+    def _store_metadata(self, edge_id, metadata):
+        edge_type, position, label, extra = self._encode_metadata(metadata)
+        self._types.append(edge_type)
+        self._positions.append(position)
+        self._labels.append(label)
+        if extra is not None:
+            self._extra_metadata[edge_id] = extra
 
-        edge.source._outgoing_edges.append(edge)
-        edge.destination._incoming_edges.append(edge)
+    def _replace_metadata(self, edge_id, metadata):
+        edge_type, position, label, extra = self._encode_metadata(metadata)
+        self._types[edge_id] = edge_type
+        self._positions[edge_id] = position
+        self._labels[edge_id] = label
+        if extra is not None:
+            self._extra_metadata[edge_id] = extra
+        else:
+            self._extra_metadata.pop(edge_id, None)
+        self._cache.clear()
 
-        return edge
+    def _metadata_of(self, edge_id):
+        metadata = {}
+        if edge_type := self._types[edge_id]:
+            metadata["type"] = EdgeType(edge_type).name.lower()
+        if (position := self._positions[edge_id]) != _MISSING:
+            metadata["position"] = position
+        if (label := self._labels[edge_id]) != _MISSING:
+            metadata["label"] = self._label_table[label]
+        if extra := self._extra_metadata.get(edge_id):
+            metadata.update(extra)
+        return metadata
 
     @property
     def nodes(self):
-        return self._nodes.values()
+        return _NodesView(self._nodes)
 
     @property
     def edges(self):
-        return self._edges.values()
+        return _EdgesView(self)
+
+    def out_degree(self, node):
+        return self._out_degrees[node.node_id]
+
+    def in_degree(self, node):
+        return self._in_degrees[node.node_id]
+
+    def _cached(self, key, compute, *args):
+        try:
+            return self._cache[key]
+        except KeyError:
+            value = self._cache[key] = compute(*args)
+            return value
+
+    def _csr(self, outgoing):
+        return self._cached(("csr", outgoing), self._build_csr, outgoing)
+
+    def _build_csr(self, outgoing):
+        # Compressed sparse rows over the edge arrays, built with a
+        # counting sort. The edges of each node are kept in insertion
+        # order.
+        if outgoing:
+            keys, degrees = self._sources, self._out_degrees
+        else:
+            keys, degrees = self._destinations, self._in_degrees
+
+        indptr = array("q", [0]) * (len(degrees) + 1)
+        total = 0
+        for node_id, degree in enumerate(degrees):
+            indptr[node_id] = total
+            total += degree
+        indptr[len(degrees)] = total
+
+        cursors = indptr[:-1]
+        edge_ids = array("q", [0]) * total
+        for edge_id, key in enumerate(keys):
+            edge_ids[cursors[key]] = edge_id
+            cursors[key] += 1
+
+        return indptr, edge_ids
+
+    def out_edges(self, node):
+        indptr, edge_ids = self._csr(True)
+        node_id = node.node_id
+        return [
+            Edge(self, edge_id)
+            for edge_id in edge_ids[indptr[node_id] : indptr[node_id + 1]]
+        ]
+
+    def in_edges(self, node):
+        indptr, edge_ids = self._csr(False)
+        node_id = node.node_id
+        return [
+            Edge(self, edge_id)
+            for edge_id in edge_ids[indptr[node_id] : indptr[node_id + 1]]
+        ]
+
+    def successors(self, node):
+        return [edge.destination for edge in self.out_edges(node)]
+
+    def predecessors(self, node):
+        return [edge.source for edge in self.in_edges(node)]
+
+    def to_csr(self, *, outgoing=True):
+        """Return the adjacency of the graph in the compressed sparse row
+        format, as `(indptr, indices, edge_ids)` integer arrays. The
+        neighbours (successors, or predecessors if `outgoing` is false)
+        of node `i` are `indices[indptr[i]:indptr[i + 1]]`, connected
+        through the edges `edge_ids[indptr[i]:indptr[i + 1]]`."""
+        indptr, edge_ids = self._csr(outgoing)
+        others = self._destinations if outgoing else self._sources
+        indices = array("q", [others[edge_id] for edge_id in edge_ids])
+        return array("q", indptr), indices, array("q", edge_ids)
+
+    def to_numpy(self):
+        """Export the edges as NumPy arrays; `sources`, `destinations`,
+        `types` (`EdgeType` values) and `positions` (-1 if missing), all
+        indexed by edge id, plus the CSR adjacency (`indptr`, `indices`
+        and `edge_ids`, see `to_csr`). Requires numpy."""
+        import numpy
+
+        def to_array(values):
+            # Copied, so that the graph can still grow afterwards
+            return numpy.frombuffer(values, dtype=values.typecode).copy()
+
+        indptr, indices, edge_ids = self.to_csr()
+        return {
+            "sources": to_array(self._sources),
+            "destinations": to_array(self._destinations),
+            "types": to_array(self._types),
+            "positions": to_array(self._positions),
+            "indptr": to_array(indptr),
+            "indices": to_array(indices),
+            "edge_ids": to_array(edge_ids),
+        }
+
+
+class _NodesView(Sequence):
+    __slots__ = ("_nodes",)
+
+    def __init__(self, nodes):
+        self._nodes = nodes
+
+    def __len__(self):
+        return len(self._nodes)
+
+    def __getitem__(self, index):
+        return self._nodes[index]
+
+    def __iter__(self):
+        return iter(self._nodes)
+
+
+class _EdgesView(Sequence):
+    __slots__ = ("_graph",)
+
+    def __init__(self, graph):
+        self._graph = graph
+
+    def __len__(self):
+        return len(self._graph._sources)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[item] for item in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("edge index out of range")
+        return Edge(self._graph, index)
+
+    def __iter__(self):
+        graph = self._graph
+        return (Edge(graph, edge_id) for edge_id in range(len(self)))
 
 
 class GraphItem:
+    __slots__ = ()
+
     @property
     def key(self):
         raise NotImplementedError
 
 
-@dataclass
 class Node(GraphItem):
-    """A `node` object in the graph space. It proxies the virtual object it holds."""
+    """A `node` object in the graph space. It proxies the virtual object
+    it holds, and is numbered by the graph it belongs to."""
 
-    virtual: Virtual
+    __slots__ = ("virtual", "node_id")
 
-    _incoming_edges: List[Edge] = field(default_factory=list, repr=False)
-    _outgoing_edges: List[Edge] = field(default_factory=list, repr=False)
+    def __init__(self, virtual: Virtual, node_id: int = _MISSING):
+        self.virtual = virtual
+        self.node_id = node_id
 
     @property
     def key(self):
         return self.virtual.name
 
+    def __repr__(self):
+        return f"Node(virtual={self.virtual!r}, node_id={self.node_id!r})"
+
+
+class Edge(GraphItem):
+    """Represent a vertex between two different `Node`s. It is a view
+    over the edge arrays of its graph, and so is its metadata (a mapping
+    of labels, or details about this edge); changes to it are written
+    back to the graph."""
+
+    __slots__ = ("graph", "edge_id")
+
+    def __init__(self, graph: Graph, edge_id: int):
+        self.graph = graph
+        self.edge_id = edge_id
+
+    @property
+    def source(self):
+        graph = self.graph
+        return graph._nodes[graph._sources[self.edge_id]]
+
+    @property
+    def destination(self):
+        graph = self.graph
+        return graph._nodes[graph._destinations[self.edge_id]]
+
+    @property
+    def type(self):
+        return EdgeType(self.graph._types[self.edge_id])
+
+    @property
+    def metadata(self):
+        return EdgeMetadata(self.graph, self.edge_id)
+
+    @property
+    def key(self):
+        return (self.source.key, self.destination.key)
+
+    def __eq__(self, other):
+        if not isinstance(other, Edge):
+            return NotImplemented
+        return self.graph is other.graph and self.edge_id == other.edge_id
+
+    def __hash__(self):
+        return hash((id(self.graph), self.edge_id))
+
+    def __repr__(self):
+        return (
+            f"Edge(source={self.source!r}, destination={self.destination!r},"
+            f" metadata={self.metadata!r})"
+        )
+
+
+class EdgeMetadata(MutableMapping):
+    """A dictionary-like view over the metadata of an edge, which
+    writes every change through to the graph's arrays."""
+
+    __slots__ = ("graph", "edge_id")
+
+    def __init__(self, graph: Graph, edge_id: int):
+        self.graph = graph
+        self.edge_id = edge_id
+
+    def _load(self):
+        return self.graph._metadata_of(self.edge_id)
+
+    def __getitem__(self, name):
+        return self._load()[name]
+
+    def __setitem__(self, name, value):
+        metadata = self._load()
+        metadata[name] = value
+        self.graph._replace_metadata(self.edge_id, metadata)
+
+    def __delitem__(self, name):
+        metadata = self._load()
+        del metadata[name]
+        self.graph._replace_metadata(self.edge_id, metadata)
+
+    def __iter__(self):
+        return iter(self._load())
+
+    def __len__(self):
+        return len(self._load())
+
+    def __repr__(self):
+        return repr(self._load())
+
 
-@dataclass
-class Edge:
-    """Represent a vertex between two different `Node`s. It also holds a dictionary to serve
-    as a simple way to create labels, or document details about this edge."""
+class DetachedEdge(NamedTuple):
+    """An edge that doesn't belong to any graph, e.g one that is streamed
+    by `iter_transform_calls`. It has the same interface as `Edge`."""
 
     source: Node
     destination: Node
-    metadata: Dict[Any, Any] = field(default_factory=dict)
+    metadata: Dict[Any, Any]
 
     @property
     def key(self):
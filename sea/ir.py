@@ -4,24 +4,37 @@
 from __future__ import annotations
 
 import dis
+from bisect import bisect_right
 from collections import deque
 from dataclasses import dataclass, field
-from functools import cache, partial
+from functools import partial
 from typing import Any, Dict, List, Optional
 
 import opcode
 
+from sea.profiling import count, profiled
+
+_JUMPS = frozenset(opcode.hasjabs + opcode.hasjrel)
+_UNCONDITIONAL_JUMPS = frozenset(
+    (
+        "JUMP_ABSOLUTE",
+        "JUMP_FORWARD",
+        "JUMP_BACKWARD",
+        "JUMP_BACKWARD_NO_INTERRUPT",
+    )
+)
+
 
 def is_jump(instr):
-    return instr.opcode in opcode.hasjabs + opcode.hasjrel
+    return instr.opcode in _JUMPS
 
 
 def is_conditional_jump(instr):
-    return instr.opname not in ("JUMP_ABSOLUTE", "JUMP_FORWARD")
+    return instr.opname not in _UNCONDITIONAL_JUMPS
 
 
-def is_backwards_jump(program_counter, instr):
-    return (instr.argval // 2) < program_counter
+def is_backwards_jump(instr):
+    return instr.argval < instr.offset
 
 
 @dataclass
@@ -66,47 +79,31 @@ class IRBlock:
         return [metadata.get("label") for metadata in self.metadata]
 
 
-def _transform(instructions, *, counter=0, end_range=-1):
-    blocks = [IRBlock()]
-
-    instr = None
-
-    while counter < end_range:
-        cursor = blocks[-1]
-        instr = instructions[counter]
-
-        if is_jump(instr) and not is_backwards_jump(counter, instr):
-            iteration = 0
-            final_counter = instr.argval // 2
-            while final_counter is not None:
-                target_counter = final_counter
-                final_counter, target_blocks = _transform(
-                    instructions,
-                    counter=counter + 1,
-                    end_range=final_counter,
-                )
-                blocks.extend(target_blocks)
-                counter = final_counter or target_counter
-                iteration += 1
-
-            counter -= 1
-            blocks.append(IRBlock())
-
-        cursor.add_instruction(instr)
-        counter += 1
-
-    # If the last instruction contains a jump, then propagate this
-    # to the upper level
-    if (
-        (instr is not None)
-        and is_jump(instr)
-        and not is_backwards_jump(counter, instr)
-    ):
-        final_counter = instr.argval // 2
-    else:
-        final_counter = None
+def _find_leaders(instructions):
+    # A leader is the first instruction of a basic block; the entry
+    # point, every jump target (backward ones, i.e loop headers,
+    # included) and every instruction that follows a jump. Targets are
+    # byte offsets, which don't map to indexes once there are inline
+    # caches (3.11+) in between the instructions.
+    indexes = {instr.offset: index for index, instr in enumerate(instructions)}
+
+    leaders = {0}
+    for counter, instr in enumerate(instructions):
+        if is_jump(instr):
+            leaders.add(counter + 1)
+            leaders.add(indexes[instr.argval])
+
+    return sorted(leader for leader in leaders if leader < len(instructions))
+
+
+def _transform(instructions):
+    leaders = _find_leaders(instructions)
 
-    return final_counter, blocks
+    blocks = []
+    for start, end in zip(leaders, [*leaders[1:], len(instructions)]):
+        blocks.append(IRBlock(list(instructions[start:end])))
+
+    return blocks
 
 
 def _assign_ids(original_blocks):
@@ -120,17 +117,22 @@ def _assign_ids(original_blocks):
     return blocks
 
 
-def _eliminate_duplicates(original_blocks):
-    blocks = {tuple(block.instructions): block for block in original_blocks}
-    return list(blocks.values())
+def _index_blocks(blocks):
+    # Blocks are disjoint and sorted by their offsets, so a bisection
+    # over their starting offsets is enough to find the owner of any
+    # given offset.
+    starts = [block.instructions[0].offset for block in blocks]
+
+    def find_block(offset):
+        index = bisect_right(starts, offset) - 1
+        if index >= 0 and offset in blocks[index].offset_range:
+            return blocks[index]
+
+    return find_block
 
 
 def _link(blocks):
-    @cache
-    def find_block(offset):
-        for block in blocks:
-            if offset in block.offset_range:
-                return block
+    find_block = _index_blocks(blocks)
 
     def get_label(instr, fall):
         if "_IF_FALSE" in instr.opname:
@@ -157,7 +159,7 @@ def _link(blocks):
             metadata = {"label": get_label(last_instr, fall), "fall": fall}
             block.metadata.append(metadata)
 
-    for block in blocks:
+    for block, next_block in zip(blocks, [*blocks[1:], None]):
         follow = partial(follow_block, block)
         last_instr = block.instructions[-1]
 
@@ -168,7 +170,9 @@ def _link(blocks):
             if not is_conditional_jump(last_instr):
                 continue
 
-        follow(last_instr, find_block(last_instr.offset + 2), fall=True)
+        # Blocks are contiguous, so the fall-through is always the next
+        # one (the offset after the last instruction might be a cache).
+        follow(last_instr, next_block, fall=True)
 
     return blocks
 
@@ -193,12 +197,13 @@ def _filter_unreachable_blocks(original_blocks):
     ]
 
 
+@profiled("compile_ir")
 def compile_ir(instructions):
-    _, blocks = _transform(instructions, end_range=len(instructions))
-    blocks = _eliminate_duplicates(blocks)
+    blocks = _transform(instructions)
     blocks = _assign_ids(blocks)
     blocks = _link(blocks)
     blocks = _filter_unreachable_blocks(blocks)
 
     assert len(blocks) >= 1
+    count("blocks", len(blocks))
     return blocks[0]
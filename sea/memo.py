@@ -0,0 +1,126 @@
+"""An in-process memo of simulation results, keyed by the fingerprint of
+the simulated code object (see `sea.module.fingerprint_code`).
+
+Large codebases are full of identical code objects (generated properties
+and dataclass methods, trivial lambdas, ...), whose simulation can be
+shared through the memo. Every hit returns a clone of the stored result
+(see `sea.virtuals.clone_virtuals`), so the virtuals can be renumbered or
+otherwise modified without affecting anyone else. The least recently
+used entries are evicted once the memo holds `max_entries` of them.
+"""
+
+from __future__ import annotations
+
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import List
+
+from sea.decoder import decode_instructions
+from sea.module import fingerprint_code
+from sea.profiling import count
+from sea.simulator import simulate, simulate_ir
+from sea.virtuals import Virtual, clone_virtuals
+
+DEFAULT_MAX_ENTRIES = 4096
+
+_process_memo = None
+
+_UNSEEN = object()
+_SEEN_ONCE = object()
+
+
+@dataclass
+class MemoStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+
+    def as_string(self):
+        lookups = max(self.hits + self.misses, 1)
+        return (
+            f"memo: {self.hits} hits, {self.misses} misses"
+            f" ({self.hits / lookups:.0%} hit rate),"
+            f" {self.evictions} evictions"
+        )
+
+
+class SimulationMemo:
+    """Results of `simulate` (or `simulate_ir`) by code object. Failures
+    are memoized too, and raised again on every lookup. Code objects
+    that were only seen once take an entry, but not their result.
+
+    A memo that is sent to another process (e.g as an argument of
+    `analyze_module` workers) turns into the memo of that process (see
+    `process_memo`), rather than into a copy of this one."""
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.stats = MemoStats()
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __reduce__(self):
+        return process_memo, (self.max_entries,)
+
+    def clear(self):
+        self._entries.clear()
+
+    def _store(self, key, entry):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats.evictions += 1
+
+    def simulate(self, code, *, enable_ir=False) -> List[Virtual]:
+        """Return the calls (or the blocks, with `enable_ir`) of the
+        given code object, simulating it only if no identical code
+        object was simulated before."""
+        key = fingerprint_code(code, enable_ir)
+        entry = self._entries.get(key, _UNSEEN)
+        if entry is not _UNSEEN and entry is not _SEEN_ONCE:
+            self._entries.move_to_end(key)
+            self.stats.hits += 1
+            count("memo_hits")
+
+            virtuals, error = entry
+            if error is not None:
+                raise error.with_traceback(None)
+            return clone_virtuals(virtuals)
+
+        self.stats.misses += 1
+        count("memo_misses")
+        instructions = decode_instructions(code)
+        try:
+            if enable_ir:
+                virtuals = simulate_ir(instructions)
+            else:
+                virtuals = simulate(instructions)
+        except Exception as exc:
+            virtuals, error = None, exc
+        else:
+            error = None
+
+        # Most code objects are unique, so a result is only stored (and
+        # thus cloned) once its code object shows up for the second time.
+        if entry is _UNSEEN:
+            self._store(key, _SEEN_ONCE)
+        elif error is not None:
+            self._store(key, (None, error))
+        else:
+            self._store(key, (clone_virtuals(virtuals), None))
+
+        if error is not None:
+            raise error
+        return virtuals
+
+
+def process_memo(max_entries=DEFAULT_MAX_ENTRIES) -> SimulationMemo:
+    """Return the memo shared by everything in the current process,
+    creating it with the given size limit on first use."""
+    global _process_memo
+    if _process_memo is None:
+        _process_memo = SimulationMemo(max_entries)
+    return _process_memo
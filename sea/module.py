@@ -0,0 +1,319 @@
+"""Analysis of whole modules, including every nested code object
+(functions, classes, lambdas and comprehensions)."""
+
+from __future__ import annotations
+
+import hashlib
+import marshal
+import os
+import types
+from dataclasses import dataclass, replace
+from inspect import CO_OPTIMIZED
+from multiprocessing.reduction import ForkingPickler
+from typing import TYPE_CHECKING, Dict, Iterator, List, Optional, Tuple
+
+from sea.decoder import decode_instructions, get_code_object
+from sea.simulator import simulate, simulate_ir
+from sea.virtuals import Virtual
+
+if TYPE_CHECKING:
+    from sea.graph import Graph
+
+# Code objects can't be pickled, but they are both the unit of work that
+# is sent to the workers and a part of the results (through the decoded
+# instructions and the code constants).
+ForkingPickler.register(
+    types.CodeType, lambda code: (marshal.loads, (marshal.dumps(code),))
+)
+
+_FINGERPRINT_MARSHAL_VERSION = 2
+
+
+@dataclass
+class CodeAnalysis:
+    """Result of simulating a single code object. Exactly one of the
+    `virtuals` (calls, or blocks with IR enabled) and `error` is set.
+
+    `reused` results were carried over from a previous analysis of the
+    module, since the `fingerprint` of their code object didn't change.
+    """
+
+    qualname: str
+    code: types.CodeType
+    virtuals: Optional[List[Virtual]] = None
+    error: Optional[Exception] = None
+    graph: Optional[Graph] = None
+    fingerprint: Optional[str] = None
+    reused: bool = False
+
+
+def _qualify(parent_name, parent, code):
+    if parent is None or parent.co_name == "<module>":
+        return code.co_name
+    elif parent.co_flags & CO_OPTIMIZED:
+        return f"{parent_name}.<locals>.{code.co_name}"
+    else:
+        return f"{parent_name}.{code.co_name}"
+
+
+def iter_code_objects(code) -> Iterator[Tuple[str, types.CodeType]]:
+    """Yield every code object nested in the given one (including itself)
+    together with its qualified name, in the order they are defined."""
+    seen_names = set()
+    stack = [(None, None, code)]
+    while stack:
+        parent_name, parent, code = stack.pop()
+        qualname = _qualify(parent_name, parent, code)
+
+        # Lambdas, comprehensions and redefinitions (e.g property setters)
+        # would share the same name, so they are numbered by their order.
+        name, index = qualname, 1
+        while name in seen_names:
+            index += 1
+            name = f"{qualname}#{index}"
+        seen_names.add(name)
+
+        yield name, code
+        stack.extend(
+            (name, code, const)
+            for const in reversed(code.co_consts)
+            if isinstance(const, types.CodeType)
+        )
+
+
+def fingerprint_code(code, enable_ir=False) -> str:
+    """Return a digest of everything the analysis of the given code object
+    depends on: its bytecode, constants and names.
+
+    Nested code objects are only represented by their name, file and
+    first line (which is what their repr shows), so editing the body of
+    a function leaves the fingerprint of its parent intact."""
+    consts = tuple(
+        ("<code>", const.co_name, const.co_filename, const.co_firstlineno)
+        if isinstance(const, types.CodeType)
+        else const
+        for const in code.co_consts
+    )
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(
+        marshal.dumps(
+            (
+                enable_ir,
+                code.co_code,
+                consts,
+                code.co_names,
+                code.co_varnames,
+                code.co_cellvars,
+                code.co_freevars,
+            ),
+            # Newer formats depend on the reference counts of the values
+            _FINGERPRINT_MARSHAL_VERSION,
+        )
+    )
+    return digest.hexdigest()
+
+
+def _detach_blocks(blocks):
+    # Pickling the CFG as is would recurse through next_blocks once for
+    # every block on the longest path, so the links are sent separately
+    # as indexes and restored by _attach_blocks. The blocks may be held
+    # by the memo of the worker, so unlinked copies are sent instead.
+    indexes = {id(block): index for index, block in enumerate(blocks)}
+    copies, links = [], []
+    for block in blocks:
+        links.append(
+            [indexes[id(next_block)] for next_block in block.next_blocks]
+        )
+        copy = replace(
+            block,
+            block=replace(block.block, next_blocks=[]),
+            next_blocks=[],
+        )
+        copy.virtual_id = block.virtual_id
+        copies.append(copy)
+    return copies, links
+
+
+def _attach_blocks(blocks, links):
+    for block, next_indexes in zip(blocks, links):
+        block.next_blocks = [blocks[index] for index in next_indexes]
+        block.block.next_blocks = [
+            next_block.block for next_block in block.next_blocks
+        ]
+
+
+def _analyze_code(code, enable_ir, memo=None):
+    if memo is not None:
+        try:
+            return memo.simulate(code, enable_ir=enable_ir), None
+        except Exception as exc:
+            return None, exc
+
+    instructions = decode_instructions(code)
+    try:
+        if enable_ir:
+            return simulate_ir(instructions), None
+        else:
+            return simulate(instructions), None
+    except Exception as exc:
+        return None, exc
+
+
+def _analyze_chunk(raw_codes, enable_ir, memo=None):
+    results = []
+    for raw_code in raw_codes:
+        virtuals, error = _analyze_code(
+            marshal.loads(raw_code), enable_ir, memo
+        )
+        if enable_ir and virtuals is not None:
+            results.append((*_detach_blocks(virtuals), error))
+        else:
+            results.append((virtuals, None, error))
+    return results
+
+
+def _chunk_code_objects(code_objects, chunks):
+    # Most code objects are tiny, so they are sent in batches of roughly
+    # equal bytecode size to keep the per task overhead low.
+    chunk_size = sum(len(code.co_code) for code in code_objects) / chunks
+
+    chunk, size = [], 0
+    for code in code_objects:
+        chunk.append(code)
+        size += len(code.co_code)
+        if size >= chunk_size:
+            yield chunk
+            chunk, size = [], 0
+
+    if chunk:
+        yield chunk
+
+
+def _analyze_locally(code_objects, enable_ir, memo=None):
+    results = {}
+    for qualname, code in code_objects.items():
+        virtuals, error = _analyze_code(code, enable_ir, memo)
+        results[qualname] = CodeAnalysis(qualname, code, virtuals, error)
+    return results
+
+
+def _analyze_remotely(code_objects, enable_ir, executor, chunks, memo=None):
+    futures = [
+        executor.submit(
+            _analyze_chunk,
+            [marshal.dumps(code) for code in chunk],
+            enable_ir,
+            memo,
+        )
+        for chunk in _chunk_code_objects(code_objects.values(), chunks)
+    ]
+
+    results = {}
+    qualnames = iter(code_objects)
+    for future in futures:
+        for virtuals, links, error in future.result():
+            if links is not None:
+                _attach_blocks(virtuals, links)
+
+            qualname = next(qualnames)
+            results[qualname] = CodeAnalysis(
+                qualname, code_objects[qualname], virtuals, error
+            )
+    return results
+
+
+def _build_graph(result, enable_ir):
+    # Only the callers that ask for graphs pay for importing them
+    from sea.transform import transform_blocks, transform_calls
+
+    if result.virtuals is None:
+        return None
+    elif enable_ir:
+        return transform_blocks(result.virtuals)
+    else:
+        return transform_calls(result.virtuals)
+
+
+def _reuse_previous(code_objects, fingerprints, previous):
+    results, changed = {}, {}
+    for qualname, code in code_objects.items():
+        result = previous.get(qualname)
+        if result is not None and result.fingerprint == fingerprints[qualname]:
+            results[qualname] = replace(result, code=code, reused=True)
+        else:
+            changed[qualname] = code
+    return results, changed
+
+
+def analyze_module(
+    source,
+    *,
+    enable_ir=False,
+    max_workers=None,
+    executor=None,
+    previous=None,
+    build_graphs=False,
+    memo=None,
+) -> Dict[str, CodeAnalysis]:
+    """Simulate every code object in the given module (a code object,
+    or anything else `dis.Bytecode` accepts) and return the results
+    keyed by their qualified names.
+
+    The code objects are distributed in batches to a process pool of
+    `max_workers` processes (one per CPU by default), or to the given
+    `executor`. With a single worker (or 0), everything runs in the
+    current process instead.
+
+    Given the `previous` results of the same module, only the code
+    objects whose fingerprint (see `fingerprint_code`) changed are
+    analyzed again; the results of the others are reused as is. With
+    `build_graphs`, the results also carry the graph of their virtuals
+    (which is reused along with them).
+
+    Identical code objects are only simulated once if a `SimulationMemo`
+    is given (see `sea.memo`); workers use the memo of their process."""
+    code_objects = dict(iter_code_objects(get_code_object(source)))
+    fingerprints = {
+        qualname: fingerprint_code(code, enable_ir)
+        for qualname, code in code_objects.items()
+    }
+
+    results, changed = {}, code_objects
+    if previous:
+        results, changed = _reuse_previous(
+            code_objects, fingerprints, previous
+        )
+
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+
+    if not changed:
+        pass
+    elif executor is not None:
+        results.update(
+            _analyze_remotely(
+                changed, enable_ir, executor, max_workers * 4, memo
+            )
+        )
+    elif max_workers <= 1 or len(changed) == 1:
+        results.update(_analyze_locally(changed, enable_ir, memo))
+    else:
+        # Only imported when needed, it is slow to import
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(max_workers) as executor:
+            results.update(
+                _analyze_remotely(
+                    changed, enable_ir, executor, max_workers * 4, memo
+                )
+            )
+
+    for qualname in changed:
+        results[qualname].fingerprint = fingerprints[qualname]
+    if build_graphs:
+        for result in results.values():
+            if result.graph is None:
+                result.graph = _build_graph(result, enable_ir)
+
+    # In definition order, regardless of what was reused
+    return {qualname: results[qualname] for qualname in code_objects}
@@ -0,0 +1,156 @@
+"""Instrumentation of the pipeline stages (decoding, IR construction,
+simulation, traversal and graph construction).
+
+Every instrumented stage reports a `StageEvent` to the registered
+hooks when it finishes, with its wall time, the net number of memory
+blocks it allocated (`net_blocks`, the change in
+`sys.getallocatedblocks()`, which is negative when the stage freed
+more than it allocated) and some stage specific counters (instructions,
+blocks, calls, edges and the `<NULL>` constants produced by stack
+underflows). Timings are inclusive; `simulate_ir` also covers its own
+`compile_ir` call, which is reported separately as well.
+
+Nothing is measured while no hooks are registered. Hooks are local to
+the process, so work that is handed to worker processes (see
+`sea.batch` and `sea.module`) isn't reported.
+
+    with collect() as profile:
+        simulate(decode_instructions(code))
+    print(profile.as_string())
+"""
+
+from __future__ import annotations
+
+import sys
+import time
+from collections import Counter
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from functools import wraps
+from typing import Callable, Dict, List, NamedTuple
+
+_hooks: List[Callable[[StageEvent], None]] = []
+_active: List[Counter] = []
+
+_allocated_blocks = getattr(sys, "getallocatedblocks", lambda: 0)
+
+
+class StageEvent(NamedTuple):
+    stage: str
+    seconds: float
+    net_blocks: int
+    counters: Dict[str, int]
+
+
+def add_hook(hook: Callable[[StageEvent], None]):
+    """Call the given hook with a `StageEvent` whenever an instrumented
+    stage finishes."""
+    _hooks.append(hook)
+
+
+def remove_hook(hook: Callable[[StageEvent], None]):
+    _hooks.remove(hook)
+
+
+def count(name, value=1):
+    """Add to a counter of the innermost running stage (if any)."""
+    if _active:
+        _active[-1][name] += value
+
+
+@contextmanager
+def stage(name):
+    """Measure the enclosed block as a stage with the given name. The
+    counters of the stage are bound by the `with` statement (None if
+    nothing is being measured)."""
+    if not _hooks:
+        yield None
+        return
+
+    counters = Counter()
+    _active.append(counters)
+    net_blocks = _allocated_blocks()
+    started = time.perf_counter()
+    try:
+        yield counters
+    finally:
+        seconds = time.perf_counter() - started
+        net_blocks = _allocated_blocks() - net_blocks
+        _active.pop()
+
+        event = StageEvent(name, seconds, net_blocks, dict(counters))
+        for hook in tuple(_hooks):
+            hook(event)
+
+
+def profiled(name, describe=None):
+    """Instrument the decorated function as a stage. `describe` maps its
+    result to the counters of the stage."""
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _hooks:
+                return func(*args, **kwargs)
+
+            with stage(name) as counters:
+                result = func(*args, **kwargs)
+                if describe is not None:
+                    counters.update(describe(result))
+            return result
+
+        return wrapper
+
+    return decorator
+
+
+@dataclass
+class StageSummary:
+    calls: int = 0
+    seconds: float = 0.0
+    net_blocks: int = 0
+    counters: Counter = field(default_factory=Counter)
+
+
+class Profile:
+    """A hook that aggregates the events of each stage."""
+
+    def __init__(self):
+        self.stages: Dict[str, StageSummary] = {}
+
+    def __call__(self, event: StageEvent):
+        summary = self.stages.setdefault(event.stage, StageSummary())
+        summary.calls += 1
+        summary.seconds += event.seconds
+        summary.net_blocks += event.net_blocks
+        summary.counters.update(event.counters)
+
+    def as_string(self):
+        lines = [
+            f"{'stage':>20} {'calls':>7} {'seconds':>9} {'net blocks':>10}"
+            "  counters"
+        ]
+        for name, summary in sorted(
+            self.stages.items(), key=lambda item: -item[1].seconds
+        ):
+            counters = ", ".join(
+                f"{counter}={value}"
+                for counter, value in sorted(summary.counters.items())
+            )
+            lines.append(
+                f"{name:>20} {summary.calls:>7} {summary.seconds:>9.4f}"
+                f" {summary.net_blocks:>10}  {counters}".rstrip()
+            )
+        return "\n".join(lines)
+
+
+@contextmanager
+def collect():
+    """Aggregate the events of every stage that runs within the block
+    into a `Profile`."""
+    profile = Profile()
+    add_hook(profile)
+    try:
+        yield profile
+    finally:
+        remove_hook(profile)
@@ -0,0 +1,391 @@
+"""Declarative queries over the calls of many analyzed code objects.
+
+Patterns describe calls by their opname, their oparg, the calls (or
+constants) they consume and the loops they are in:
+
+    index = QueryIndex.from_results(analyze_module(code, enable_ir=True))
+    index.find(Op("CALL", uses=Op("LOAD_GLOBAL", arg="open")))
+    index.find(Op("STORE_FAST", within=Loop(Op("FOR_ITER"))))
+
+The index is built once and maps opnames (and oparg values), consumers
+and blocks to calls, so a query starts from the smallest set of candidates
+these lookups give rather than from every call. Partials and merges are
+looked through, i.e. a call consuming one of the values of another call
+(or a merge of it with other values) uses that call.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple, Union
+
+from sea.algorithms import _immediate_dominators
+from sea.dataflow import _control_flow
+from sea.virtuals import Block, Call, Constant, Merge, Partial, _constant_key
+
+
+class _Any:
+    def __repr__(self):
+        return "ANY"
+
+
+ANY = _Any()
+
+
+def _value_key(value):
+    # Like the keys of the constant pool, but strings (which is what
+    # most opargs are) are compared by value at any depth.
+    value_type = type(value)
+    if value_type is str:
+        return value
+    elif value_type is tuple:
+        return value_type, tuple(map(_value_key, value))
+    elif value_type is frozenset:
+        return value_type, frozenset(map(_value_key, value))
+    else:
+        return _constant_key(value)
+
+
+@dataclass(frozen=True)
+class Const:
+    """Matches a constant argument with the given value."""
+
+    value: Any
+
+    def __post_init__(self):
+        object.__setattr__(self, "key", _value_key(self.value))
+
+
+@dataclass(frozen=True)
+class Loop:
+    """Matches the calls in the body of a loop whose header block has a
+    call matching `header` (any loop, by default). Only calls of IR
+    blocks are in loops, and since blocks only start at forward jump
+    targets, the header block also holds whatever precedes the loop."""
+
+    header: Optional[Op] = None
+
+
+@dataclass(frozen=True)
+class Op:
+    """Matches calls of the given opname (or any of the given opnames),
+    with the given oparg value, which consume a value matching each of
+    the `uses` patterns (as any of their arguments) and are `within`
+    the given loop. Everything that is left out matches anything."""
+
+    opname: Union[str, Tuple[str, ...], None] = None
+    arg: Any = ANY
+    uses: Union[Op, Const, Tuple[Union[Op, Const], ...]] = ()
+    within: Optional[Loop] = None
+
+    def __post_init__(self):
+        if isinstance(self.opname, str):
+            object.__setattr__(self, "opname", (self.opname,))
+        if isinstance(self.uses, (Op, Const)):
+            object.__setattr__(self, "uses", (self.uses,))
+        if self.arg is not ANY:
+            object.__setattr__(self, "arg_key", _value_key(self.arg))
+
+
+class Match(NamedTuple):
+    qualname: str
+    call: Call
+    block: Optional[Block]
+
+
+class QueryIndex:
+    """Indexes of the calls of any number of code objects (given as
+    their calls, or blocks with IR enabled) for `find`."""
+
+    def __init__(self):
+        self.qualnames: List[str] = []
+        self.calls: List[Call] = []
+        self._owners: List[int] = []
+        self._blocks: List[Optional[Block]] = []
+        self._block_lists: List[List[Block]] = []
+        self._positions: Dict[int, int] = {}
+        self._users: List[List[int]] = []
+        self._by_opname: Dict[str, List[int]] = {}
+        self._by_arg: Dict[Any, List[int]] = {}
+        self._by_opname_arg: Dict[Tuple[str, Any], List[int]] = {}
+        self._by_block: Dict[int, List[int]] = {}
+        self._loops = None
+
+    @classmethod
+    def from_results(cls, results) -> QueryIndex:
+        """Index the results of `analyze_module` (skipping failures)."""
+        index = cls()
+        for qualname, result in results.items():
+            if result.virtuals is not None:
+                index.add(qualname, result.virtuals)
+        return index
+
+    def __len__(self):
+        return len(self.calls)
+
+    def add(self, qualname, virtuals):
+        owner = len(self.qualnames)
+        self.qualnames.append(qualname)
+        blocks = [
+            virtual for virtual in virtuals if isinstance(virtual, Block)
+        ]
+        self._block_lists.append(blocks)
+        self._loops = None
+
+        first = len(self.calls)
+        if blocks:
+            for block in blocks:
+                positions = self._by_block[id(block)] = []
+                for call in block.calls:
+                    positions.append(self._add_call(call, owner, block))
+        else:
+            for call in virtuals:
+                self._add_call(call, owner, None)
+
+        # Arguments might come from calls that were added after their
+        # consumers (e.g across blocks), so users are linked last.
+        for position in range(first, len(self.calls)):
+            used_positions = set()
+            for argument in self.calls[position].arguments:
+                for source in _sources(argument):
+                    used = self._positions.get(id(source))
+                    if used is not None and used not in used_positions:
+                        used_positions.add(used)
+                        self._users[used].append(position)
+
+    def _add_call(self, call, owner, block):
+        position = len(self.calls)
+        self.calls.append(call)
+        self._owners.append(owner)
+        self._blocks.append(block)
+        self._users.append([])
+        self._positions[id(call)] = position
+
+        self._by_opname.setdefault(call.func.opname, []).append(position)
+        if call.func.arg is not None:
+            key = _value_key(call.func.argval)
+            self._by_arg.setdefault(key, []).append(position)
+            self._by_opname_arg.setdefault((call.func.opname, key), []).append(
+                position
+            )
+        return position
+
+    def find(self, pattern: Op) -> List[Match]:
+        """Return the calls matching the pattern, in the order they were
+        added."""
+        return [
+            Match(
+                self.qualnames[self._owners[position]],
+                self.calls[position],
+                self._blocks[position],
+            )
+            for position in self._find(pattern, {})
+        ]
+
+    def find_blocks(self, pattern: Op) -> List[Block]:
+        """Return the blocks that have a call matching the pattern."""
+        blocks = {}
+        for position in self._find(pattern, {}):
+            if (block := self._blocks[position]) is not None:
+                blocks.setdefault(id(block), block)
+        return list(blocks.values())
+
+    def _find(self, pattern, context):
+        candidates = self._candidates(pattern, context)
+        if candidates is None:
+            candidates = range(len(self.calls))
+        return [
+            position
+            for position in candidates
+            if self._matches(pattern, position, context)
+        ]
+
+    def _direct_candidates(self, pattern):
+        # The lookups that only take a dictionary access. Each one gives
+        # a superset of the matches, so the smallest is the best.
+        lookups = []
+        if pattern.opname is not None and pattern.arg is not ANY:
+            lookups.append(
+                sorted(
+                    position
+                    for opname in pattern.opname
+                    for position in self._by_opname_arg.get(
+                        (opname, pattern.arg_key), ()
+                    )
+                )
+            )
+        elif pattern.opname is not None:
+            if len(pattern.opname) == 1:
+                lookups.append(self._by_opname.get(pattern.opname[0], []))
+            else:
+                lookups.append(
+                    sorted(
+                        position
+                        for opname in pattern.opname
+                        for position in self._by_opname.get(opname, ())
+                    )
+                )
+        elif pattern.arg is not ANY:
+            lookups.append(self._by_arg.get(pattern.arg_key, []))
+        for used in pattern.uses:
+            if isinstance(used, Const):
+                lookups.append(self._by_arg.get(used.key, []))
+        return min(lookups, key=len, default=None)
+
+    def _candidates(self, pattern, context):
+        best = self._direct_candidates(pattern)
+
+        # The users of the calls matching a nested pattern are only
+        # worth collecting if that pattern is more selective.
+        for used in pattern.uses:
+            if not isinstance(used, Op):
+                continue
+            inner = self._direct_candidates(used)
+            if best is not None and (inner is None or len(inner) > len(best)):
+                continue
+            users = sorted(
+                {
+                    user
+                    for position in self._find(used, context)
+                    for user in self._users[position]
+                }
+            )
+            if best is None or len(users) < len(best):
+                best = users
+
+        if pattern.within is not None:
+            bodies = self._loop_bodies(pattern.within, context)
+            size = sum(len(self._by_block[block_id]) for block_id in bodies)
+            if best is None or size < len(best):
+                best = sorted(
+                    position
+                    for block_id in bodies
+                    for position in self._by_block[block_id]
+                )
+        return best
+
+    def _matches(self, pattern, position, context):
+        call = self.calls[position]
+        opnames = pattern.opname
+        if opnames is not None and call.func.opname not in opnames:
+            return False
+        if pattern.arg is not ANY and (
+            call.func.arg is None
+            or _value_key(call.func.argval) != pattern.arg_key
+        ):
+            return False
+        for used in pattern.uses:
+            if not any(
+                self._argument_matches(used, argument, context)
+                for argument in call.arguments
+            ):
+                return False
+        if pattern.within is not None:
+            block = self._blocks[position]
+            if block is None or id(block) not in self._loop_bodies(
+                pattern.within, context
+            ):
+                return False
+        return True
+
+    def _argument_matches(self, pattern, argument, context):
+        for source in _sources(argument):
+            if isinstance(pattern, Const):
+                if type(source) is Constant and (
+                    _value_key(source.value) == pattern.key
+                ):
+                    return True
+                continue
+
+            position = self._positions.get(id(source))
+            if position is not None and self._matches(
+                pattern, position, context
+            ):
+                return True
+        return False
+
+    def _loop_bodies(self, loop, context):
+        # The blocks (by id) in the body of the loops whose header
+        # matches, computed once per query.
+        key = ("loop", id(loop))
+        if (bodies := context.get(key)) is not None:
+            return bodies
+
+        if self._loops is None:
+            self._loops = {}
+            for blocks in self._block_lists:
+                self._loops.update(_natural_loops(blocks))
+
+        if loop.header is None:
+            headers = self._loops.keys()
+        else:
+            headers = {
+                id(self._blocks[position])
+                for position in self._find(loop.header, context)
+            }
+
+        bodies = context[key] = set()
+        for header in headers:
+            bodies.update(self._loops.get(header, ()))
+        return bodies
+
+
+def _sources(argument):
+    # The values behind an argument, looking through partials (to their
+    # calls) and merges (to everything flowing into them).
+    if type(argument) is Partial:
+        return (argument.call,)
+    elif type(argument) is not Merge:
+        return (argument,)
+
+    sources = []
+    seen = {id(argument)}
+    stack = [argument]
+    while stack:
+        for value in stack.pop().incoming:
+            if id(value) in seen:
+                continue
+            seen.add(id(value))
+            if type(value) is Merge:
+                stack.append(value)
+            elif type(value) is Partial:
+                sources.append(value.call)
+            else:
+                sources.append(value)
+    return sources
+
+
+def _natural_loops(blocks) -> Dict[int, List[int]]:
+    """Return the body of the natural loop of every loop header among
+    the blocks (merging the loops that share a header), by block id."""
+    if not blocks:
+        return {}
+
+    successors, predecessors = _control_flow(blocks)
+    idoms = _immediate_dominators(successors, predecessors, 0)
+
+    def dominates(dominator, node):
+        while node != dominator:
+            if node not in idoms:
+                return False
+            node = idoms[node]
+        return True
+
+    loops = {}
+    for tail, targets in enumerate(successors):
+        for header in targets:
+            if not dominates(header, tail):
+                continue
+
+            body = loops.setdefault(header, {header})
+            stack = [tail]
+            while stack:
+                node = stack.pop()
+                if node not in body:
+                    body.add(node)
+                    stack.extend(predecessors[node])
+
+    return {
+        id(blocks[header]): [id(blocks[node]) for node in sorted(body)]
+        for header, body in loops.items()
+    }
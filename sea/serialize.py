@@ -0,0 +1,632 @@
+"""Compact, machine readable export and import of SEA results.
+
+A result (a list of calls or blocks, and optionally a `Graph` built
+from them) is flattened into a stream of records, each of which can only
+refer to the records before it. References are the 0-based positions of
+the records in the stream (the header is not counted). See `format.md`
+for the list of records.
+
+There are two flavors of the same stream:
+
+- JSON lines (`dump_jsonl`/`load_jsonl`), one record per line, which is
+  written and can be consumed incrementally.
+- A binary flavor (`dumps_binary`/`loads_binary`), built on `marshal`,
+  with the strings interned in a table and the values kept as is.
+
+Loading never re-runs the analysis; the instructions behind the calls
+are restored as detached `sea.decoder.Instruction`s.
+"""
+
+from __future__ import annotations
+
+import gc
+import json
+import marshal
+import sys
+import types
+from array import array
+from contextlib import contextmanager
+from importlib.util import MAGIC_NUMBER
+from typing import Any, List, NamedTuple, Optional
+
+import opcode
+
+from sea.decoder import Instruction
+from sea.graph import Graph
+from sea.ir import IRBlock
+from sea.virtuals import (
+    Block,
+    Call,
+    Constant,
+    Merge,
+    Partial,
+    _restore_virtual,
+)
+
+# Bump whenever a record kind is added or changes its fields, so that
+# older readers fail with a version error rather than on the record.
+FORMAT_VERSION = 2
+
+_PYTHON_TAG = f"{sys.implementation.cache_tag}-{MAGIC_NUMBER.hex()}"
+# The python tag follows the magic (terminated by a NUL) in the clear,
+# so that a result of another interpreter is rejected before it is
+# unmarshalled.
+_BINARY_MAGIC = b"SEA\1"
+
+_MARSHALLABLE = frozenset(
+    (
+        type(None),
+        type(...),
+        bool,
+        int,
+        float,
+        complex,
+        str,
+        bytes,
+        types.CodeType,
+    )
+)
+
+
+class Document(NamedTuple):
+    # The top-level virtuals (None, if only a graph was exported)
+    virtuals: Optional[List[Any]]
+    graph: Optional[Graph]
+
+
+class OpaqueValue:
+    """Stand-in for a constant value which can't be represented in the
+    exported format (e.g the builtin converter functions of FORMAT_VALUE,
+    or code objects in JSON). It keeps the original repr, so the loaded
+    result still renders the same."""
+
+    __slots__ = ("text",)
+
+    def __init__(self, text):
+        self.text = text
+
+    def __repr__(self):
+        return self.text
+
+    def __eq__(self, other):
+        return isinstance(other, OpaqueValue) and self.text == other.text
+
+    def __hash__(self):
+        return hash(self.text)
+
+
+def _dependencies(virtual):
+    if isinstance(virtual, Call):
+        return virtual.arguments
+    elif isinstance(virtual, Partial):
+        return (virtual.call,)
+    elif isinstance(virtual, Block):
+        return (*virtual.merges, *virtual.calls)
+    else:
+        return ()
+
+
+def _iter_records(virtuals, graph):
+    # Yield the logical records of the given result, with every virtual
+    # preceded by the virtuals it refers to. The walk is iterative so
+    # that long chains of calls can't hit the recursion limit.
+    references = {}
+    blocks = []
+    position = 0
+
+    def emit(root):
+        nonlocal position
+        stack = [(root, False)]
+        while stack:
+            virtual, expanded = stack.pop()
+            if id(virtual) in references:
+                continue
+            elif not expanded:
+                stack.append((virtual, True))
+                stack.extend(
+                    (dependency, False)
+                    for dependency in reversed(_dependencies(virtual))
+                )
+                continue
+
+            if isinstance(virtual, Block):
+                blocks.append(virtual)
+            references[id(virtual)] = position
+            position += 1
+            yield _make_record(virtual, references)
+
+    roots = []
+    for virtual in virtuals or ():
+        yield from emit(virtual)
+        roots.append(references[id(virtual)])
+
+    if graph is not None:
+        for node in graph.nodes:
+            yield from emit(node.virtual)
+
+    # Blocks may jump to any other block (including themselves and the
+    # ones that weren't written yet), so they are linked at the end.
+    index = 0
+    while index < len(blocks):
+        for next_block in blocks[index].next_blocks:
+            yield from emit(next_block)
+        index += 1
+
+    for block in blocks:
+        if block.next_blocks:
+            position += 1
+            yield (
+                "l",
+                references[id(block)],
+                [
+                    references[id(next_block)]
+                    for next_block in block.next_blocks
+                ],
+            )
+
+    # Merges may be fed by the calls that consume them (around a loop),
+    # so their incoming values are linked at the end as well.
+    for block in blocks:
+        for merge in block.merges:
+            for value in merge.incoming:
+                yield from emit(value)
+            position += 1
+            yield (
+                "i",
+                references[id(merge)],
+                references[id(block)],
+                [references[id(value)] for value in merge.incoming],
+            )
+
+    if virtuals is not None:
+        position += 1
+        yield ("r", roots)
+
+    if graph is not None:
+        nodes = {}
+        for node in graph.nodes:
+            nodes[node.key] = position
+            position += 1
+            yield ("n", references[id(node.virtual)])
+
+        for edge in graph.edges:
+            position += 1
+            yield (
+                "e",
+                nodes[edge.source.key],
+                nodes[edge.destination.key],
+                dict(edge.metadata),
+            )
+
+
+def _make_record(virtual, references):
+    if isinstance(virtual, Constant):
+        return ("c", virtual.virtual_id, virtual.value)
+    elif isinstance(virtual, Call):
+        func = virtual.func
+        return (
+            "k",
+            virtual.virtual_id,
+            func.opname,
+            func.arg,
+            func.offset,
+            [references[id(argument)] for argument in virtual.arguments],
+        )
+    elif isinstance(virtual, Partial):
+        return (
+            "p",
+            virtual.virtual_id,
+            references[id(virtual.call)],
+            virtual.index,
+        )
+    elif isinstance(virtual, Merge):
+        return ("m", virtual.virtual_id)
+    elif isinstance(virtual, Block):
+        return (
+            "b",
+            virtual.virtual_id,
+            virtual.block.block_id,
+            [references[id(call)] for call in virtual.calls],
+            virtual.block.metadata,
+        )
+    else:
+        raise TypeError(f"can't serialize {type(virtual).__name__}")
+
+
+@contextmanager
+def _paused_gc():
+    # Loading allocates lots of long-lived objects in a short time, which
+    # would otherwise trigger (pointless) collections over and over.
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+class _Loader:
+    def __init__(self):
+        self.objects = []
+        self.roots = None
+        self.graph = None
+
+    def load(self, kind, *fields):
+        objects = self.objects
+        if kind == "c":
+            virtual_id, value = fields
+            obj = _restore_virtual(Constant, virtual_id, value)
+        elif kind == "k":
+            virtual_id, opname, arg, offset, arguments = fields
+            arguments = tuple(objects[argument] for argument in arguments)
+            argval = arguments[0].value if arg is not None else None
+            try:
+                op = opcode.opmap[opname]
+            except KeyError:
+                raise ValueError(f"unknown instruction: {opname}") from None
+            obj = _restore_virtual(
+                Call,
+                virtual_id,
+                Instruction.detached(op, arg, offset, argval),
+                arguments,
+            )
+        elif kind == "p":
+            virtual_id, call, index = fields
+            obj = _restore_virtual(Partial, virtual_id, objects[call], index)
+        elif kind == "b":
+            virtual_id, block_id, calls, metadata = fields
+            calls = [objects[call] for call in calls]
+            real_block = IRBlock(
+                [call.func for call in calls],
+                block_id=block_id,
+                metadata=metadata,
+            )
+            obj = _restore_virtual(
+                Block, virtual_id, real_block, calls, [], real_block.labels
+            )
+        elif kind == "m":
+            [virtual_id] = fields
+            obj = _restore_virtual(Merge, virtual_id, ())
+        elif kind == "l":
+            block, next_blocks = fields
+            block = objects[block]
+            block.next_blocks = [objects[index] for index in next_blocks]
+            block.block.next_blocks = [
+                next_block.block for next_block in block.next_blocks
+            ]
+            obj = None
+        elif kind == "i":
+            merge, block, incoming = fields
+            merge = objects[merge]
+            merge.incoming = tuple(objects[value] for value in incoming)
+            objects[block].merges.append(merge)
+            obj = None
+        elif kind == "r":
+            [roots] = fields
+            self.roots = [objects[root] for root in roots]
+            obj = None
+        elif kind == "n":
+            if self.graph is None:
+                self.graph = Graph()
+            [virtual] = fields
+            obj = self.graph.add_node(objects[virtual])
+        elif kind == "e":
+            source, destination, metadata = fields
+            self.graph.add_edge(
+                objects[source], objects[destination], metadata=metadata
+            )
+            obj = None
+        else:
+            raise ValueError(f"unknown record: {kind!r}")
+
+        objects.append(obj)
+
+    def finish(self):
+        return Document(self.roots, self.graph)
+
+
+def _check_header(header):
+    if header.get("sea") != FORMAT_VERSION:
+        raise ValueError(f"unsupported format version: {header.get('sea')}")
+    _check_python_tag(header.get("python"))
+
+
+def _check_python_tag(tag):
+    # Opcodes (and marshal itself) differ between interpreters
+    if tag != _PYTHON_TAG:
+        raise ValueError(
+            f"result of another interpreter: {tag!r} (expected"
+            f" {_PYTHON_TAG!r})"
+        )
+
+
+# JSON lines
+
+
+def _to_json(value):
+    value_type = type(value)
+    if value is None or value_type in (bool, int, str):
+        return value
+    elif value_type is float:
+        if value != value or value in (float("inf"), float("-inf")):
+            return {"float": repr(value)}
+        return value
+    elif value_type is tuple:
+        return {"tuple": [_to_json(item) for item in value]}
+    elif value_type is frozenset:
+        return {"frozenset": [_to_json(item) for item in value]}
+    elif value_type is bytes:
+        return {"bytes": value.hex()}
+    elif value_type is complex:
+        return {"complex": [_to_json(value.real), _to_json(value.imag)]}
+    elif value is ...:
+        return {"ellipsis": None}
+    else:
+        return {"repr": repr(value)}
+
+
+def _from_json(value):
+    if type(value) is not dict:
+        return value
+
+    [(tag, payload)] = value.items()
+    if tag == "float":
+        return float(payload)
+    elif tag == "tuple":
+        return tuple(map(_from_json, payload))
+    elif tag == "frozenset":
+        return frozenset(map(_from_json, payload))
+    elif tag == "bytes":
+        return bytes.fromhex(payload)
+    elif tag == "complex":
+        return complex(*map(_from_json, payload))
+    elif tag == "ellipsis":
+        return ...
+    elif tag == "repr":
+        return OpaqueValue(payload)
+    else:
+        raise ValueError(f"unknown value tag: {tag!r}")
+
+
+def dump_jsonl(virtuals=None, stream=None, *, graph=None):
+    """Write the given virtuals (calls or blocks) and/or graph to the
+    text stream as JSON lines, one record at a time."""
+    if stream is None:
+        stream = sys.stdout
+
+    dumps = json.JSONEncoder(
+        ensure_ascii=False, check_circular=False, separators=(",", ":")
+    ).encode
+
+    header = {"sea": FORMAT_VERSION, "python": _PYTHON_TAG}
+    stream.write(dumps(header) + "\n")
+    for record in _iter_records(virtuals, graph):
+        if record[0] == "c":
+            record = (*record[:2], _to_json(record[2]))
+        stream.write(dumps(record) + "\n")
+
+
+def load_jsonl(stream) -> Document:
+    """Load a result written by `dump_jsonl` from the given text stream
+    (or any iterable of lines)."""
+    lines = iter(stream)
+    _check_header(json.loads(next(lines)))
+
+    loader = _Loader()
+    with _paused_gc():
+        for line in lines:
+            kind, *fields = json.loads(line)
+            if kind == "c":
+                fields[1] = _from_json(fields[1])
+            loader.load(kind, *fields)
+    return loader.finish()
+
+
+# Binary
+
+
+def _is_marshallable(value):
+    value_type = type(value)
+    if value_type in (tuple, frozenset):
+        return all(map(_is_marshallable, value))
+    else:
+        return value_type in _MARSHALLABLE
+
+
+def _value_key(value):
+    # Strings and metadata dictionaries repeat a lot, so they are stored
+    # once in the value table. Everything else is stored as is.
+    if type(value) is str:
+        return value
+    elif type(value) is dict:
+        key = dict, tuple(
+            (name, type(item), item) for name, item in value.items()
+        )
+        try:
+            hash(key)
+        except TypeError:
+            return None
+        return key
+    else:
+        return None
+
+
+def dumps_binary(virtuals=None, *, graph=None) -> bytes:
+    """Serialize the given virtuals (calls or blocks) and/or graph into
+    the binary flavor.
+
+    Records are flattened into a string of kind characters and a single
+    array of integers, where every value that isn't an integer (opnames,
+    constant values, metadata) is replaced by its index in a table of
+    (interned) values."""
+    kinds = []
+    ints = []
+    values = []
+    interned = {}
+
+    def add_value(value):
+        key = _value_key(value)
+        if key is None:
+            values.append(value)
+            return len(values) - 1
+        elif (index := interned.get(key)) is None:
+            index = interned[key] = len(values)
+            values.append(value)
+        return index
+
+    for kind, *fields in _iter_records(virtuals, graph):
+        kinds.append(kind)
+        if kind == "c":
+            # Values that marshal can't handle are replaced with
+            # their reprs, and marked as such.
+            virtual_id, value = fields
+            if _is_marshallable(value):
+                ints += (virtual_id, add_value(value), 0)
+            else:
+                ints += (virtual_id, add_value(repr(value)), 1)
+        elif kind == "k":
+            virtual_id, opname, arg, offset, arguments = fields
+            ints += (
+                virtual_id,
+                add_value(opname),
+                -1 if arg is None else arg,
+                offset,
+                len(arguments),
+                *arguments,
+            )
+        elif kind == "p":
+            ints += fields
+        elif kind == "b":
+            virtual_id, block_id, calls, metadata = fields
+            ints += (virtual_id, block_id, len(calls), *calls)
+            ints += (len(metadata), *map(add_value, metadata))
+        elif kind == "m":
+            ints += fields
+        elif kind == "l":
+            block, next_blocks = fields
+            ints += (block, len(next_blocks), *next_blocks)
+        elif kind == "i":
+            merge, block, incoming = fields
+            ints += (merge, block, len(incoming), *incoming)
+        elif kind == "r":
+            [roots] = fields
+            ints += (len(roots), *roots)
+        elif kind == "n":
+            ints += fields
+        elif kind == "e":
+            source, destination, metadata = fields
+            ints += (source, destination, add_value(metadata))
+
+    typecode = "i"
+    if ints and (min(ints) < -(2 ** 31) or max(ints) >= 2 ** 31):
+        typecode = "q"
+
+    header = {
+        "sea": FORMAT_VERSION,
+        "python": _PYTHON_TAG,
+        "byteorder": sys.byteorder,
+        "typecode": typecode,
+    }
+    blob = marshal.dumps(
+        (
+            header,
+            "".join(kinds).encode(),
+            array(typecode, ints).tobytes(),
+            values,
+        )
+    )
+    return b"".join((_BINARY_MAGIC, _PYTHON_TAG.encode(), b"\0", blob))
+
+
+def _load_binary_records(loader, kinds, ints, values):
+    position = 0
+    for kind in kinds.decode():
+        if kind == "c":
+            virtual_id, value, is_opaque = ints[position : position + 3]
+            position += 3
+            value = values[value]
+            if is_opaque:
+                value = OpaqueValue(value)
+            loader.load(kind, virtual_id, value)
+        elif kind == "k":
+            virtual_id, opname, arg, offset, count = ints[
+                position : position + 5
+            ]
+            position += 5
+            arguments = ints[position : position + count]
+            position += count
+            loader.load(
+                kind,
+                virtual_id,
+                values[opname],
+                None if arg == -1 else arg,
+                offset,
+                arguments,
+            )
+        elif kind == "p":
+            loader.load(kind, *ints[position : position + 3])
+            position += 3
+        elif kind == "b":
+            virtual_id, block_id, count = ints[position : position + 3]
+            position += 3
+            calls = ints[position : position + count]
+            position += count
+            count = ints[position]
+            metadata = [
+                dict(values[index])
+                for index in ints[position + 1 : position + 1 + count]
+            ]
+            position += 1 + count
+            loader.load(kind, virtual_id, block_id, calls, metadata)
+        elif kind == "m":
+            loader.load(kind, ints[position])
+            position += 1
+        elif kind == "l":
+            block, count = ints[position : position + 2]
+            position += 2
+            loader.load(kind, block, ints[position : position + count])
+            position += count
+        elif kind == "i":
+            merge, block, count = ints[position : position + 3]
+            position += 3
+            loader.load(kind, merge, block, ints[position : position + count])
+            position += count
+        elif kind == "r":
+            count = ints[position]
+            loader.load(kind, ints[position + 1 : position + 1 + count])
+            position += 1 + count
+        elif kind == "n":
+            loader.load(kind, ints[position])
+            position += 1
+        elif kind == "e":
+            source, destination, metadata = ints[position : position + 3]
+            position += 3
+            loader.load(kind, source, destination, dict(values[metadata]))
+        else:
+            raise ValueError(f"unknown record: {kind!r}")
+
+
+def loads_binary(data: bytes) -> Document:
+    """Load a result serialized by `dumps_binary` (on the same
+    interpreter). The result is unmarshalled, which isn't safe against
+    malicious data; only load results from trusted sources."""
+    if not data.startswith(_BINARY_MAGIC):
+        raise ValueError("not a binary SEA result")
+
+    tag, separator, blob = data[len(_BINARY_MAGIC) :].partition(b"\0")
+    if not separator:
+        raise ValueError("not a binary SEA result")
+    _check_python_tag(tag.decode(errors="replace"))
+
+    header, kinds, raw_ints, values = marshal.loads(blob)
+    _check_header(header)
+
+    ints = array(header["typecode"], raw_ints)
+    if header["byteorder"] != sys.byteorder:
+        ints.byteswap()
+
+    loader = _Loader()
+    with _paused_gc():
+        _load_binary_records(loader, kinds, ints.tolist(), values)
+    return loader.finish()
@@ -0,0 +1,403 @@
+"""A long running analysis server, listening on a Unix socket for the
+requests of `sea.client` (one JSON object per line, answered by one JSON
+object per line).
+
+The server remembers the results of the files it analyzed, so a file
+that didn't change is answered without doing any work, and a file that
+did is only re-analyzed incrementally (see `analyze_module`). The
+simulations run on a pool of worker processes which is started (and
+warmed up) once, while the event loop keeps accepting requests.
+
+    $ python -m sea.server --workers 4
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import io
+import json
+import os
+import signal
+import socket
+import stat
+import sys
+import time
+from argparse import ArgumentParser
+from collections import OrderedDict, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass, field
+from functools import partial
+from typing import Dict, Optional
+
+from sea.batch import analyze_file, describe_error, write_module_results
+from sea.cache import add_cache_arguments, get_cache
+from sea.client import PROTOCOL_VERSION, default_socket_path
+from sea.memo import SimulationMemo
+from sea.module import CodeAnalysis, analyze_module
+
+DEFAULT_MAX_FILES = 1024
+# The cache is pruned (in a thread) after this many new entries
+PRUNE_INTERVAL = 256
+
+
+class RequestError(Exception):
+    """A malformed request, reported back to the client."""
+
+
+@dataclass
+class ModuleState:
+    """The last analysis of a file with some options, along with the
+    rendered output of each of its code objects."""
+
+    digest: bytes
+    results: Dict[str, CodeAnalysis] = field(default_factory=dict)
+    outputs: Dict[str, str] = field(default_factory=dict)
+    error: Optional[str] = None
+
+
+@dataclass
+class ServerStats:
+    requests: int = 0
+    failed: int = 0
+    analyses: int = 0
+    unchanged: int = 0
+    code_objects: int = 0
+    reused_code_objects: int = 0
+    started: float = field(default_factory=time.time)
+
+
+def _warm_up():
+    # Runs once in every worker, so that the first real request doesn't
+    # pay for the imports.
+    import sea.batch  # noqa: F401
+    import sea.module  # noqa: F401
+
+
+def _read_source(path):
+    with open(path, "rb") as stream:
+        return stream.read()
+
+
+def _analyze_nested(
+    path, source, enable_ir, previous, executor, workers, memo
+):
+    code = compile(source, path, "exec")
+    results = analyze_module(
+        code,
+        enable_ir=enable_ir,
+        max_workers=workers,
+        executor=executor,
+        previous=previous.results if previous is not None else None,
+        memo=memo,
+    )
+
+    state = ModuleState(hashlib.sha256(source).digest(), results)
+    for qualname, result in results.items():
+        if result.reused and qualname in previous.outputs:
+            state.outputs[qualname] = previous.outputs[qualname]
+        else:
+            buffer = io.StringIO()
+            write_module_results({qualname: result}, buffer, header="##")
+            state.outputs[qualname] = buffer.getvalue()
+    return state
+
+
+class AnalysisServer:
+    """Serves analysis requests on the given Unix socket until asked to
+    shut down. Results of up to `max_files` files (per set of options)
+    are kept in memory; flat analyses also go through the persistent
+    `cache` if one is given."""
+
+    def __init__(
+        self,
+        socket_path=None,
+        *,
+        max_workers=None,
+        cache=None,
+        max_files=DEFAULT_MAX_FILES,
+    ):
+        self.socket_path = socket_path or default_socket_path()
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.cache = cache
+        self.max_files = max_files
+        self.memo = SimulationMemo()
+        self.stats = ServerStats()
+        self._cache_writes = 0
+        self._modules: OrderedDict = OrderedDict()
+        self._locks = defaultdict(asyncio.Lock)
+        self._executor = None
+        self._stopped = None
+        self._connections = {}
+
+    def _remove_stale_socket(self):
+        try:
+            mode = os.stat(self.socket_path).st_mode
+        except FileNotFoundError:
+            return
+
+        # Never remove anything but a (leftover) socket, the path might
+        # be mistyped or point to a regular file.
+        if not stat.S_ISSOCK(mode):
+            raise RuntimeError(f"{self.socket_path} exists and isn't a socket")
+
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+            try:
+                probe.connect(self.socket_path)
+            except OSError:
+                os.unlink(self.socket_path)
+            else:
+                raise RuntimeError(
+                    f"a server is already listening on {self.socket_path}"
+                )
+
+    async def serve_forever(self):
+        loop = asyncio.get_running_loop()
+        self._stopped = asyncio.Event()
+        self._remove_stale_socket()
+
+        # The workers are started before any thread exists, and are all
+        # started at once so that none has to be forked later on.
+        self._executor = ProcessPoolExecutor(
+            self.max_workers, initializer=_warm_up
+        )
+        await asyncio.gather(
+            *(
+                loop.run_in_executor(self._executor, int)
+                for _ in range(self.max_workers)
+            )
+        )
+
+        server = await asyncio.start_unix_server(
+            self._handle_connection, path=self.socket_path
+        )
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signum, self._stopped.set)
+
+        try:
+            async with server:
+                await self._stopped.wait()
+                # Idle clients are disconnected, and the requests in
+                # flight are answered before stopping.
+                server.close()
+                for reader in self._connections.values():
+                    reader.feed_eof()
+                await asyncio.gather(
+                    *self._connections, return_exceptions=True
+                )
+        finally:
+            for signum in (signal.SIGINT, signal.SIGTERM):
+                loop.remove_signal_handler(signum)
+            self._executor.shutdown(cancel_futures=True)
+            try:
+                os.unlink(self.socket_path)
+            except OSError:
+                pass
+
+    async def _handle_connection(self, reader, writer):
+        self._connections[asyncio.current_task()] = reader
+        try:
+            while line := await reader.readline():
+                response = await self._respond(line)
+                writer.write(_encode(response))
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+            del self._connections[asyncio.current_task()]
+
+    async def _respond(self, line):
+        self.stats.requests += 1
+        try:
+            request = _decode(line)
+            response = await self.handle(request)
+        except RequestError as exc:
+            self.stats.failed += 1
+            return {"error": str(exc)}
+        except Exception as exc:
+            self.stats.failed += 1
+            return {"error": describe_error(exc)}
+
+        if "id" in request:
+            response["id"] = request["id"]
+        return response
+
+    async def handle(self, request):
+        """Answer a single (decoded) request."""
+        command = request.get("command")
+        if command == "analyze":
+            return await self.analyze(
+                _require(request, "path", str),
+                enable_ir=bool(request.get("enable_ir", False)),
+                nested=bool(request.get("nested", False)),
+                qualname=request.get("qualname"),
+            )
+        elif command == "status":
+            return self.status()
+        elif command == "shutdown":
+            self._stopped.set()
+            return {}
+        else:
+            raise RequestError(f"unknown command: {command!r}")
+
+    async def analyze(
+        self, path, *, enable_ir=False, nested=False, qualname=None
+    ):
+        """Return the output of the file (or of one of its nested code
+        objects), analyzing it again only if it changed."""
+        key = (path, enable_ir, nested)
+        async with self._locks[key]:
+            state = await self._analyze(key)
+
+        self._modules[key] = state
+        self._modules.move_to_end(key)
+        while len(self._modules) > self.max_files:
+            evicted, _ = self._modules.popitem(last=False)
+            self._locks.pop(evicted, None)
+
+        if state.error is not None:
+            raise RequestError(state.error)
+        elif qualname is None:
+            return {"output": "".join(state.outputs.values())}
+        elif qualname in state.outputs:
+            return {"output": state.outputs[qualname]}
+        else:
+            raise RequestError(f"no code object named {qualname!r}")
+
+    def _count_cache_write(self, loop):
+        # The entries are written by the workers, on their own copies
+        # of the cache; only the server can keep it in its size limit.
+        self._cache_writes += 1
+        if self._cache_writes >= PRUNE_INTERVAL:
+            self._cache_writes = 0
+            loop.run_in_executor(None, self.cache.prune)
+
+    async def _analyze(self, key):
+        path, enable_ir, nested = key
+        loop = asyncio.get_running_loop()
+
+        source = await loop.run_in_executor(None, _read_source, path)
+        previous = self._modules.get(key)
+        if (
+            previous is not None
+            and previous.digest == hashlib.sha256(source).digest()
+        ):
+            self.stats.unchanged += 1
+            return previous
+
+        self.stats.analyses += 1
+        if not nested:
+            result = await loop.run_in_executor(
+                self._executor,
+                partial(
+                    analyze_file,
+                    path,
+                    enable_ir=enable_ir,
+                    cache=self.cache,
+                    memo=self.memo,
+                ),
+            )
+            if result.written:
+                self._count_cache_write(loop)
+            state = ModuleState(hashlib.sha256(source).digest())
+            if result.error is not None:
+                state.error = describe_error(result.error)
+            else:
+                state.outputs["<module>"] = result.output
+            return state
+
+        # Compiling and rendering happen in a thread, the simulation
+        # itself on the worker processes.
+        try:
+            state = await loop.run_in_executor(
+                None,
+                _analyze_nested,
+                path,
+                source,
+                enable_ir,
+                previous,
+                self._executor,
+                self.max_workers,
+                self.memo,
+            )
+        except Exception as exc:
+            return ModuleState(
+                hashlib.sha256(source).digest(), error=describe_error(exc)
+            )
+
+        self.stats.code_objects += len(state.results)
+        self.stats.reused_code_objects += sum(
+            result.reused for result in state.results.values()
+        )
+        return state
+
+    def status(self):
+        return {
+            **asdict(self.stats),
+            "uptime": time.time() - self.stats.started,
+            "workers": self.max_workers,
+            "files": len(self._modules),
+            "memo": asdict(self.memo.stats),
+        }
+
+
+def _decode(line):
+    try:
+        request = json.loads(line)
+    except ValueError as exc:
+        raise RequestError(f"invalid request: {exc}") from None
+    if not isinstance(request, dict):
+        raise RequestError("requests must be JSON objects")
+    if request.get("version", PROTOCOL_VERSION) != PROTOCOL_VERSION:
+        raise RequestError(
+            f"unsupported protocol version: {request['version']!r}"
+        )
+    return request
+
+
+def _encode(response):
+    return json.dumps(response).encode() + b"\n"
+
+
+def _require(request, name, kind):
+    value = request.get(name)
+    if not isinstance(value, kind):
+        raise RequestError(f"{name!r} is missing or not a {kind.__name__}")
+    return value
+
+
+def main():
+    parser = ArgumentParser(prog="python -m sea.server")
+    parser.add_argument(
+        "--socket", help="socket to listen on (default: $SEA_SOCKET)"
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        help="number of worker processes (default: CPU count)",
+    )
+    parser.add_argument(
+        "--max-files",
+        type=int,
+        default=DEFAULT_MAX_FILES,
+        help="number of analyzed files to keep in memory",
+    )
+    add_cache_arguments(parser)
+
+    options = parser.parse_args()
+    server = AnalysisServer(
+        options.socket,
+        max_workers=options.workers,
+        cache=get_cache(options),
+        max_files=options.max_files,
+    )
+    try:
+        asyncio.run(server.serve_forever())
+    except RuntimeError as exc:
+        print(f"error: {exc}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
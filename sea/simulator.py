@@ -1,97 +1,321 @@
-from collections import deque
-from typing import NamedTuple, Optional, Sequence
+import heapq
+import operator
+from collections import Counter
 
-from sea.bytecode import InstructionProperties
-from sea.ir import IRBlock, compile_ir
-from sea.virtuals import Block, Call, Constant, Partial, Virtual
+from sea.bytecode import get_stack_effects
+from sea.ir import compile_ir
+from sea.profiling import count, profiled
+from sea.virtuals import (
+    Block,
+    Call,
+    ConstantPool,
+    Merge,
+    Partial,
+    Virtual,
+    number_virtual,
+)
 
+_TERMINATORS = frozenset(("RETURN_VALUE", "RAISE_VARARGS", "RERAISE"))
 
-def _simulate(instructions, *, is_jump=None, starter_stack=()):
-    calls = []
-    stack = [*starter_stack]
+
+def _defer_numbering(virtual, created):
+    created.append(virtual)
+    return virtual
+
+
+def _iter_simulate(
+    instructions, constants, counter, stack, is_jump=None, number=None
+):
+    # Yields the calls one by one, leaving whatever remains on the
+    # given stack when the instructions are exhausted. Every virtual
+    # is passed to `number` along with the counter, as it is used.
+    stack_effects = get_stack_effects()
+    if number is None:
+        number = number_virtual
 
     for instr in instructions:
-        properties = InstructionProperties(instr, jump=is_jump)
+        pops, pushes = stack_effects(instr.opcode, instr.arg, is_jump)
+
+        if pops > len(stack):
+            count("null_underflows", pops - len(stack))
+            popped = (
+                *(
+                    number(constants.null, counter)
+                    for _ in range(pops - len(stack))
+                ),
+                *stack,
+            )
+            stack.clear()
+        elif pops > 0:
+            popped = tuple(stack[-pops:])
+            del stack[-pops:]
+        else:
+            popped = ()
 
-        arguments = [
-            stack.pop(index)
-            if len(stack) >= abs(index)
-            else Constant("<NULL>")
-            for index in range(properties.negative_effect, 0)
-        ]
         assert all(
-            isinstance(argument, Virtual) for argument in arguments
+            isinstance(argument, Virtual) for argument in popped
         ), "real object leaked into the stack"
 
         # If the instruction has an oparg, then it is going
         # to take the first slot.
         if instr.arg is not None:
-            arguments.insert(0, Constant(instr.argval))
+            constant = constants.intern(instr.argval)
+            arguments = (number(constant, counter), *popped)
+        else:
+            arguments = popped
 
-        call = Call(instr, arguments)
-        calls.append(call)
-
-        positive_effect = properties.positive_effect
-        if positive_effect == 1:
+        call = number(Call(instr, arguments), counter)
+        if pushes == 1:
             stack.append(call)
-        elif positive_effect > 1:
+        elif pushes > 1:
             stack.extend(
-                Partial(call, index) for index in range(positive_effect)
+                number(Partial(call, index), counter)
+                for index in range(pushes)
             )
 
-    return stack, calls
+        yield call
+
 
+def iter_simulate(instructions, *, constants=None, counter=None):
+    """Streaming version of `simulate`, which yields the virtual calls
+    as they are created rather than collecting them. Only the live
+    stack is kept, so an arbitrarily long program can be consumed in
+    bounded memory. The "stack is not empty" ValueError is raised after
+    the last call."""
+    if constants is None:
+        constants = ConstantPool()
+    if counter is None:
+        counter = Counter()
 
-def simulate(instructions):
-    """Simulate given instructions and return a list of
-    virtual calls in the Basic SEA form."""
-    stack, calls = _simulate(instructions)
+    stack = []
+    yield from _iter_simulate(instructions, constants, counter, stack)
     if len(stack) > 0:
-        print("\n".join(obj.as_string() for obj in stack))
-        raise ValueError("stack is not empty")
+        leftovers = "\n".join(obj.as_string() for obj in stack)
+        raise ValueError(f"stack is not empty:\n{leftovers}")
 
-    return calls
 
+@profiled("simulate", lambda calls: {"calls": len(calls)})
+def simulate(instructions, *, constants=None, counter=None):
+    """Simulate given instructions (either `dis.Instruction`s or
+    `sea.decoder.Instructions`) and return a list of virtual calls
+    in the Basic SEA form.
 
-class ParentBlock(NamedTuple):
-    block: IRBlock
-    spilled_stack: Sequence[Call] = ()
-    is_jump: Optional[bool] = None
+    Constants are interned in the given `ConstantPool` (or in a new
+    one, scoped to this call), and virtuals are numbered from the given
+    counter as they are created."""
+    return list(
+        iter_simulate(instructions, constants=constants, counter=counter)
+    )
 
 
-def simulate_ir(instructions):
-    """Simulate given instructions and return a list of
-    CFG blocks."""
-    r2v_map = {}
-    parent_block = ParentBlock(compile_ir(instructions))
+def _describe_blocks(blocks):
+    return {
+        "blocks": len(blocks),
+        "calls": sum(len(block.calls) for block in blocks),
+    }
 
-    seen_blocks = {parent_block.block.block_id}
-    parent_blocks = deque([parent_block])
 
-    while parent_blocks:
-        real_block, spilled_stack, is_jump = parent_blocks.popleft()
-        stack, virtual_calls = _simulate(
-            real_block.instructions,
-            starter_stack=spilled_stack,
-            is_jump=is_jump,
-        )
-        r2v_map[real_block.block_id] = Block(
-            real_block, virtual_calls, labels=real_block.labels
+def _discover_blocks(entry_block):
+    # The blocks in breadth-first order (the order they are returned and
+    # numbered in), along with the jump state of the edge that first
+    # reached each one, which is what the block is simulated with.
+    blocks = [entry_block]
+    is_jump = {entry_block.block_id: None}
+    index = 0
+    while index < len(blocks):
+        block = blocks[index]
+        for next_block, metadata in zip(block.next_blocks, block.metadata):
+            if next_block.block_id not in is_jump:
+                is_jump[next_block.block_id] = metadata["fall"]
+                blocks.append(next_block)
+        index += 1
+    return blocks, [is_jump[block.block_id] for block in blocks]
+
+
+def _link_blocks(blocks):
+    # Successors and predecessors by position. Each predecessor is
+    # marked with whether its stack reaches the entry of the block. It
+    # doesn't for the blocks that end with a return or a raise (which
+    # the IR still links to the next block).
+    positions = {block.block_id: index for index, block in enumerate(blocks)}
+    successors = [[] for _ in blocks]
+    predecessors = [[] for _ in blocks]
+    for position, block in enumerate(blocks):
+        last_instr = block.instructions[-1]
+        for next_block, metadata in zip(block.next_blocks, block.metadata):
+            target = positions[next_block.block_id]
+            if metadata["fall"]:
+                at_entry = last_instr.opname not in _TERMINATORS
+            else:
+                at_entry = (
+                    next_block.instructions[0].offset == last_instr.argval
+                )
+            successors[position].append(target)
+            predecessors[target].append((position, at_entry))
+    return successors, predecessors
+
+
+def _merge_stacks(stacks, depth, merges):
+    # Bottom-aligned merge of the given stacks, cut at the given depth.
+    # Slots on which the stacks disagree hold a merge, which is kept
+    # (and updated in place) from then on, so the entry of a block can
+    # only change a bounded number of times.
+    entry = []
+    for slot in range(depth):
+        merge = merges.get(slot)
+        incoming = {}
+        for stack in stacks:
+            value = stack[slot]
+            if value is not merge:
+                incoming.setdefault(id(value), value)
+
+        if merge is None and len(incoming) == 1:
+            [value] = incoming.values()
+            entry.append(value)
+            continue
+        elif merge is None:
+            merge = merges[slot] = Merge(())
+        merge.incoming = tuple(incoming.values())
+        entry.append(merge)
+    return tuple(entry)
+
+
+def _is_same_stack(left, right):
+    return len(left) == len(right) and all(map(operator.is_, left, right))
+
+
+def _number_blocks(virtual_blocks, created, counter):
+    # Number everything in the order a single pass over the blocks (in
+    # their breadth-first order) would have created them, no matter how
+    # many times each block was simulated until the fixpoint.
+    for block, virtuals in zip(virtual_blocks, created):
+        for merge in block.merges:
+            number_virtual(merge, counter)
+        for virtual in virtuals:
+            number_virtual(virtual, counter)
+        number_virtual(block, counter)
+
+
+@profiled("simulate_ir", _describe_blocks)
+def simulate_ir(instructions, *, constants=None, counter=None):
+    """Simulate given instructions (either `dis.Instruction`s or
+    `sea.decoder.Instructions`) and return a list of CFG blocks.
+
+    Every block starts with the merge of the stacks its predecessors
+    leave behind (see `Block.merges`), so blocks are simulated over and
+    over (in reverse postorder, and only when their entry changes) until
+    a fixpoint is reached.
+
+    Constants are interned in the given `ConstantPool` (or in a new
+    one, scoped to this call), and virtuals are numbered from the given
+    counter once the fixpoint is reached."""
+    if constants is None:
+        constants = ConstantPool()
+    if counter is None:
+        counter = Counter()
+
+    entry_block = compile_ir(instructions)
+    if not entry_block.next_blocks:
+        calls = list(
+            _iter_simulate(entry_block.instructions, constants, counter, [])
         )
+        return [number_virtual(Block(entry_block, calls), counter)]
+
+    # Imported here, since sea.algorithms pulls in the graph modules
+    from sea.algorithms import _reverse_postorder
+
+    blocks, is_jump_states = _discover_blocks(entry_block)
+    successors, predecessors = _link_blocks(blocks)
+    ranks = {
+        position: rank
+        for rank, position in enumerate(_reverse_postorder(successors, 0))
+    }
+
+    entries = [None] * len(blocks)
+    exits = [None] * len(blocks)
+    depths = [None] * len(blocks)
+    merges = [{} for _ in blocks]
+    block_calls = [None] * len(blocks)
+    created = [None] * len(blocks)
+
+    worklist = [(ranks[0], 0)]
+    queued = {0}
+    while worklist:
+        _, position = heapq.heappop(worklist)
+        queued.discard(position)
+
+        stacks = [
+            exits[predecessor]
+            for predecessor, at_entry in predecessors[position]
+            if at_entry and exits[predecessor] is not None
+        ]
+        if position == 0:
+            stacks.append(())
+        elif not stacks:
+            stacks = [
+                exits[predecessor]
+                for predecessor, _ in predecessors[position]
+                if exits[predecessor] is not None
+            ]
+
+        depth = min(map(len, stacks))
+        if depths[position] is not None:
+            depth = min(depth, depths[position])
+        depths[position] = depth
 
-        for next_block, metadata in zip(
-            real_block.next_blocks, real_block.metadata
+        if len(stacks) == 1 and not merges[position]:
+            entry = tuple(stacks[0][:depth])
+        else:
+            entry = _merge_stacks(stacks, depth, merges[position])
+        if entries[position] is not None and _is_same_stack(
+            entry, entries[position]
         ):
-            if next_block.block_id not in seen_blocks:
-                parent_block = ParentBlock(
-                    next_block, spilled_stack=stack, is_jump=metadata["fall"]
-                )
-                parent_blocks.append(parent_block)
-                seen_blocks.add(next_block.block_id)
+            continue
+
+        count("block_simulations")
+        entries[position] = entry
+        stack = [*entry]
+        created[position] = []
+        block_calls[position] = list(
+            _iter_simulate(
+                blocks[position].instructions,
+                constants,
+                created[position],
+                stack,
+                is_jump_states[position],
+                _defer_numbering,
+            )
+        )
+        if exits[position] is not None and _is_same_stack(
+            stack, exits[position]
+        ):
+            continue
 
-    for _, block in r2v_map.items():
-        for next_real_block in block.block.next_blocks:
-            block.next_blocks.append(r2v_map[next_real_block.block_id])
+        exits[position] = stack
+        for successor in successors[position]:
+            if successor not in queued:
+                queued.add(successor)
+                heapq.heappush(worklist, (ranks[successor], successor))
+
+    virtual_blocks = []
+    for position, real_block in enumerate(blocks):
+        virtual_blocks.append(
+            Block(
+                real_block,
+                block_calls[position],
+                labels=real_block.labels,
+                merges=[
+                    merges[position][slot]
+                    for slot in sorted(merges[position])
+                    if slot < depths[position]
+                ],
+            )
+        )
+
+    for position, block in enumerate(virtual_blocks):
+        block.next_blocks.extend(
+            virtual_blocks[successor] for successor in successors[position]
+        )
 
-    blocks = list(r2v_map.values())
-    return blocks
+    _number_blocks(virtual_blocks, created, counter)
+    return virtual_blocks
@@ -1,6 +1,8 @@
-from sea.graph import Graph
+from sea.bytecode import get_stack_effects
+from sea.graph import DetachedEdge, Graph, Node
 from sea.ir import is_jump
-from sea.virtuals import Constant
+from sea.profiling import count, profiled
+from sea.virtuals import Call, Constant
 
 
 def _patch_edges(graph, nodes):
@@ -9,16 +11,18 @@ def _patch_edges(graph, nodes):
     # to anything else to the next instruction we find.
 
     for node, next_node in zip(nodes, nodes[1:]):
-        if len(node._outgoing_edges) == 0:
+        if graph.out_degree(node) == 0:
             graph.add_edge(node, next_node, metadata={"type": "patched"})
-        if len(next_node._incoming_edges) == 0:
+        if graph.in_degree(next_node) == 0:
             graph.add_edge(node, next_node, metadata={"type": "patched"})
 
 
+@profiled("transform_calls")
 def transform_calls(calls, *, graph=None):
     if graph is None:
         graph = Graph()
 
+    edges = len(graph.edges)
     top_level_nodes = []
 
     for call in calls:
@@ -37,9 +41,77 @@ def transform_calls(calls, *, graph=None):
             )
 
     _patch_edges(graph, top_level_nodes)
+    count("calls", len(top_level_nodes))
+    count("edges", len(graph.edges) - edges)
     return graph
 
 
+def _patched_edge(node, next_node):
+    return DetachedEdge(Node(node), Node(next_node), {"type": "patched"})
+
+
+def iter_transform_calls(calls):
+    """Streaming version of `transform_calls`, which yields the nodes
+    and the edges of the graph as soon as they are known (each node
+    before any of its edges) instead of building a `Graph`. It produces
+    the same nodes and edges, though not in the same order.
+
+    Apart from the current call, only the calls that may still be
+    consumed (i.e. the ones on the live stack) are remembered."""
+    stack_effects = get_stack_effects()
+
+    # Two consecutive calls are patched together if either the first one
+    # is never consumed, or the second one doesn't consume anything. The
+    # former is only known once a call that pushes a value is consumed
+    # (no patch), or the calls run out (patch). Until then, the call is
+    # kept here together with the call that followed it.
+    pending = {}
+    previous_call = None
+    previous_pending = False
+
+    for call in calls:
+        yield Node(call)
+
+        sources = set()
+        for index, argument in enumerate(call.arguments):
+            if isinstance(argument, Constant) or argument.name in sources:
+                continue
+
+            sources.add(argument.name)
+            if not isinstance(argument, Call):
+                yield Node(argument)
+            yield DetachedEdge(
+                Node(argument),
+                Node(call),
+                {"type": "argument", "position": index},
+            )
+            pending.pop(argument.name, None)
+
+        if previous_call is not None:
+            if not sources:
+                pending.pop(previous_call.name, None)
+                yield _patched_edge(previous_call, call)
+            elif previous_call.name in pending:
+                pending[previous_call.name][1] = call
+            elif not previous_pending:
+                yield _patched_edge(previous_call, call)
+
+        _, pushes = stack_effects(call.func.opcode, call.func.arg)
+        previous_pending = pushes == 1
+        if previous_pending:
+            pending[call.name] = [call, None]
+        previous_call = call
+
+    for call, next_call in pending.values():
+        if next_call is not None:
+            yield _patched_edge(call, next_call)
+
+
+def _describe_graph(graph):
+    return {"nodes": len(graph.nodes), "edges": len(graph.edges)}
+
+
+@profiled("transform_blocks", _describe_graph)
 def transform_blocks(blocks, *, graph=None):
     if graph is None:
         graph = Graph()
@@ -48,6 +120,15 @@ def transform_blocks(blocks, *, graph=None):
         node = graph.add_node(block)
         transform_calls(block.calls, graph=graph)
 
+        for merge in block.merges:
+            merge_node = graph.add_node(merge)
+            for value in merge.incoming:
+                graph.add_edge(
+                    graph.add_node(value),
+                    merge_node,
+                    metadata={"type": "merge"},
+                )
+
         final_call = block.calls[-1]
         for label, next_block in zip(block.labels, block.next_blocks):
             left = graph.add_node(final_call)
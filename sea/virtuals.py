@@ -3,13 +3,37 @@ from __future__ import annotations
 import dis
 from collections import Counter
 from dataclasses import dataclass, field
-from typing import TYPE_CHECKING, Any, ClassVar, List
+from functools import cached_property
+from typing import TYPE_CHECKING, Any, ClassVar, List, Tuple
+
+from sea.profiling import profiled
 
 if TYPE_CHECKING:
     from sea.ir import IRBlock
 
 
+# Calls, partials and constants are created once per instruction (or
+# per oparg), so they are kept dict-less through __slots__. Blocks are
+# few in number and keep their __dict__.
+
+
+def _reference(virtual):
+    # How a virtual is shown when it is consumed by another one
+    if isinstance(virtual, (Call, Merge)):
+        return virtual.name
+    else:
+        return virtual.as_string()
+
+
+def _restore_virtual(cls, virtual_id, *fields):
+    virtual = cls(*fields)
+    virtual.virtual_id = virtual_id
+    return virtual
+
+
 class Virtual:
+    __slots__ = ("virtual_id",)
+
     PREFIX = ""
 
     def __post_init__(self):
@@ -31,15 +55,24 @@ class Block(Virtual):
     calls: List[Call]
     next_blocks: List[Block] = field(default_factory=list)
     labels: List[str] = field(default_factory=list)
+    # The values that differ between the predecessors, on entry
+    merges: List[Merge] = field(default_factory=list)
 
-    def find_jump_target(self, offset):
+    @cached_property
+    def _calls_by_offset(self):
+        calls_by_offset = {}
         for call in self.calls:
-            if call.func.offset == offset:
-                return call
+            calls_by_offset.setdefault(call.func.offset, call)
+        return calls_by_offset
+
+    def find_jump_target(self, offset):
+        return self._calls_by_offset.get(offset)
 
     def as_string(self):
         lines = []
         lines.append(f"Block {self.name}: ")
+        for merge in self.merges:
+            lines.append("    " + merge.as_string())
         for call in self.calls:
             lines.append("    " + call.as_string())
         if self.next_blocks:
@@ -55,59 +88,265 @@ class Block(Virtual):
 
 @dataclass
 class Call(Virtual):
+    __slots__ = ("func", "arguments")
+
     func: dis.Instruction
-    arguments: List[Virtual]
+    arguments: Tuple[Virtual, ...]
+
+    # Pickling slotted virtuals through their constructor arguments is
+    # much cheaper than through the default slot state dictionaries.
+    def __reduce__(self):
+        return _restore_virtual, (
+            Call,
+            self.virtual_id,
+            self.func,
+            self.arguments,
+        )
 
     def as_string(self):
         source = self.name
         source += " = "
         source += self.func.opname
         source += "("
-        source += ", ".join(
-            argument.name
-            if isinstance(argument, Call)
-            else argument.as_string()
-            for argument in self.arguments
-        )
+        source += ", ".join(map(_reference, self.arguments))
         source += ")"
         return source
 
 
 @dataclass
 class Partial(Virtual):
+    __slots__ = ("call", "index")
+
     PREFIX: ClassVar[str] = "P"
 
     call: Call
     index: int
 
+    def __reduce__(self):
+        return _restore_virtual, (
+            Partial,
+            self.virtual_id,
+            self.call,
+            self.index,
+        )
+
     def as_string(self):
         return f"{self.call.name}[{self.index}]"
 
 
 @dataclass
 class Constant(Virtual):
+    __slots__ = ("value",)
+
     PREFIX: ClassVar[str] = "C"
 
     value: Any
 
+    def __reduce__(self):
+        return _restore_virtual, (Constant, self.virtual_id, self.value)
+
     def as_string(self):
         return repr(self.value)
 
 
+@dataclass(eq=False)
+class Merge(Virtual):
+    """A stack slot which holds different values depending on the block
+    that jumped to its block (a phi). Merges at loop headers may end up
+    consuming themselves, so they are compared by identity."""
+
+    __slots__ = ("incoming",)
+
+    PREFIX: ClassVar[str] = "M"
+
+    incoming: Tuple[Virtual, ...]
+
+    # The incoming values are restored after the merge itself, as they
+    # may refer back to it.
+    def __reduce__(self):
+        return (
+            _restore_virtual,
+            (Merge, self.virtual_id, ()),
+            (None, {"incoming": self.incoming}),
+        )
+
+    def as_string(self):
+        incoming = ", ".join(map(_reference, self.incoming))
+        return f"{self.name} = MERGE({incoming})"
+
+
+def _constant_key(value):
+    # Equal values of different types (1, 1.0 and True, or 0.0 and -0.0)
+    # must not share a constant, so the key carries the type all the
+    # way down. Anything that isn't a plain literal is keyed by identity.
+    value_type = type(value)
+    if value_type in (int, bool, bytes) or value is None or value is ...:
+        return value_type, value
+    elif value_type in (float, complex):
+        return value_type, repr(value)
+    elif value_type is tuple:
+        return value_type, tuple(map(_constant_key, value))
+    elif value_type is frozenset:
+        return value_type, frozenset(map(_constant_key, value))
+    else:
+        return value_type, id(value)
+
+
+class ConstantPool:
+    """Hash-consing pool for `Constant` virtuals. Equal values share a
+    single `Constant` (and thus a single id), so comparing two constants
+    that come from the same pool is an identity check. A pool can either
+    be scoped to a single analysis or shared across code objects."""
+
+    def __init__(self):
+        self._constants = {}
+        # Placeholder for values that were missing on the stack
+        self.null = Constant("<NULL>")
+
+    def __len__(self):
+        return len(self._constants)
+
+    def intern(self, value):
+        # Strings (names, mostly) dominate, and they can't collide with
+        # any of the tuple keys so they are used as is.
+        if type(value) is str:
+            key = value
+        else:
+            key = _constant_key(value)
+
+        if (constant := self._constants.get(key)) is None:
+            constant = self._constants[key] = Constant(value)
+        return constant
+
+
+def number_virtual(virtual, counter):
+    """Give the virtual the next id of its kind from the given counter,
+    unless it already has one."""
+    if virtual.virtual_id == -1:
+        virtual.virtual_id = counter[virtual.PREFIX]
+        counter[virtual.PREFIX] += 1
+    return virtual
+
+
+@profiled("traverse_virtuals")
 def traverse_virtuals(virtuals, *, counter=None):
+    """Number all the virtuals reachable from the given ones which don't
+    have an id yet. The simulator already numbers everything it creates,
+    so this is only needed for externally built virtuals."""
     if counter is None:
         counter = Counter()
 
-    for virtual in virtuals:
+    # An explicit stack (rather than recursion) so that long chains
+    # of calls can't hit the recursion limit.
+    stack = [*virtuals]
+    stack.reverse()
+    while stack:
+        virtual = stack.pop()
         if virtual.virtual_id != -1:
             continue
 
-        virtual.virtual_id = counter[virtual.PREFIX]
+        number_virtual(virtual, counter)
         if isinstance(virtual, Call):
-            traverse_virtuals(virtual.arguments, counter=counter)
+            stack.extend(reversed(virtual.arguments))
+        elif isinstance(virtual, Partial):
+            stack.append(virtual.call)
+        elif isinstance(virtual, Merge):
+            stack.extend(reversed(virtual.incoming))
         elif isinstance(virtual, Block):
-            traverse_virtuals(virtual.calls, counter=counter)
-
-        counter[virtual.PREFIX] += 1
+            stack.extend(reversed(virtual.calls))
+            stack.extend(reversed(virtual.merges))
 
     return virtuals
+
+
+def _clone_virtual(virtual, clones):
+    # Arguments are created before the calls that consume them, so they
+    # have almost always been cloned already; anything else is cloned
+    # in post-order, with an explicit stack like traverse_virtuals.
+    stack = [virtual]
+    while stack:
+        current = stack[-1]
+        if id(current) in clones:
+            stack.pop()
+            continue
+
+        current_type = type(current)
+        if current_type is Call:
+            arguments = []
+            for argument in current.arguments:
+                copy = clones.get(id(argument))
+                if copy is None:
+                    break
+                arguments.append(copy)
+            else:
+                copy = object.__new__(Call)
+                copy.func = current.func
+                copy.arguments = tuple(arguments)
+
+            if copy is None:
+                stack.extend(
+                    argument
+                    for argument in current.arguments
+                    if id(argument) not in clones
+                )
+                continue
+        elif current_type is Partial:
+            if (call := clones.get(id(current.call))) is None:
+                stack.append(current.call)
+                continue
+            copy = object.__new__(Partial)
+            copy.call = call
+            copy.index = current.index
+        elif current_type is Constant:
+            copy = object.__new__(Constant)
+            copy.value = current.value
+        else:
+            raise TypeError(f"can't clone {current_type.__name__}")
+
+        copy.virtual_id = current.virtual_id
+        clones[id(current)] = copy
+        stack.pop()
+
+    return clones[id(virtual)]
+
+
+def clone_virtuals(virtuals):
+    """Return a copy of the given virtuals (calls or blocks) and of
+    everything they reach, with the same ids and the same structure
+    (including shared arguments and the links between blocks). Only the
+    instructions and IR blocks, which are never modified, are shared
+    with the originals."""
+    clones = {}
+    blocks = [virtual for virtual in virtuals if isinstance(virtual, Block)]
+    for block in blocks:
+        copy = Block(block.block, [], labels=list(block.labels))
+        copy.virtual_id = block.virtual_id
+        clones[id(block)] = copy
+
+        # Merges may be (indirectly) fed by the calls that consume them,
+        # so they are created first and only filled in at the end.
+        for merge in block.merges:
+            merge_copy = object.__new__(Merge)
+            merge_copy.virtual_id = merge.virtual_id
+            clones[id(merge)] = merge_copy
+            copy.merges.append(merge_copy)
+
+    for block in blocks:
+        copy = clones[id(block)]
+        copy.calls = [_clone_virtual(call, clones) for call in block.calls]
+        copy.next_blocks = [
+            clones[id(next_block)] for next_block in block.next_blocks
+        ]
+
+    for block in blocks:
+        for merge in block.merges:
+            clones[id(merge)].incoming = tuple(
+                _clone_virtual(value, clones) for value in merge.incoming
+            )
+
+    return [
+        clones[id(virtual)]
+        if id(virtual) in clones
+        else _clone_virtual(virtual, clones)
+        for virtual in virtuals
+    ]
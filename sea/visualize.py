@@ -1,7 +1,40 @@
+import sys
+
 from sea.virtuals import Block
 
 
-def visualize_as_graph(graph, enable_subgraphs=True):
+def _edge_properties(edge):
+    properties = {}
+
+    edge_type = edge.metadata.get("type")
+    if edge_type == "argument":
+        properties["color"] = "chocolate"
+    elif edge_type == "merge":
+        properties["color"] = "chocolate"
+        properties["style"] = "dotted"
+    elif edge_type == "patched":
+        properties["arrowhead"] = "none"
+        properties["color"] = "gray"
+    elif edge_type == "elided":
+        properties["style"] = "dashed"
+
+    if label := edge.metadata.get("label"):
+        if edge_type == "flow":
+            if label in ("true", "loop"):
+                properties["color"] = "green"
+            elif label in ("false", "exhaust"):
+                properties["color"] = "red"
+        properties["label"] = label
+
+    return properties
+
+
+def visualize_as_graph(
+    graph, enable_subgraphs=True, *, output="/tmp/out.gv", view=True
+):
+    """Render the graph with graphviz (requires the graphviz package) to
+    the given output path, and open it in a viewer if `view` is set. See
+    `write_dot` and `export_graph` for large graphs."""
     import graphviz
 
     board = graphviz.Digraph()
@@ -23,32 +56,361 @@ def visualize_as_graph(graph, enable_subgraphs=True):
         board.node(node.virtual.name, node.virtual.as_string())
 
     for edge in graph.edges:
-        properties = {}
-
-        edge_type = edge.metadata.get("type")
-        if edge_type == "argument":
-            properties["color"] = "chocolate"
-        elif edge_type == "patched":
-            properties["arrowhead"] = "none"
-            properties["color"] = "gray"
-
-        if label := edge.metadata.get("label"):
-            if edge_type == "flow":
-                if label in ("true", "loop"):
-                    properties["color"] = "green"
-                elif label in ("false", "exhaust"):
-                    properties["color"] = "red"
-            properties["label"] = label
-
         board.edge(
             edge.source.virtual.name,
             edge.destination.virtual.name,
-            **properties,
+            **_edge_properties(edge),
         )
 
-    board.render("/tmp/out.gv", view=True)
+    board.render(output, view=view)
 
 
 def visualize_as_text(virtuals, **kwargs):
     for virtual in virtuals:
         print(virtual.as_string(), **kwargs)
+
+
+def _quote(text):
+    return '"' + text.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+class _Elided:
+    """Stands in for the calls elided from the middle of a long chain."""
+
+    __slots__ = ("name", "count")
+
+    def __init__(self, name, count):
+        self.name = name
+        self.count = count
+
+    def as_string(self):
+        return f"... {self.count} calls ..."
+
+
+class _CollapsedBlock:
+    """A block drawn as a single node, rather than as its calls."""
+
+    __slots__ = ("block",)
+
+    def __init__(self, block):
+        self.block = block
+
+    @property
+    def name(self):
+        return self.block.name
+
+    def as_string(self):
+        return f"Block {self.block.name} ({len(self.block.calls)} calls)"
+
+
+def _select(graph, focus, depth):
+    # Node ids within `depth` edges (in either direction) of the focus
+    from sea.algorithms import _adjacency
+
+    if (start := graph._node_ids.get(focus)) is None:
+        raise ValueError(f"unknown focus node: {focus!r}")
+
+    successors = _adjacency(graph, True)
+    predecessors = _adjacency(graph, False)
+    selected = {start}
+    frontier = [start]
+    distance = 0
+    while frontier and (depth is None or distance < depth):
+        distance += 1
+        next_frontier = []
+        for node_id in frontier:
+            for neighbours in (successors[node_id], predecessors[node_id]):
+                for neighbour in neighbours:
+                    if neighbour not in selected:
+                        selected.add(neighbour)
+                        next_frontier.append(neighbour)
+        frontier = next_frontier
+    return selected
+
+
+def _elide_chains(graph, node_ids, edge_ids, max_chain):
+    # A chain is a run of calls with a single incoming and a single
+    # outgoing edge (within the selection). Only the first and the last
+    # few calls of a longer chain are kept, the rest is replaced by a
+    # single `_Elided` node.
+    from sea.graph import DetachedEdge, Node
+
+    nodes, sources, destinations = (
+        graph._nodes,
+        graph._sources,
+        graph._destinations,
+    )
+    incoming, outgoing = {}, {}
+    for edge_id in edge_ids:
+        outgoing.setdefault(sources[edge_id], []).append(edge_id)
+        incoming.setdefault(destinations[edge_id], []).append(edge_id)
+
+    def is_link(node_id):
+        return (
+            len(incoming.get(node_id, ())) == 1
+            and len(outgoing.get(node_id, ())) == 1
+            and not isinstance(nodes[node_id].virtual, Block)
+        )
+
+    removed_nodes, removed_edges = set(), set()
+    extra_nodes, extra_edges = [], []
+    for node_id in node_ids:
+        # Chains are walked from their first link; a link can't be
+        # reached twice, since it has a single incoming edge.
+        if not is_link(node_id) or is_link(sources[incoming[node_id][0]]):
+            continue
+
+        chain = [node_id]
+        while is_link(next_node := destinations[outgoing[chain[-1]][0]]):
+            chain.append(next_node)
+        if len(chain) <= max_chain:
+            continue
+
+        head = chain[: (max_chain + 1) // 2]
+        tail = chain[len(chain) - max_chain // 2 :]
+        middle = chain[len(head) : len(chain) - len(tail)]
+        removed_nodes.update(middle)
+        removed_edges.add(incoming[middle[0]][0])
+        removed_edges.update(outgoing[member][0] for member in middle)
+
+        elided = Node(_Elided(f"elided_{middle[0]}", len(middle)))
+        before = sources[incoming[middle[0]][0]]
+        after = destinations[outgoing[middle[-1]][0]]
+        extra_nodes.append(elided)
+        extra_edges.append(
+            DetachedEdge(nodes[before], elided, {"type": "elided"})
+        )
+        extra_edges.append(
+            DetachedEdge(elided, nodes[after], {"type": "elided"})
+        )
+
+    return (
+        [node_id for node_id in node_ids if node_id not in removed_nodes],
+        [edge_id for edge_id in edge_ids if edge_id not in removed_edges],
+        extra_nodes,
+        extra_edges,
+    )
+
+
+def _collapse_blocks(graph, node_ids, edge_ids):
+    from sea.graph import DetachedEdge, Node
+
+    nodes = graph._nodes
+    owners = {}
+    collapsed = {}
+    for node_id in node_ids:
+        if isinstance(block := nodes[node_id].virtual, Block):
+            collapsed[node_id] = Node(_CollapsedBlock(block))
+            for virtual in (*block.merges, *block.calls):
+                if (owned := graph.find_node(virtual)) is not None:
+                    owners[owned.node_id] = node_id
+
+    yield from collapsed.values()
+
+    seen = set()
+    for edge_id in edge_ids:
+        source = owners.get(graph._sources[edge_id])
+        destination = owners.get(graph._destinations[edge_id])
+        if source is None or destination is None or source == destination:
+            continue
+        if (source, destination) in seen:
+            continue
+
+        seen.add((source, destination))
+        yield DetachedEdge(
+            collapsed[source],
+            collapsed[destination],
+            graph._metadata_of(edge_id),
+        )
+
+
+def iter_graph_items(
+    graph, *, focus=None, depth=None, max_chain=None, collapse_blocks=False
+):
+    """Yield the nodes and then the edges of the graph (as `write_dot`
+    and `write_graphml` expect them), reduced to a size that can still
+    be rendered:
+
+    - `focus` (a virtual name, e.g "$42") and `depth` keep only the
+      nodes within `depth` edges of the focus node, in either direction
+    - `max_chain` replaces the middle of each run of more than
+      `max_chain` linearly connected calls with a single summary node
+    - `collapse_blocks` draws each block of a `transform_blocks` graph
+      as a single node, connected by the edges between their calls
+
+    Every reduction runs in linear time over the (selected) graph."""
+    from sea.graph import Edge
+
+    if focus is None and max_chain is None and not collapse_blocks:
+        yield from graph.nodes
+        yield from graph.edges
+        return
+
+    if focus is not None:
+        selected = _select(graph, focus, depth)
+        # Blocks aren't connected to anything, they are kept if any of
+        # their calls is.
+        for node in graph.nodes:
+            if isinstance(node.virtual, Block) and any(
+                graph._node_ids.get(call.name) in selected
+                for call in node.virtual.calls
+            ):
+                selected.add(node.node_id)
+        node_ids = sorted(selected)
+        edge_ids = [
+            edge_id
+            for edge_id in range(len(graph._sources))
+            if graph._sources[edge_id] in selected
+            and graph._destinations[edge_id] in selected
+        ]
+    else:
+        node_ids = list(range(len(graph._nodes)))
+        edge_ids = list(range(len(graph._sources)))
+
+    if collapse_blocks:
+        yield from _collapse_blocks(graph, node_ids, edge_ids)
+        return
+
+    extra_nodes, extra_edges = [], []
+    if max_chain is not None:
+        node_ids, edge_ids, extra_nodes, extra_edges = _elide_chains(
+            graph, node_ids, edge_ids, max_chain
+        )
+
+    nodes = graph._nodes
+    yield from (nodes[node_id] for node_id in node_ids)
+    yield from extra_nodes
+    yield from (Edge(graph, edge_id) for edge_id in edge_ids)
+    yield from extra_edges
+
+
+def _dot_attributes(properties):
+    return " ".join(
+        f"{name}={_quote(value)}" for name, value in properties.items()
+    )
+
+
+def write_dot(items, stream=None, *, clusters=True):
+    """Write the given stream of `Node`s and `Edge`s (e.g from
+    `iter_transform_calls`, `iter_graph_items` or the nodes and then the
+    edges of a `Graph`) to the given text stream in the DOT language,
+    one statement at a time.
+
+    Block nodes become clusters of those of their calls that were
+    written (or are skipped, if `clusters` is false). Clusters are
+    written last, so only the names of the calls that follow a block
+    are remembered."""
+    from sea.graph import Node
+
+    if stream is None:
+        stream = sys.stdout
+
+    blocks = []
+    written = set()
+    stream.write("digraph {\n")
+    for item in items:
+        if not isinstance(item, Node):
+            stream.write(
+                f"    {_quote(item.source.virtual.name)}"
+                f" -> {_quote(item.destination.virtual.name)}"
+                f" [{_dot_attributes(_edge_properties(item))}]\n"
+            )
+        elif isinstance(item.virtual, Block):
+            if clusters:
+                blocks.append(item.virtual)
+        else:
+            name = item.virtual.name
+            if blocks:
+                written.add(name)
+            stream.write(
+                f"    {_quote(name)}"
+                f" [label={_quote(item.virtual.as_string())}]\n"
+            )
+
+    for block in blocks:
+        stream.write(
+            f"    subgraph {_quote('cluster_' + block.name)} {{\n"
+            f"        label={_quote(block.name)}\n"
+        )
+        for call in block.calls:
+            if (name := call.name) in written:
+                stream.write(f"        {_quote(name)}\n")
+        stream.write("    }\n")
+    stream.write("}\n")
+
+
+_GRAPHML_KEYS = (
+    ("label", "node", "label"),
+    ("block", "node", "block"),
+    ("type", "edge", "type"),
+    ("edge_label", "edge", "label"),
+    ("position", "edge", "position"),
+)
+
+
+def write_graphml(items, stream=None):
+    """Write the given stream of `Node`s and `Edge`s (see `write_dot`)
+    to the given text stream as GraphML. Blocks aren't nodes of their
+    own, the calls record the block they belong to instead."""
+    from xml.sax.saxutils import escape, quoteattr
+
+    from sea.graph import Node
+
+    if stream is None:
+        stream = sys.stdout
+
+    stream.write(
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<graphml xmlns="http://graphml.graphdrawing.org/xmlns">\n'
+    )
+    for key, domain, name in _GRAPHML_KEYS:
+        stream.write(
+            f'  <key id="{key}" for="{domain}" attr.name="{name}"'
+            ' attr.type="string"/>\n'
+        )
+    stream.write('  <graph edgedefault="directed">\n')
+
+    blocks = {}
+    for item in items:
+        if not isinstance(item, Node):
+            stream.write(
+                f"    <edge source={quoteattr(item.source.virtual.name)}"
+                f" target={quoteattr(item.destination.virtual.name)}>"
+            )
+            metadata = dict(item.metadata)
+            for key, name in (
+                ("type", "type"),
+                ("edge_label", "label"),
+                ("position", "position"),
+            ):
+                if (value := metadata.get(name)) is not None:
+                    value = escape(str(value))
+                    stream.write(f'<data key="{key}">{value}</data>')
+            stream.write("</edge>\n")
+        elif isinstance(item.virtual, Block):
+            for call in item.virtual.calls:
+                blocks[call.name] = item.virtual.name
+        else:
+            name = item.virtual.name
+            label = escape(item.virtual.as_string())
+            stream.write(
+                f"    <node id={quoteattr(name)}>"
+                f'<data key="label">{label}</data>'
+            )
+            if (block := blocks.get(name)) is not None:
+                stream.write(f'<data key="block">{escape(block)}</data>')
+            stream.write("</node>\n")
+    stream.write("  </graph>\n</graphml>\n")
+
+
+def export_graph(graph, path, *, format="dot", clusters=True, **controls):
+    """Write the graph to the given path as DOT or GraphML (`format`),
+    reduced by the given size controls (see `iter_graph_items`)."""
+    items = iter_graph_items(graph, **controls)
+    with open(path, "w") as stream:
+        if format == "dot":
+            write_dot(items, stream, clusters=clusters)
+        elif format == "graphml":
+            write_graphml(items, stream)
+        else:
+            raise ValueError(f"unknown graph format: {format!r}")
@@ -0,0 +1,115 @@
+"""Re-analysis of a source file whenever it changes on disk.
+
+Every new version of the file is analyzed with the previous results at
+hand (see `analyze_module`), so only the code objects that were edited
+are simulated again, and only their results are printed.
+"""
+
+from __future__ import annotations
+
+import os
+import sys
+import time
+from dataclasses import dataclass
+from typing import Dict, Iterator, Optional
+
+from sea.batch import describe_error, write_module_results
+from sea.module import CodeAnalysis, analyze_module
+
+
+@dataclass
+class ModuleUpdate:
+    """One re-analysis of the watched file. `changed` holds the results
+    that were recomputed; `error` is set instead if the file couldn't be
+    read or compiled, in which case the previous results are kept."""
+
+    results: Optional[Dict[str, CodeAnalysis]] = None
+    changed: Optional[Dict[str, CodeAnalysis]] = None
+    error: Optional[Exception] = None
+    elapsed: float = 0.0
+
+    def as_string(self):
+        if self.error is not None:
+            return f"error: {describe_error(self.error)}"
+        return (
+            f"re-analyzed {len(self.changed)} of {len(self.results)} code"
+            f" objects in {self.elapsed * 1e3:.1f}ms"
+        )
+
+
+def _signature(path):
+    try:
+        status = os.stat(path)
+    except OSError:
+        return None
+    return status.st_mtime_ns, status.st_size
+
+
+def iter_file_versions(path, *, interval=0.5) -> Iterator[bytes]:
+    """Yield the contents of the file now and then every time it changes
+    (by polling its modification time and size every `interval`
+    seconds), forever."""
+    signature = None
+    while True:
+        current = _signature(path)
+        if current is not None and current != signature:
+            signature = current
+            try:
+                with open(path, "rb") as stream:
+                    yield stream.read()
+            except OSError:
+                # Replaced while being read, the next poll will see it
+                signature = None
+        time.sleep(interval)
+
+
+def iter_module_updates(
+    path, *, enable_ir=False, max_workers=1, interval=0.5
+) -> Iterator[ModuleUpdate]:
+    """Analyze the file now and then again on every change, yielding
+    a `ModuleUpdate` for each version."""
+    results = None
+    for source in iter_file_versions(path, interval=interval):
+        started = time.perf_counter()
+        update = ModuleUpdate()
+        try:
+            code = compile(source, path, "exec")
+            update.results = analyze_module(
+                code,
+                enable_ir=enable_ir,
+                max_workers=max_workers,
+                previous=results,
+            )
+        except Exception as exc:
+            update.error = exc
+        else:
+            results = update.results
+            update.changed = {
+                qualname: result
+                for qualname, result in results.items()
+                if not result.reused
+            }
+        update.elapsed = time.perf_counter() - started
+        yield update
+
+
+def watch_file(
+    path, stream=None, *, enable_ir=False, max_workers=1, interval=0.5
+):
+    """Print the results of the changed code objects of the file every
+    time it is saved, until interrupted. The summary of each update goes
+    to stderr."""
+    if stream is None:
+        stream = sys.stdout
+
+    updates = iter_module_updates(
+        path, enable_ir=enable_ir, max_workers=max_workers, interval=interval
+    )
+    try:
+        for update in updates:
+            if update.changed:
+                write_module_results(update.changed, stream, header="##")
+                stream.flush()
+            print(update.as_string(), file=sys.stderr)
+    except KeyboardInterrupt:
+        pass